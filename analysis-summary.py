@@ -1,15 +1,46 @@
 import os
-import pdfplumber
 import json
 import http.client  # For making HTTP requests
-import textwrap
 import datetime
+import argparse
+import fnmatch
+import time
+import queue
+import collections
+import threading
+import hashlib
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pdf_text_cache
+import pdf_extractors
+import llm_response_cache
+import text_chunker
+import ollama_client
+import run_journal
+import call_metrics
+import vector_store
+import corpus_manifest
+import model_lifecycle
+import generation_options
+import backend_scheduler
+import text_spool
+import near_duplicates
 
 # --- Konfiguracja ścieżek ---
 PDF_INPUT_FOLDER = "/home/luke_blue_lox/PycharmProjects/BLOX-TAK-BIELIK/FOR_ANALYSIS"
 OUTPUT_FOLDER = "/home/luke_blue_lox/PycharmProjects/BLOX-TAK-BIELIK/PROCESSED_OUTPUT_BIELIK"  # Zmieniona ścieżka wyjściowa
 LOG_FOLDER = ("/home/luke_blue_lox/PycharmProjects/BLOX-TAK-BIELIK/2"
               "2")  # Zmieniona ścieżka logów
+PDF_TEXT_CACHE_FOLDER = "/home/luke_blue_lox/PycharmProjects/BLOX-TAK-BIELIK/CACHE_PDF_TEXT"  # Cache tekstu stron PDF
+LLM_RESPONSE_CACHE_FOLDER = "/home/luke_blue_lox/PycharmProjects/BLOX-TAK-BIELIK/CACHE_LLM_RESPONSES"  # Cache odpowiedzi BIELIKA
+SUMMARY_TREE_FOLDER = os.path.join(OUTPUT_FOLDER, "SUMMARY_TREE")  # Poziomy pośrednie globalnego podsumowania
+CALL_METRICS_FOLDER = os.path.join(LOG_FOLDER, "CALL_METRICS")  # Metryki wywołań (JSONL i CSV) dla każdego przebiegu
+RUN_JOURNAL_FOLDER = os.path.join(LOG_FOLDER, "RUN_JOURNALS")  # Dzienniki przebiegów do wznawiania (--run-id)
+SPOOL_FOLDER = os.path.join(LOG_FOLDER, "SPOOL")  # Pliki robocze przebiegu (połączone analizy do globalnego podsumowania)
+# Manifest korpusu (skrót PDF, zakres stron, wersja analizy) - niezmienione pliki nie są analizowane ponownie
+CORPUS_MANIFEST_PATH = os.path.join(OUTPUT_FOLDER, "corpus_manifest.json")
 
 # Aktualny czas
 now = datetime.datetime.now()
@@ -17,67 +48,233 @@ now = datetime.datetime.now()
 # Format ISO 8601 z milisekundami
 full_timestamp = now.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
 
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-os.makedirs(LOG_FOLDER, exist_ok=True)
-
 # --- Konfiguracja Ollama API dla BIELIKA ---
 OLLAMA_HOST = "localhost"  # lub adres IP, jeśli Ollama/BIELIK działa na innej maszynie
 OLLAMA_PORT = 11434
+# Lista serwerów Ollama (host, port), np. kilka płytek Orange Pi: [("192.168.1.10", 11434), ("192.168.1.11", 11434)]
+OLLAMA_BACKENDS = [(OLLAMA_HOST, OLLAMA_PORT)]
+MAX_IN_FLIGHT_PER_BACKEND = 1  # Maks. liczba równoczesnych zapytań na serwer (por. OLLAMA_NUM_PARALLEL w Ollama)
+# Strumieniowanie odpowiedzi ("stream": true) - tekst trafia do pliku wynikowego i na konsolę w trakcie generowania
+STREAM_RESPONSES = True
+# Stałe polecenia w wiadomości systemowej, zmienne dane (timestamp, tekst) na końcu - Ollama może wtedy ponownie
+# użyć przetworzonego prefiksu promptu (KV cache) zamiast przeliczać go przy każdej części. False = jedna wiadomość user
+USE_SYSTEM_PROMPT = True
+OLLAMA_KEEP_ALIVE = "30m"  # Jak długo Ollama trzyma model (i cache prefiksu) w pamięci po ostatnim zapytaniu
+# Przed analizą model jest ładowany na wszystkich serwerach i przypięty (keep_alive -1) do końca przebiegu, a potem
+# zwalniany, jeśli to ten przebieg go załadował. Przypięcie widzi też makro korektora (model_lifecycle)
+PIN_MODEL_DURING_RUN = True
+OLLAMA_REQUEST_TIMEOUT = 1800  # Limit czasu (s) na operację sieciową zapytania; zerwane połączenia i 5xx są ponawiane
 MODEL_NAME = "bielik-4.5b-q4km-final"  # Upewnij się, że to poprawna nazwa modelu w Ollama
 
-# Rozmiary chunków - mogą wymagać dostosowania w zależności od możliwości BIELIKA i pamięci
-CHUNK_SIZE = 100_000  # Rozmiar chunka dla pojedynczych dokumentów (w znakach)
-OVERALL_SUMMARY_CHUNK_SIZE = 50_000  # Rozmiar chunka dla globalnego podsumowania (w znakach)
+# Cache odpowiedzi BIELIKA (klucz: model + parametry Modfile + pełna treść wiadomości, bez full_timestamp)
+USE_LLM_RESPONSE_CACHE = True
+BYPASS_LLM_RESPONSE_CACHE = False  # True = zawsze pytaj model (nowe odpowiedzi nadal trafiają do cache)
+
+# Rozmiary chunków w tokenach - prompt + chunk + odpowiedź muszą zmieścić się w oknie kontekstu BIELIKA
+MODEL_CONTEXT_TOKENS = 32_768  # Okno kontekstu Bielik-4.5B-v3.0-Instruct
+RESPONSE_TOKEN_RESERVE = 4_096  # Miejsce w kontekście zarezerwowane na odpowiedź modelu
+# Limity odpowiedzi (num_predict) i num_ctx zapytań wynikają z profili zadań w generation_options.TASK_PROFILES
+CHUNK_OVERLAP_TOKENS = 200  # Zakładka między kolejnymi chunkami dokumentu (ciągłość kontekstu na granicach)
+SUMMARY_TREE_FAN_IN = 4  # Ile częściowych podsumowań łączy jedno wywołanie na kolejnym poziomie drzewa
+
+# Indeks wektorowy (Ollama /api/embeddings, wymaga numpy) - fragmenty dokumentów źródłowych najbliższe tematom
+# z RETRIEVAL_QUERIES trafiają do ostatniego wywołania globalnego podsumowania obok połączonych analiz
+USE_VECTOR_STORE = False
+VECTOR_STORE_FOLDER = "/home/luke_blue_lox/PycharmProjects/BLOX-TAK-BIELIK/VECTOR_STORE"
+VECTOR_STORE_TOP_K = 4  # Liczba fragmentów na jedno zapytanie
+VECTOR_STORE_MAX_PASSAGE_TOKENS = 6_000  # Limit tokenów wszystkich dołączonych fragmentów źródłowych
+RETRIEVAL_QUERIES = [
+    "stan zdrowia, wypadek, urazy, brak ubezpieczenia zdrowotnego, leczenie",
+    "sytuacja finansowa, długi, brak dochodów, brak majątku, niemożność spłaty",
+    "próby znalezienia pracy, zatrudnienie, współpraca, praca zdalna, portfolio",
+    "komornik, egzekucja, wezwanie, sygnatura akt, wyjaśnienia",
+    "faktura, zakup, wydatek, pochodzenie środków",
+]
+
+# Przetwarzanie przyrostowe i tryb obserwacji folderu (--watch)
+USE_CORPUS_MANIFEST = True
+WATCH_SETTLE_SECONDS = 5  # Odczekanie po zmianie w folderze, aż kopiowane pliki zostaną w całości zapisane
+
+# Równoległa ekstrakcja stron PDF - 1 oznacza tryb sekwencyjny (jak dotychczas)
+EXTRACTION_WORKERS = os.cpu_count() or 1  # Liczba procesów w puli do ekstrakcji stron
+EXTRACTION_PAGES_PER_TASK = 16  # Liczba kolejnych stron przekazywanych jednemu procesowi naraz
+
+# Cache tekstu stron (klucz: skrót SHA-256 zawartości PDF + ekstraktor) - ponowne uruchomienia pomijają ekstrakcję
+USE_PDF_TEXT_CACHE = True
+# "auto" - najszybszy ekstraktor o pełnej jakości tekstu wybierany dla każdego dokumentu (pomiar na kilku stronach),
+# albo nazwa ekstraktora: "pypdfium2", "pypdf2", "pdfplumber". Pozostałe ekstraktory są zapasowe dla każdej strony.
+PDF_TEXT_EXTRACTOR = "auto"
+
+# Potok strumieniowy: ekstrakcja stron, podział na części, inferencja i zapis wyników jako etapy w osobnych wątkach
+# połączone kolejkami o ograniczonym rozmiarze - pamięć nie rośnie z długością dokumentu, a ekstrakcja kolejnego pliku
+# biegnie w tle podczas analizy bieżącego
+PIPELINE_PAGE_BUFFER = 64  # Ile wyodrębnionych stron może czekać na podział na części (także z kolejnych plików)
+PIPELINE_EMBEDDING_BUFFER = 16  # Ile części tekstu może czekać na dodanie do indeksu wektorowego
+
+# Deduplikacja przed inferencją: strony i części powtarzające (dokładnie lub prawie) tekst przeanalizowany już
+# w tym przebiegu, także w innym pliku, nie trafiają do BIELIKA - w ich miejscu jest odwołanie do tamtej analizy
+USE_DEDUPLICATION = True
+# Minimalne podobieństwo (Jaccard, MinHash) podobnych stron w obrębie pliku - do modelu trafiają z nich tylko zdania
+# różniące się od wcześniejszej strony (daty, kwoty, sygnatury). Strony innych plików i części - tylko kopie dokładne.
+DEDUP_SIMILARITY_THRESHOLD = 0.9
+DEDUPLICATION_VERSION = 2  # Zmiana sposobu deduplikacji unieważnia wyniki zapisane w manifeście korpusu
+
+
+# --- Ekstrakcja stron z podziałem na zakresy rozłożone na pulę procesów (leniwie, zakres po zakresie) ---
+def iter_extracted_ranges(pdf_path, start_index, end_index, workers=None):
+    """
+    Generator par (indeks pierwszej strony, pary (tekst strony, ekstraktor) zakresu) dla kolejnych zakresów
+    po EXTRACTION_PAGES_PER_TASK stron z [start_index, end_index), w kolejności stron. Przy workers > 1 zakresy są
+    przetwarzane równolegle, a pula wyprzedza odbiorcę najwyżej o 2 * workers zakresów.
+    """
+    if workers is None:
+        workers = EXTRACTION_WORKERS
+    backends = pdf_extractors.choose_backends(pdf_path, PDF_TEXT_EXTRACTOR)
+
+    page_ranges = [(first, min(first + EXTRACTION_PAGES_PER_TASK, end_index))
+                   for first in range(start_index, end_index, EXTRACTION_PAGES_PER_TASK)]
+
+    if workers <= 1 or len(page_ranges) <= 1:
+        for first, last in page_ranges:
+            yield first, pdf_extractors.extract_pages(pdf_path, first, last, backends)
+        return
+
+    # Procesy puli startują z czystego procesu (forkserver, a bez niego spawn), a nie przez fork procesu z wątkami
+    # (równoległe pliki, strumienie odpowiedzi) - fork mógłby skopiować zablokowaną blokadę i zawiesić proces potomny.
+    # Zadaniem jest funkcja z modułu pdf_extractors, który proces potomny importuje po nazwie.
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=min(workers, len(page_ranges)),
+                             mp_context=multiprocessing.get_context(start_method)) as executor:
+        pending = collections.deque()
+        for first, last in page_ranges:
+            pending.append((first, executor.submit(pdf_extractors.extract_pages, pdf_path, first, last, backends)))
+            if len(pending) >= 2 * workers:
+                first_done, future = pending.popleft()
+                yield first_done, future.result()
+        while pending:
+            first_done, future = pending.popleft()
+            yield first_done, future.result()
+
+
+def extract_page_texts(pdf_path, start_index, end_index, workers=None):
+    """
+    Wyodrębnia teksty stron [start_index, end_index) i zwraca je jako listę w kolejności stron.
+    """
+    return [page_text for _, range_pages in iter_extracted_ranges(pdf_path, start_index, end_index, workers)
+            for page_text, _ in range_pages]
+
+
+# --- Liczba stron PDF (z cache, bez ponownego otwierania pliku) ---
+def get_pdf_page_count(pdf_path):
+    if USE_PDF_TEXT_CACHE:
+        num_pages = pdf_text_cache.get_cached_page_count(pdf_path, PDF_TEXT_CACHE_FOLDER)
+        if num_pages is not None:
+            return num_pages
+
+    num_pages = pdf_extractors.page_count(pdf_path)
+
+    if USE_PDF_TEXT_CACHE:
+        pdf_text_cache.store_page_count(pdf_path, num_pages, PDF_TEXT_CACHE_FOLDER)
+    return num_pages
+
+
+# --- Teksty stron z cache, a przy jego braku ekstrakcja i zapis do cache (generator, strona po stronie) ---
+def iter_page_texts(pdf_path, start_index, end_index, num_pages):
+    if USE_PDF_TEXT_CACHE:
+        page_texts = pdf_text_cache.get_cached_pages(pdf_path, PDF_TEXT_EXTRACTOR, start_index, end_index,
+                                                     PDF_TEXT_CACHE_FOLDER)
+        if page_texts is not None:
+            print(f"  INFO: Tekst stron {start_index + 1}-{end_index} pobrano z cache (bez ponownej ekstrakcji).")
+            yield from page_texts
+            return
+
+    # Wpisy cache są zapisywane pod ekstraktorem faktycznie użytym dla dokumentu (także przy "auto")
+    backend = pdf_extractors.choose_backends(pdf_path, PDF_TEXT_EXTRACTOR)[0]
+    page_backends = collections.Counter()  # Ile stron odczytał każdy ekstraktor
+    for first, range_pages in iter_extracted_ranges(pdf_path, start_index, end_index):
+        range_texts = [page_text for page_text, _ in range_pages]
+        range_backends = [backend for _, backend in range_pages]
+        page_backends.update(range_backends)
+        if USE_PDF_TEXT_CACHE:
+            # Zapis zakres po zakresie - przerwana ekstrakcja zostawia w cache już wyodrębnione strony
+            pdf_text_cache.store_pages(pdf_path, PDF_TEXT_EXTRACTOR, backend, first, range_texts,
+                                       PDF_TEXT_CACHE_FOLDER, range_backends)
+        yield from range_texts
+    print(f"  INFO: Ekstraktory stron {start_index + 1}-{end_index} pliku '{os.path.basename(pdf_path)}': "
+          f"{pdf_extractors.describe_page_backends(page_backends)}.")
+
+
+def get_page_texts(pdf_path, start_index, end_index, num_pages):
+    return list(iter_page_texts(pdf_path, start_index, end_index, num_pages))
 
 
 # --- Funkcja do ekstrakcji CAŁEGO tekstu ---
 def extract_text_from_pdf_full(pdf_path):
-    text = ""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        num_pages = get_pdf_page_count(pdf_path)
+        page_texts = get_page_texts(pdf_path, 0, num_pages, num_pages)
     except Exception as e:
         print(f"BŁĄD: Nie można wyodrębnić tekstu z {pdf_path}: {e}")
         return None
-    return text.strip()
+    return "\n".join(page_text for page_text in page_texts if page_text).strip()
 
 
-# --- Funkcja do ekstrakcji tekstu z WYBRANYCH STRON ---
-def extract_selected_pages_from_pdf(pdf_path, start_page, end_page):
-    text = ""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            num_pages = len(pdf.pages)
+# --- Strumieniowa ekstrakcja tekstu z WYBRANYCH STRON (teksty stron oddawane kolejno) ---
+def iter_selected_pages_from_pdf(pdf_path, start_page, end_page):
+    num_pages = get_pdf_page_count(pdf_path)
 
-            actual_start_index = max(0, start_page - 1)
-            actual_end_index = min(num_pages, end_page)
+    actual_start_index = max(0, start_page - 1)
+    actual_end_index = min(num_pages, end_page)
 
-            if actual_start_index >= num_pages:
-                print(
-                    f"OSTRZEŻENIE: Strona początkowa {start_page} wykracza poza liczbę stron PDF ({num_pages}). Zwracam pusty tekst.")
-                return ""
-            if actual_start_index >= actual_end_index:
-                print(
-                    f"OSTRZEŻENIE: Zakres stron ({start_page}-{end_page}) jest nieprawidłowy lub pusty. Zwracam pusty tekst.")
-                return ""
+    if actual_start_index >= num_pages:
+        print(
+            f"OSTRZEŻENIE: Strona początkowa {start_page} wykracza poza liczbę stron PDF ({num_pages}). Zwracam pusty tekst.")
+        return
+    if actual_start_index >= actual_end_index:
+        print(
+            f"OSTRZEŻENIE: Zakres stron ({start_page}-{end_page}) jest nieprawidłowy lub pusty. Zwracam pusty tekst.")
+        return
 
-            print(
-                f"Ekstrakcja stron od {actual_start_index + 1} do {actual_end_index} z pliku '{os.path.basename(pdf_path)}'...")
+    print(
+        f"Ekstrakcja stron od {actual_start_index + 1} do {actual_end_index} z pliku '{os.path.basename(pdf_path)}'...")
 
-            for i in range(actual_start_index, actual_end_index):
-                page = pdf.pages[i]
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-                else:
-                    print(f"  INFO: Strona {i + 1} jest pusta lub nie zawiera tekstu.")
+    page_texts = iter_page_texts(pdf_path, actual_start_index, actual_end_index, num_pages)
+    for offset, page_text in enumerate(page_texts):
+        if not page_text:
+            print(f"  INFO: Strona {actual_start_index + offset + 1} jest pusta lub nie zawiera tekstu.")
+        yield page_text
+
+
+# --- Strumieniowy odpowiednik "\n".join(niepuste strony).strip() - tekst dokumentu oddawany strona po stronie ---
+def iter_joined_pages(page_texts):
+    leading = True
+    pending_whitespace = ""  # Białe znaki na końcu strony - oddawane dopiero, gdy pojawi się za nimi dalszy tekst
+    first_page = True
+    for page_text in page_texts:
+        if not page_text:
+            continue
+        piece = page_text if first_page else "\n" + page_text
+        first_page = False
+        if leading:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            leading = False
+        body = piece.rstrip()
+        if body:
+            yield pending_whitespace + body
+            pending_whitespace = piece[len(body):]
+        else:
+            pending_whitespace += piece
+
+
+# --- Funkcja do ekstrakcji tekstu z WYBRANYCH STRON ---
+def extract_selected_pages_from_pdf(pdf_path, start_page, end_page):
+    try:
+        return "".join(iter_joined_pages(iter_selected_pages_from_pdf(pdf_path, start_page, end_page)))
     except Exception as e:
         print(f"BŁĄD: Nie można wyodrębnić tekstu z {pdf_path} dla stron {start_page}-{end_page}: {e}")
         return None
-    return text.strip()
 
 
 # --- Funkcja do interaktywnego pobierania zakresu stron ---
@@ -107,124 +304,723 @@ def get_page_range_input(pdf_file_name, total_pages):
             print("Nieprawidłowy wybór. Proszę wybrać 1 lub 2.")
 
 
-def analyze_text_with_bielik(text_to_analyze, prompt_prefix=""):
+# --- Tryb wsadowy (bez input()): zakresy stron z manifestu lub z linii poleceń ---
+def load_page_range_manifest(manifest_path):
     """
-    Analizuje tekst używając modelu BIELIK poprzez Ollama API.
+    Wczytuje manifest JSON lub YAML w postaci:
+        {"default": "all", "files": {"SPRZECIW_*.pdf": "1-5", "Gmail_True_Justice.pdf": "58-88"}}
+    Klucze w "files" to nazwy plików lub wzorce glob. Zwraca listę par (wzorzec, zakres) w kolejności pierwszeństwa.
     """
-    if not text_to_analyze.strip():
-        print("INFO: Brak tekstu do analizy dla BIELIKA. Zwracam pusty string.")
-        return ""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        if manifest_path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("Manifest YAML wymaga pakietu PyYAML (pip install pyyaml) - użyj JSON lub zainstaluj pakiet.")
+            manifest = yaml.safe_load(f) or {}
+        else:
+            manifest = json.load(f)
 
-    # Dzielenie tekstu na chunki na podstawie liczby znaków
-    # textwrap.wrap dzieli tekst na listę stringów, każdy o maksymalnej długości CHUNK_SIZE
-    chunks = textwrap.wrap(text_to_analyze, CHUNK_SIZE, break_long_words=False, replace_whitespace=False,
-                           drop_whitespace=False)
+    page_ranges = [(pattern, spec) for pattern, spec in (manifest.get("files") or {}).items()]
+    page_ranges.append(("*", manifest.get("default", "all")))
+    return page_ranges
 
-    if not chunks:
-        print("OSTRZEŻENIE: Tekst nie został podzielony na chunki prawidłowo. Zwracam pusty string.")
-        return ""
 
-    full_analysis = []
-    print(f"Tekst zostanie podzielony na {len(chunks)} części do analizy przez BIELIKA.")
+def parse_page_range_arguments(page_arguments):
+    """Zamienia argumenty --pages 'WZORZEC=ZAKRES' (np. 'SPRZECIW_*.pdf=1-5') na listę par (wzorzec, zakres)."""
+    page_ranges = []
+    for argument in page_arguments or []:
+        pattern, separator, spec = argument.rpartition("=")
+        if not separator or not pattern:
+            raise ValueError(f"Nieprawidłowy argument --pages '{argument}'. Użyj formatu 'WZORZEC=START-KONIEC'.")
+        page_ranges.append((pattern, spec))
+    return page_ranges
 
-    for i, chunk in enumerate(chunks):
-        print(f"Analizuję część {i + 1}/{len(chunks)} ({len(chunk)} znaków) z BIELIKIEM...")
 
-        # Prompt dla BIELIKA - dostosowany do analizy prawnej
-        base_prompt = (
-                f"Jesteś wysoce doświadczonym ekspertem prawnym, specjalizującym się w prawie cywilnym, egzekucyjnym i socjalnym w Polsce. "
-                f"Przeanalizuj dokument pod kątem Prawa Polskiego i Unii Europejskiej, zidentyfikuj kluczowe fakty prawne, terminy, strony, roszczenia, zobowiązania, dowody oraz oświadczenia dotyczące sytuacji finansowej i zdrowotnej Łukasza Andruszkiewicza. "
-                f"Szczególną uwagę zwróć na: odniesienia do sytuacji finansowej, długów, dochodów, zatrudnienia, prób znalezienia pracy; szczegóły stanu zdrowia, wypadków, urazów, braku ubezpieczenia; wzmianki o próbach uzyskania pomocy od instytucji; konieczność podjęcia pracy zdalnej; oświadczenia dotyczące braku majątku i trudności egzystencji; adresatów, daty i sygnatury akt. Zacytuj odpowiednie artykuły i opisz jakie prawa zostały złamane. "
-                f"Wynik podaj w języku Polskim i Angielskim. Podaj również na końcu treść użytego promptu - analogicznie w języku "
-                f"Polskim i Angielskim, a także wersję modelu jaki został użyty - czyli: Bielik-4.5B-v3.0-Instruct-Q4_K_M.gguf,"
-                f"z pełnym timestamp: " + full_timestamp
-        )
-        # Łączenie promptu prefix (jeśli istnieje) z bazowym promptem i tekstem do analizy
-        prompt_content = f"{prompt_prefix}\n\n{base_prompt}\n\nTekst do analizy:\n\n{chunk}"
-
-        messages_payload = [
-            {'role': 'user', 'content': prompt_content}
-        ]
-
-        request_body = json.dumps({
-            "model": MODEL_NAME,
-            "messages": messages_payload,
-            "stream": False,
-            # Można dodać opcje, jeśli BIELIK/Ollama je wspiera, np.:
-            # "options": {
-            #     "temperature": 0.2,
-            #     "top_p": 0.9,
-            #     "top_k": 30
-            # }
-        })
-
-        chunk_analysis_part = ""
+def resolve_page_range(pdf_file_name, total_pages, page_ranges):
+    """
+    Zwraca (start, koniec) dla pliku na podstawie pierwszego pasującego wzorca; domyślnie wszystkie strony.
+    Zakres: "all", "N", "N-M" lub lista [N, M]. Koniec wykraczający poza dokument jest przycinany do liczby stron.
+    """
+    for pattern, spec in page_ranges:
+        if not fnmatch.fnmatch(pdf_file_name, pattern):
+            continue
         try:
-            conn = http.client.HTTPConnection(OLLAMA_HOST, OLLAMA_PORT, timeout=None)  # Timeout 5 minut
-            headers = {'Content-Type': 'application/json'}
-
-            print(f"  Wysyłanie zapytania do BIELIK API (Ollama) dla części {i + 1}...")
-            conn.request("POST", "/api/chat", body=request_body, headers=headers)
-            response = conn.getresponse()
-            response_data_raw = response.read()
-            response_data_decoded = response_data_raw.decode('utf-8')
-            conn.close()
-
-            print(f"  Status odpowiedzi BIELIK API dla części {i + 1}: {response.status}")
-
-            if response.status == 200:
-                result = json.loads(response_data_decoded)
-                if 'message' in result and 'content' in result['message']:
-                    chunk_analysis_part = result['message']['content'].strip()
-                    full_analysis.append(chunk_analysis_part)
-                    print(
-                        f"  Otrzymano analizę od BIELIKA dla części {i + 1} (fragment): {chunk_analysis_part[:100]}...")
-                else:
-                    print(
-                        f"  OSTRZEŻENIE: BIELIK nie zwrócił oczekiwanej treści w 'message.content' dla części {i + 1}.")
-                    print(f"  Pełna odpowiedź BIELIKA: {response_data_decoded}")
-                    full_analysis.append(
-                        f"[BRAK ANALIZY OD BIELIKA DLA TEJ CZĘŚCI - NIEPRAWIDŁOWY FORMAT ODPOWIEDZI]\n{response_data_decoded}\n")
+            if spec is None or str(spec).strip().lower() in ("all", "wszystkie", ""):
+                return 1, total_pages
+            if isinstance(spec, (list, tuple)):
+                start_page, end_page = int(spec[0]), int(spec[1])
             else:
-                print(f"  BŁĄD: Serwer BIELIK (Ollama) zwrócił błąd HTTP {response.status} dla części {i + 1}.")
-                print(f"  Odpowiedź serwera: {response_data_decoded}")
-                full_analysis.append(
-                    f"[BŁĄD SERWERA BIELIK ({response.status}) DLA TEJ CZĘŚCI]\n{response_data_decoded}\n")
+                start_str, _, end_str = str(spec).partition("-")
+                start_page = int(start_str)
+                end_page = int(end_str) if end_str else start_page
+            end_page = min(end_page, total_pages)
+            if 1 <= start_page <= end_page:
+                print(f"INFO: Plik '{pdf_file_name}': zakres stron {start_page}-{end_page} (wzorzec '{pattern}').")
+                return start_page, end_page
+        except (ValueError, IndexError, TypeError):
+            pass
+        print(f"OSTRZEŻENIE: Nieprawidłowy zakres '{spec}' dla pliku '{pdf_file_name}' (wzorzec '{pattern}'). "
+              f"Przetwarzam wszystkie strony.")
+        return 1, total_pages
+    return 1, total_pages
+
+
+# --- Cache odpowiedzi BIELIKA ---
+def get_cached_bielik_response(messages_payload, options):
+    """
+    Zwraca (klucz_cache, odpowiedź_z_cache lub None). full_timestamp nie wpływa na klucz, opcje wysyłane do Ollamy
+    (num_ctx i num_predict ustalone w tym przebiegu) - tak.
+    """
+    if not USE_LLM_RESPONSE_CACHE:
+        return None, None
+    cache_key = llm_response_cache.make_key(MODEL_NAME, messages_payload, options, volatile_values=(full_timestamp,))
+    if BYPASS_LLM_RESPONSE_CACHE:
+        return cache_key, None
+    return cache_key, llm_response_cache.get(cache_key, (full_timestamp,), LLM_RESPONSE_CACHE_FOLDER)
 
-        except http.client.RemoteDisconnected as e:
-            print(
-                f"KRYTYCZNY BŁĄD: Połączenie z serwerem BIELIK (Ollama) zostało nieoczekiwanie zamknięte dla części {i + 1}: {e}")
-            full_analysis.append(f"[BŁĄD POŁĄCZENIA Z BIELIKIEM (RemoteDisconnected) DLA TEJ CZĘŚCI: {e}]\n")
-        except ConnectionRefusedError as e:
-            print(
-                f"KRYTYCZNY BŁĄD: Nie można połączyć się z serwerem BIELIK (Ollama) - {OLLAMA_HOST}:{OLLAMA_PORT}. Upewnij się, że serwer działa. Błąd: {e}")
-            full_analysis.append(f"[BŁĄD POŁĄCZENIA Z BIELIKIEM (ConnectionRefused) DLA TEJ CZĘŚCI: {e}]\n")
-            # Można tu dodać `return ""` jeśli chcemy przerwać całą analizę pliku przy braku połączenia
+
+def store_bielik_response(cache_key, response_text):
+    if cache_key is not None:
+        llm_response_cache.put(cache_key, response_text, (full_timestamp,), LLM_RESPONSE_CACHE_FOLDER)
+
+
+# --- Równoległe wysyłanie zadań do jednego lub wielu serwerów Ollama ---
+# Wspólny przydział serwerów, gdy skrypt działa w usłudze zadań (job_service.py) - części analiz czekają wtedy
+# w jednej kolejce priorytetowej z poprawkami akapitów. None - każde wywołanie ma własny przydział serwerów.
+ollama_scheduler = None
+
+
+# --- Przerwanie trwającego przebiegu z zewnątrz (usługa zadań: DELETE /jobs/<id>) ---
+# Jak Ctrl+C: wyjątek nie jest przechwytywany przez obsługę błędów "except Exception", a części już ukończone
+# zostają w dzienniku przebiegu, więc wznowienie z tym samym run_id ich nie powtarza.
+class AnalysisCancelled(BaseException):
+    pass
+
+
+cancel_event = threading.Event()  # Usługa zadań podstawia zdarzenie anulowania bieżącego zadania
+
+
+def check_cancelled():
+    if cancel_event.is_set():
+        raise AnalysisCancelled()
+
+
+def dispatch_to_ollama_backends(tasks, handler):
+    """
+    Wywołuje handler(task, host, port) dla każdego zadania, rozkładając je na serwery z OLLAMA_BACKENDS.
+    Na każdym serwerze jednocześnie trwa najwyżej MAX_IN_FLIGHT_PER_BACKEND zapytań.
+    Generator - zadania są pobierane leniwie, a wyniki zwracane w kolejności zadań.
+    """
+    scheduler = ollama_scheduler or backend_scheduler.BackendScheduler(OLLAMA_BACKENDS, MAX_IN_FLIGHT_PER_BACKEND)
+
+    def run_on_free_backend(task):
+        # Czeka, aż któryś serwer będzie miał wolne miejsce (zadania interaktywne usługi mają pierwszeństwo)
+        with scheduler.slot(backend_scheduler.BATCH_PRIORITY) as (host, port):
+            check_cancelled()
+            return handler(task, host, port)
+
+    max_workers = scheduler.capacity
+    if max_workers <= 1:
+        for task in tasks:
+            yield run_on_free_backend(task)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(executor.submit(run_on_free_backend, task))
+            if len(pending) >= max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- Etapy potoku strumieniowego w wątkach tła, połączone kolejkami o ograniczonym rozmiarze ---
+_END_OF_STREAM = object()
+
+
+class PdfExtractionError(Exception):
+    pass
+
+
+class _StageFailure:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(items, buffer_size):
+    """
+    Generator oddający elementy items, które wątek tła wytwarza z wyprzedzeniem najwyżej buffer_size elementów.
+    Wyjątek wątku tła jest zgłaszany u odbiorcy; zamknięcie generatora zatrzymuje wątek tła.
+    """
+    buffer = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_END_OF_STREAM)
+        except BaseException as e:  # Także AnalysisCancelled - odbiorca nie może czekać bez końca
+            put(_StageFailure(e))
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, _StageFailure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+class BackgroundStage:
+    """
+    Etap potoku w wątku tła: consume(elementy) otrzymuje iterator elementów przekazywanych przez put()
+    (kolejka najwyżej buffer_size elementów). Błąd etapu jest wypisywany i nie zatrzymuje głównego potoku.
+    """
+
+    def __init__(self, name, consume, buffer_size):
+        self.name = name
+        self.items = queue.Queue(maxsize=buffer_size)
+        self.thread = threading.Thread(target=self._run, args=(consume,), daemon=True)
+        self.thread.start()
+
+    def _iter_items(self):
+        while True:
+            item = self.items.get()
+            if item is _END_OF_STREAM:
+                return
+            yield item
+
+    def _run(self, consume):
+        items = self._iter_items()
+        try:
+            consume(items)
         except Exception as e:
-            print(f"KRYTYCZNY BŁĄD: Podczas komunikacji z BIELIK API (Ollama) dla części {i + 1}: {e}")
-            print(f"  Typ błędu: {type(e).__name__}")
-            full_analysis.append(f"[BŁĄD ANALIZY BIELIK DLA TEJ CZĘŚCI: {e}]\n")
-            if 'response_data_decoded' in locals():  # Jeśli zdążyło pobrać odpowiedź
-                print(f"  Surowa odpowiedź (jeśli dostępna): {response_data_decoded}")
+            print(f"OSTRZEŻENIE: Etap potoku '{self.name}' przerwany: {e}")
+        for _ in items:  # Odbiór pozostałych elementów do końca strumienia, aby put() nie zablokował się na stałe
+            pass
+
+    def put(self, item):
+        self.items.put(item)
+
+    def tee(self, items):
+        """Przekazuje elementy dalej bez zmian, równocześnie wysyłając je do tego etapu."""
+        for item in items:
+            self.put(item)
+            yield item
+
+    def close(self):
+        self.items.put(_END_OF_STREAM)
+        self.thread.join()
+
+
+# --- Przyrostowy zapis strumienia odpowiedzi do pliku wynikowego i na konsolę, w kolejności części ---
+class OrderedStreamWriter:
+    """
+    Fragmenty części, której wszystkie poprzedniczki są już ukończone, są zapisywane od razu (plik + konsola).
+    Fragmenty dalszych części (przy równoległej analizie) czekają w buforze, aż przyjdzie ich kolej.
+    Przerwanie programu zostawia w pliku wszystko, co zostało wygenerowane dla bieżącej części.
+    """
+
+    def __init__(self, output_path, separator):
+        self.output_file = open(output_path, "w", encoding="utf-8") if output_path else None
+        self.separator = separator
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.buffers = {}
+        self.started = set()
+        self.finished = set()
+
+    def _emit(self, index, text):
+        if index not in self.started:
+            self.started.add(index)
+            if index > 0:
+                text = self.separator + text
+        if self.output_file:
+            self.output_file.write(text)
+            self.output_file.flush()
+        print(text, end="", flush=True)
+
+    def write(self, index, text):
+        with self.lock:
+            if index == self.next_index:
+                self._emit(index, text)
+            else:
+                self.buffers.setdefault(index, []).append(text)
+
+    def finish(self, index, result_text):
+        """Zamyka część; result_text jest zapisywany tylko wtedy, gdy dla części nic nie przyszło strumieniem."""
+        with self.lock:
+            if index not in self.started and index not in self.buffers:
+                self.buffers[index] = [result_text]
+            self.finished.add(index)
+            while self.next_index in self.finished:
+                for text in self.buffers.pop(self.next_index, []):
+                    self._emit(self.next_index, text)
+                self.next_index += 1
+                for text in self.buffers.pop(self.next_index, []):
+                    self._emit(self.next_index, text)
+            print(flush=True)
+
+    def close(self):
+        if self.output_file:
+            self.output_file.close()
+
+
+# Prompt dla BIELIKA - dostosowany do analizy prawnej (bez znacznika czasu, aby był identyczny we wszystkich zapytaniach)
+ANALYSIS_INSTRUCTIONS = (
+    f"Jesteś wysoce doświadczonym ekspertem prawnym, specjalizującym się w prawie cywilnym, egzekucyjnym i socjalnym w Polsce. "
+    f"Przeanalizuj dokument pod kątem Prawa Polskiego i Unii Europejskiej, zidentyfikuj kluczowe fakty prawne, terminy, strony, roszczenia, zobowiązania, dowody oraz oświadczenia dotyczące sytuacji finansowej i zdrowotnej Łukasza Andruszkiewicza. "
+    f"Szczególną uwagę zwróć na: odniesienia do sytuacji finansowej, długów, dochodów, zatrudnienia, prób znalezienia pracy; szczegóły stanu zdrowia, wypadków, urazów, braku ubezpieczenia; wzmianki o próbach uzyskania pomocy od instytucji; konieczność podjęcia pracy zdalnej; oświadczenia dotyczące braku majątku i trudności egzystencji; adresatów, daty i sygnatury akt. Zacytuj odpowiednie artykuły i opisz jakie prawa zostały złamane. "
+    f"Wynik podaj w języku Polskim i Angielskim. Podaj również na końcu treść użytego promptu - analogicznie w języku "
+    f"Polskim i Angielskim, a także wersję modelu jaki został użyty - czyli: Bielik-4.5B-v3.0-Instruct-Q4_K_M.gguf,"
+)
+
+
+def build_analysis_prompt(chunk, prompt_prefix=""):
+    base_prompt = ANALYSIS_INSTRUCTIONS + "z pełnym timestamp: " + full_timestamp
+    # Łączenie promptu prefix (jeśli istnieje) z bazowym promptem i tekstem do analizy
+    return f"{prompt_prefix}\n\n{base_prompt}\n\nTekst do analizy:\n\n{chunk}"
+
+
+# --- Wiadomości dla Ollama /api/chat: stały prefiks (system) na początku, zmienne dane na końcu ---
+def build_bielik_messages(instructions, variable_content):
+    if not USE_SYSTEM_PROMPT:
+        return [{'role': 'user', 'content': f"{instructions}\n\n{variable_content}"}]
+    return [
+        {'role': 'system', 'content': instructions},
+        {'role': 'user', 'content': variable_content},
+    ]
+
+
+def build_analysis_messages(chunk, prompt_prefix=""):
+    if not USE_SYSTEM_PROMPT:
+        return [{'role': 'user', 'content': build_analysis_prompt(chunk, prompt_prefix)}]
+    # prompt_prefix i timestamp są stałe w obrębie przebiegu, więc stoją przed tekstem części
+    variable_content = f"Pełny timestamp: {full_timestamp}\n\nTekst do analizy:\n\n{chunk}"
+    if prompt_prefix:
+        variable_content = f"{prompt_prefix}\n\n{variable_content}"
+    return build_bielik_messages(ANALYSIS_INSTRUCTIONS + "z pełnym timestamp podanym w wiadomości.", variable_content)
+
+
+def count_message_tokens(messages_payload):
+    return sum(text_chunker.count_tokens(message['content']) for message in messages_payload)
+
+
+# --- Wersja analizy: zmiana modelu, Modfile, promptu lub podziału na części unieważnia wyniki w manifeście ---
+def analysis_version():
+    version_material = json.dumps([
+        MODEL_NAME, llm_response_cache.modfile_fingerprint(), ANALYSIS_INSTRUCTIONS, USE_SYSTEM_PROMPT,
+        MODEL_CONTEXT_TOKENS, RESPONSE_TOKEN_RESERVE, CHUNK_OVERLAP_TOKENS, PDF_TEXT_EXTRACTOR,
+        generation_options.TASK_PROFILES["analysis"], USE_DEDUPLICATION, DEDUP_SIMILARITY_THRESHOLD,
+        DEDUPLICATION_VERSION,
+    ], ensure_ascii=False)
+    return hashlib.sha256(version_material.encode("utf-8")).hexdigest()[:16]
+
+
+# --- Metryki wywołań bieżącego przebiegu (tworzone w process_all_pdfs_with_bielik) ---
+call_metrics_log = None
+
+
+def record_call_metrics(part_description, host, port, response_data=None, wall_seconds=0.0, sent_prompt_tokens=0,
+                        cached=False):
+    if call_metrics_log is not None:
+        metrics = call_metrics.from_ollama_response(response_data, wall_seconds, sent_prompt_tokens)
+        call_metrics_log.record(part_description, metrics, backend=f"{host}:{port}", cached=cached)
+
+
+# --- Ustawienia zapytań dla każdego serwera, ustalane raz na przebieg ---
+# num_ctx załadowanego modelu (/api/ps) i keep_alive (rejestr przypięć) nie są sprawdzane przy każdym zapytaniu:
+# Ollama ładuje model z num_ctx ostatniego zapytania, więc po każdym zapytaniu zapamiętywany jest wysłany num_ctx.
+backend_settings = {}  # (host, port, model) -> {"loaded_context": ..., "keep_alive": ...}
+backend_settings_lock = threading.Lock()
+
+
+def get_backend_settings(host, port, model=None):
+    model = model or MODEL_NAME
+    with backend_settings_lock:
+        if (host, port, model) not in backend_settings:
+            backend_settings[(host, port, model)] = {
+                "loaded_context": model_lifecycle.loaded_context_length(host, port, model),
+                "keep_alive": model_lifecycle.keep_alive_for(host, port, model, OLLAMA_KEEP_ALIVE),
+            }
+        return backend_settings[(host, port, model)]
+
+
+def reset_backend_settings():
+    """Na początku przebiegu (lub zadania usługi) - przypięcia i załadowane modele mogły się zmienić."""
+    with backend_settings_lock:
+        backend_settings.clear()
+
+
+# --- Wspólna obsługa zapytania do BIELIKA (analiza części i globalne podsumowanie) ---
+def request_bielik_response(messages_payload, host, port, part_description, error_scope, missing_marker,
+                            stream_writer=None, stream_index=0, task="analysis"):
+    """
+    Wysyła wiadomości do BIELIKA przez wspólnego klienta (pula połączeń keep-alive, limit czasu, ponowienia)
+    i zwraca (tekst, ok): treść odpowiedzi (ok=True) albo tekst ze znacznikiem błędu [BŁĄD ...] / [BRAK ...]
+    wstawiany do wyniku (ok=False). O powodzeniu decyduje ok, a nie treść - odpowiedź może cytować takie znaczniki.
+    Przy STREAM_RESPONSES kolejne fragmenty odpowiedzi trafiają na bieżąco do stream_writer.
+    task - profil opcji z generation_options.TASK_PROFILES (limit odpowiedzi num_predict, num_ctx).
+    """
+    prompt_tokens = count_message_tokens(messages_payload)
+    settings = get_backend_settings(host, port)
+    options = generation_options.options_for(task, prompt_tokens, max_context=MODEL_CONTEXT_TOKENS,
+                                             loaded_context=settings["loaded_context"])
+    cache_key, cached_response = get_cached_bielik_response(messages_payload, options)
+    if cached_response is not None:
+        print(f"  Odpowiedź dla {part_description} pobrana z cache odpowiedzi BIELIKA (bez zapytania do modelu).")
+        record_call_metrics(part_description, host, port, cached=True)
+        return cached_response, True
+
+    streamed_parts = []
+
+    def on_token(token):
+        check_cancelled()  # Przerywa odczyt strumienia i zamyka połączenie z Ollamą
+        streamed_parts.append(token)
+        if stream_writer:
+            stream_writer.write(stream_index, token)
+
+    def with_partial_text(error_marker):
+        # Tekst wygenerowany przed awarią nie jest tracony - zostaje w wyniku razem z opisem błędu
+        if not streamed_parts:
+            return error_marker
+        if stream_writer:
+            stream_writer.write(stream_index, f"\n\n{error_marker}")
+        return "".join(streamed_parts).strip() + "\n\n" + error_marker
+
+    client = ollama_client.get_client(host, port, OLLAMA_REQUEST_TIMEOUT)
+    try:
+        settings["loaded_context"] = options["num_ctx"]
+        print(f"  Wysyłanie zapytania do BIELIK API (Ollama) dla {part_description} "
+              f"(num_ctx {options['num_ctx']}, num_predict {options['num_predict']})...")
+        request_start = time.monotonic()
+        response = client.chat(MODEL_NAME, messages_payload, stream=STREAM_RESPONSES, on_token=on_token,
+                               options=options, keep_alive=settings["keep_alive"])
+        print(f"  Status odpowiedzi BIELIK API dla {part_description}: {response.status}")
+        if response.status == 200:
+            record_call_metrics(part_description, host, port, response.data, time.monotonic() - request_start,
+                                prompt_tokens)
+            response_text = (response.content or "").strip()
+            if (response.data or {}).get("done_reason") == "length":
+                # Ucięta odpowiedź nie trafia do cache ani do dziennika jako ukończona - zostanie wygenerowana ponownie
+                print(f"  OSTRZEŻENIE: Odpowiedź dla {part_description} osiągnęła limit num_predict "
+                      f"({options['num_predict']} tokenów) profilu '{task}' i jest ucięta - nie zapisuję jej w cache.")
+                truncated_marker = (f"[BŁĄD - ODPOWIEDŹ BIELIKA UCIĘTA NA LIMICIE {options['num_predict']} "
+                                    f"TOKENÓW {error_scope}]\n")
+                if stream_writer:
+                    stream_writer.write(stream_index, f"\n\n{truncated_marker}")
+                return response_text + "\n\n" + truncated_marker, False
+            if response_text:
+                store_bielik_response(cache_key, response_text)
+                print(f"  Otrzymano odpowiedź od BIELIKA dla {part_description} (fragment): {response_text[:100]}...")
+                return response_text, True
+            print(f"  OSTRZEŻENIE: BIELIK nie zwrócił oczekiwanej treści w 'message.content' dla {part_description}.")
+            print(f"  Pełna odpowiedź BIELIKA: {response.raw or response.data}")
+            return f"[{missing_marker} - NIEPRAWIDŁOWY FORMAT ODPOWIEDZI]\n{response.raw}\n", False
+
+        print(f"  BŁĄD: Serwer BIELIK (Ollama) zwrócił błąd HTTP {response.status} dla {part_description}.")
+        print(f"  Odpowiedź serwera: {response.raw}")
+        return f"[BŁĄD SERWERA BIELIK ({response.status}) {error_scope}]\n{response.raw}\n", False
+
+    except (http.client.RemoteDisconnected, ollama_client.PartialResponseError) as e:
+        print(
+            f"KRYTYCZNY BŁĄD: Połączenie z serwerem BIELIK (Ollama) zostało nieoczekiwanie zamknięte dla {part_description}: {e}")
+        return with_partial_text(f"[BŁĄD POŁĄCZENIA Z BIELIKIEM (RemoteDisconnected) {error_scope}: {e}]\n"), False
+    except ConnectionRefusedError as e:
+        print(
+            f"KRYTYCZNY BŁĄD: Nie można połączyć się z serwerem BIELIK (Ollama) - {host}:{port}. Upewnij się, że serwer działa. Błąd: {e}")
+        return with_partial_text(f"[BŁĄD POŁĄCZENIA Z BIELIKIEM (ConnectionRefused) {error_scope}: {e}]\n"), False
+    except Exception as e:
+        print(f"KRYTYCZNY BŁĄD: Podczas komunikacji z BIELIK API (Ollama) dla {part_description}: {e}")
+        print(f"  Typ błędu: {type(e).__name__}")
+        return with_partial_text(f"[BŁĄD ANALIZY BIELIK {error_scope}: {e}]\n"), False
+
+
+# --- Powtórzone strony i części bieżącego przebiegu (indeksy tworzone w process_all_pdfs_with_bielik) ---
+page_duplicates = None
+chunk_duplicates = None
+
+
+def accept_duplicate_of(pdf_file):
+    # Podobna strona tylko w obrębie pliku (jej różniące się zdania trafiają do modelu); strona innego pliku tylko
+    # jako kopia dokładna - wynik pliku nie zależy od tego, jak tamta analiza potraktowała różniące się fragmenty
+    return lambda reference, similarity_value: reference[0] == pdf_file or similarity_value == 1.0
+
+
+def accept_exact_copy(reference, similarity_value):
+    # Wynik części jest przepisywany w całości, więc podobna część (inna data lub kwota) musi zostać przeanalizowana
+    return similarity_value == 1.0
+
+
+def iter_unique_pages(page_texts, pdf_file, first_page, dependencies=None, seeding=False):
+    """
+    Strona powtarzająca stronę przeanalizowaną wcześniej w przebiegu jest zastępowana krótkim odwołaniem do niej;
+    pozostałe strony przechodzą bez zmian. Strona podobna (DEDUP_SIMILARITY_THRESHOLD) do wcześniejszej strony
+    tego pliku zachowuje po odwołaniu zdania, których tamta strona nie zawiera. Strona innego pliku musi być kopią
+    dokładną - odwołanie wskazuje wtedy plik wynikowy tamtej analizy, a dependencies (słownik plik źródłowy ->
+    zbiór stron) zbiera strony, od których zależy wynik tego pliku.
+    seeding=True - odtworzenie indeksu dla pliku wczytanego z dziennika lub manifestu (bez komunikatów i liczników).
+    """
+    accept = accept_duplicate_of(pdf_file)
+    page_sentences = {}  # Strona tego pliku -> skróty jej zdań (tylko bieżący plik, bez tekstów stron)
+    for page_number, page_text in enumerate(page_texts, start=first_page):
+        if page_duplicates is None or not page_text:
+            yield page_text
+            continue
+        match, page_signature = page_duplicates.find(page_text, accept)
+        if match is None:
+            page_duplicates.add(page_signature, (pdf_file, page_number))
+            if page_signature is not None:
+                page_sentences[page_number] = {hash(near_duplicates.sentence_key(sentence))
+                                               for sentence in near_duplicates.sentences(page_text)}
+            yield page_text
+            continue
+        (source_file, source_page), page_similarity = match
+        if source_file == pdf_file and page_similarity < 1.0:
+            source_sentences = page_sentences.get(source_page, set())
+            differing = [sentence for sentence in near_duplicates.sentences(page_text)
+                         if hash(near_duplicates.sentence_key(sentence)) not in source_sentences]
+            reference = (f"[STRONA {page_number} POWTARZA STRONĘ {source_page} TEGO PLIKU "
+                         f"(PODOBIEŃSTWO {page_similarity:.0%}) - W ANALIZIE TYLKO ZDANIA, KTÓRE SIĘ RÓŻNIĄ:]\n"
+                         + "\n".join(differing))
+        elif source_file == pdf_file:
+            reference = (f"[STRONA {page_number} POWTARZA STRONĘ {source_page} TEGO PLIKU "
+                         f"(PODOBIEŃSTWO {page_similarity:.0%}) - POMINIĘTO W ANALIZIE]")
+        else:
+            reference = (f"[STRONA {page_number} JEST KOPIĄ STRONY {source_page} PLIKU '{source_file}' - POMINIĘTO "
+                         f"W ANALIZIE, ZOB. {os.path.basename(analysis_output_path(source_file))}]")
+            if dependencies is not None:
+                dependencies.setdefault(source_file, set()).add(source_page)
+        if not seeding:
+            page_duplicates.mark_saved(page_similarity, max(0, text_chunker.count_tokens(page_text)
+                                                            - text_chunker.count_tokens(reference)))
+            print(f"  INFO: Strona {page_number} powtarza stronę {source_page} pliku '{source_file}' "
+                  f"(podobieństwo {page_similarity:.0%}) - "
+                  f"{'w analizie tylko różniące się zdania' if page_similarity < 1.0 else 'pomijam ją w analizie'}.")
+        yield reference
+
+
+def reuse_duplicate_chunk(chunk, checkpoint):
+    """
+    Zwraca (wynik, sygnatura). Wynik jest analizą części przebiegu, którą ta część powtarza (z dziennika),
+    albo None - wtedy sygnaturę przekazuje się do chunk_duplicates.add() po analizie tej części.
+    """
+    if chunk_duplicates is None or checkpoint is None:
+        return None, None
+    match, chunk_signature = chunk_duplicates.find(chunk, accept_exact_copy)
+    if match is None:
+        return None, chunk_signature
+    (source_file, source_index), chunk_similarity = match
+    source_result = checkpoint.journal.get_chunk_result_at(source_file, source_index)
+    if source_result is None:
+        return None, chunk_signature
+    chunk_duplicates.mark_saved(chunk_similarity, text_chunker.count_tokens(chunk),
+                                text_chunker.count_tokens(source_result))
+    return (f"[CZĘŚĆ JEST KOPIĄ CZĘŚCI {source_index + 1} PLIKU '{source_file}' - ANALIZA TAMTEJ CZĘŚCI]\n"
+            f"{source_result}"), None
+
+
+def seed_duplicate_indexes(plan, chunk_results_in_journal):
+    """
+    Plik wczytany z dziennika lub manifestu zasila indeksy powtórzeń tak, jak przy analizie w tym przebiegu
+    (strony z cache tekstu PDF, bez zapytań do modelu) - kolejne pliki są deduplikowane tak samo jak w przebiegu,
+    który go przeanalizował. Części trafiają do indeksu tylko wtedy, gdy ich wyniki są w dzienniku tego przebiegu.
+    """
+    page_range = plan.get("start_page"), plan.get("end_page")
+    if page_range[0] is None:
+        page_range = plan["reused"].get("page_range") or (None, None)  # Starsze wpisy dziennika nie mają zakresu
+    if page_duplicates is None or page_range[0] is None or not plan["reused"]["processed"]:
+        return
+    start_p, end_p = page_range
+    try:
+        pages = iter_unique_pages(iter_selected_pages_from_pdf(plan["path"], start_p, end_p), plan["file"],
+                                  max(1, start_p), seeding=True)
+        if not chunk_results_in_journal:
+            for _ in pages:
+                pass
+            return
+        chunks = text_chunker.iter_chunks_from_parts(iter_joined_pages(pages), analysis_chunk_budget(),
+                                                     CHUNK_OVERLAP_TOKENS)
+        for chunk_index, chunk in enumerate(chunks):
+            match, chunk_signature = chunk_duplicates.find(chunk, accept_exact_copy)
+            if match is None:
+                chunk_duplicates.add(chunk_signature, (plan["file"], chunk_index))
+    except Exception as e:
+        print(f"OSTRZEŻENIE: Nie można odtworzyć indeksu powtórzeń dla '{plan['file']}': {e}")
+
+
+def deduplication_summary_text():
+    if page_duplicates is None or chunk_duplicates is None:
+        return ""
+    pages, chunks = page_duplicates.saved, chunk_duplicates.saved
+    saved_tokens = pages["input_tokens"] + chunks["input_tokens"] + chunks["output_tokens"]
+    return (f"Deduplikacja przed inferencją: pominięto {pages['items']} powtórzonych stron "
+            f"(w tym {pages['exact']} dokładnych kopii, ~{pages['input_tokens']} tokenów tekstu) "
+            f"i {chunks['items']} powtórzonych części (~{chunks['input_tokens']} tokenów promptu, "
+            f"~{chunks['output_tokens']} tokenów odpowiedzi) - łącznie ~{saved_tokens} tokenów mniej dla BIELIKA.\n")
+
+
+def analyze_chunk_with_bielik(chunk_index, chunk, prompt_prefix, host, port, stream_writer=None):
+    """
+    Analizuje jedną część tekstu na wskazanym serwerze Ollama i zwraca (wynik lub opis błędu, ok) dla tej części.
+    """
+    print(f"Analizuję część {chunk_index + 1} ({len(chunk)} znaków) z BIELIKIEM na {host}:{port}...")
+    messages_payload = build_analysis_messages(chunk, prompt_prefix)
+    return request_bielik_response(messages_payload, host, port, f"części {chunk_index + 1}", "DLA TEJ CZĘŚCI",
+                                   "BRAK ANALIZY OD BIELIKA DLA TEJ CZĘŚCI", stream_writer, chunk_index)
+
+
+def analysis_chunk_budget(prompt_prefix=""):
+    """Limit tokenów jednej części - prompt, część i odpowiedź mieszczą się w oknie kontekstu modelu."""
+    return (MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE
+            - count_message_tokens(build_analysis_messages("", prompt_prefix)))
+
+
+def analyze_text_with_bielik(text_to_analyze, prompt_prefix="", output_path=None, checkpoint=None):
+    """
+    Analizuje tekst używając modelu BIELIK poprzez Ollama API.
+    text_to_analyze - cały tekst albo iterator kolejnych części tekstu (np. stron z potoku ekstrakcji),
+    pobieranych dopiero wtedy, gdy potrzebna jest następna część do wysłania.
+    Części tekstu są wysyłane równolegle do serwerów z OLLAMA_BACKENDS, a wyniki składane w kolejności części.
+    Przy STREAM_RESPONSES odpowiedź jest dopisywana na bieżąco do output_path (jeśli podano) i na konsolę.
+    checkpoint (run_journal.FileCheckpoint) pozwala pominąć części ukończone w przerwanym przebiegu.
+    Zwraca (analiza, ok) - ok=True, jeśli wszystkie części przeanalizowano poprawnie.
+    """
+    if isinstance(text_to_analyze, str) and not text_to_analyze.strip():
+        print("INFO: Brak tekstu do analizy dla BIELIKA. Zwracam pusty string.")
+        return "", False
 
-    final_analysis = "\n\n---\n\n".join(full_analysis)
-    return final_analysis
+    # Dzielenie tekstu na chunki na granicach artykułów, akapitów i zdań, tak aby prompt + chunk + odpowiedź
+    # zmieściły się w oknie kontekstu modelu. Chunki są generowane leniwie, w miarę wysyłania do BIELIKA.
+    chunk_token_budget = analysis_chunk_budget(prompt_prefix)
+    if isinstance(text_to_analyze, str):
+        chunks = text_chunker.iter_chunks(text_to_analyze, chunk_token_budget, CHUNK_OVERLAP_TOKENS)
+    else:
+        chunks = text_chunker.iter_chunks_from_parts(text_to_analyze, chunk_token_budget, CHUNK_OVERLAP_TOKENS)
+
+    print(f"Tekst zostanie podzielony na części do ~{chunk_token_budget} tokenów do analizy przez BIELIKA.")
+
+    stream_writer = OrderedStreamWriter(output_path, "\n\n---\n\n") if STREAM_RESPONSES else None
+
+    def analyze_task(task, host, port):
+        chunk_index, chunk = task
+        chunk_result = checkpoint.get(chunk_index, chunk) if checkpoint else None
+        chunk_ok = True
+        duplicate_result, chunk_signature = None, None
+        if chunk_result is None:
+            duplicate_result, chunk_signature = reuse_duplicate_chunk(chunk, checkpoint)
+        if chunk_result is not None:
+            print(f"  Część {chunk_index + 1} ukończona we wcześniejszym przebiegu - wynik wczytano z dziennika.")
+        elif duplicate_result is not None:
+            print(f"  Część {chunk_index + 1} powtarza część przeanalizowaną wcześniej w przebiegu - używam jej wyniku.")
+            chunk_result = duplicate_result
+            checkpoint.put(chunk_index, chunk, chunk_result, True)
+        else:
+            chunk_result, chunk_ok = analyze_chunk_with_bielik(chunk_index, chunk, prompt_prefix, host, port,
+                                                               stream_writer)
+            if checkpoint:
+                checkpoint.put(chunk_index, chunk, chunk_result, chunk_ok)
+            # Tylko poprawny wynik (zapisany w dzienniku) może posłużyć za wynik powtórzeń tej części
+            if chunk_signature is not None and chunk_ok:
+                chunk_duplicates.add(chunk_signature, (checkpoint.file_name, chunk_index))
+        if stream_writer:
+            stream_writer.finish(chunk_index, chunk_result)
+        return chunk_result, chunk_ok
 
+    try:
+        full_analysis = list(dispatch_to_ollama_backends(enumerate(chunks), analyze_task))
+    finally:
+        if stream_writer:
+            stream_writer.close()
 
-def summarize_overall_legal_findings_with_bielik(all_summaries_text):
+    if not full_analysis:
+        print("OSTRZEŻENIE: Tekst nie został podzielony na chunki prawidłowo. Zwracam pusty string.")
+        return "", False
+
+    final_analysis = "\n\n---\n\n".join(chunk_result for chunk_result, _ in full_analysis)
+    return final_analysis, all(chunk_ok for _, chunk_ok in full_analysis)
+
+
+# --- Indeks wektorowy fragmentów dokumentów źródłowych (opcjonalny) ---
+def open_vector_store():
+    if not USE_VECTOR_STORE:
+        return None
+    try:
+        return vector_store.VectorStore(vector_store.ollama_embedder(OLLAMA_HOST, OLLAMA_PORT, vector_store.EMBEDDING_MODEL),
+                                        vector_store.EMBEDDING_MODEL, VECTOR_STORE_FOLDER)
+    except Exception as e:
+        print(f"OSTRZEŻENIE: Indeks wektorowy niedostępny ({e}). Globalne podsumowanie powstanie bez fragmentów źródłowych.")
+        return None
+
+
+def retrieve_source_passages(store, queries=None, top_k=None, max_tokens=None):
+    """
+    Zwraca tekst z fragmentami dokumentów najbliższymi zapytaniom (bez powtórzeń), w limicie max_tokens tokenów.
+    """
+    max_tokens = VECTOR_STORE_MAX_PASSAGE_TOKENS if max_tokens is None else max_tokens
+    try:
+        results = store.search(queries or RETRIEVAL_QUERIES, top_k or VECTOR_STORE_TOP_K)
+    except Exception as e:
+        print(f"OSTRZEŻENIE: Wyszukiwanie w indeksie wektorowym nie powiodło się: {e}")
+        return ""
+
+    # Najpierw najlepszy fragment każdego zapytania, potem drugi itd. - każdy temat dostaje miejsce w limicie
+    passages = []
+    seen_hashes = set()
+    used_tokens = 0
+    for rank in range(max((len(r) for r in results), default=0)):
+        for query_results in results:
+            if rank >= len(query_results):
+                continue
+            _, entry = query_results[rank]
+            passage = f"[{entry['source']}]\n{entry['text'].strip()}"
+            passage_tokens = text_chunker.count_tokens(passage)
+            if entry["hash"] in seen_hashes or used_tokens + passage_tokens > max_tokens:
+                continue
+            seen_hashes.add(entry["hash"])
+            passages.append(passage)
+            used_tokens += passage_tokens
+    print(f"INFO: Z indeksu wektorowego wybrano {len(passages)} fragmentów źródłowych (~{used_tokens} tokenów).")
+    return "\n\n".join(passages)
+
+
+def summarize_overall_legal_findings_with_bielik(all_summaries_text, output_path=None, source_passages=""):
     """
     Generuje globalne podsumowanie prawne używając modelu BIELIK.
+    all_summaries_text - tekst albo text_spool.TextSpool z analizami zapisanymi na dysku, czytanymi strumieniowo.
+    Przy STREAM_RESPONSES podsumowanie jest dopisywane na bieżąco do output_path (jeśli podano) i na konsolę.
+    source_passages - fragmenty dokumentów źródłowych z indeksu wektorowego, dołączane do ostatniego wywołania.
     """
+    def iter_summary_parts():
+        if isinstance(all_summaries_text, str):
+            return iter([all_summaries_text])
+        return all_summaries_text.iter_text()
+
     print("\n\n--- Generowanie globalnego podsumowania prawnego z BIELIKIEM ---")
-    if not all_summaries_text.strip():
+    if not any(part.strip() for part in iter_summary_parts()):
         print("Brak danych do globalnego podsumowania dla BIELIKA. Zwracam pusty tekst.")
         return ""
 
-    overall_chunks = textwrap.wrap(all_summaries_text, OVERALL_SUMMARY_CHUNK_SIZE, break_long_words=False,
-                                   replace_whitespace=False, drop_whitespace=False)
-
-    overall_summary_parts = []
-
     base_overall_prompt = (
         f"Jesteś wysoce doświadczonym ekspertem prawnym, specjalizującym się w prawie cywilnym, egzekucyjnym i socjalnym w Polsce. "
         f"Twoim zadaniem jest przygotowanie kompleksowych i rzeczowych wyjaśnień dla Kancelarii Komorniczych, "
@@ -252,86 +1048,208 @@ def summarize_overall_legal_findings_with_bielik(all_summaries_text):
         f"\n\nZadbaj o to, aby wyjaśnienia były kompleksowe, spójne, rzeczowe i empatyczne, jednocześnie ściśle trzymając się faktów zawartych w dokumentacji. Tekst wygenerowany przez model będzie stanowił trzon pisma do kancelarii komorniczej."
     )
 
-    for i, chunk in enumerate(overall_chunks):
-        print(
-            f"Analizuję część {i + 1}/{len(overall_chunks)} globalnego podsumowania z BIELIKIEM ({len(chunk)} znaków)...")
-        prompt_content = f"{base_overall_prompt}\n\nAnalizy do podsumowania:\n\n{chunk}"
+    # Krótsze polecenia dla węzłów pośrednich drzewa - pełny base_overall_prompt trafia tylko do ostatniego wywołania
+    map_prompt = (
+        f"Jesteś wysoce doświadczonym ekspertem prawnym, specjalizującym się w prawie cywilnym, egzekucyjnym i socjalnym w Polsce. "
+        f"Z poniższych analiz dokumentów wypisz zwięźle wszystkie fakty potrzebne do wyjaśnień dla Kancelarii Komorniczej: "
+        f"stan zdrowia, sytuację finansową i majątkową dłużnika Łukasza Andruszkiewicza, próby znalezienia pracy, "
+        f"daty, kwoty, sygnatury akt, roszczenia i żądania. Zachowaj nazwy dokumentów, na które powołują się analizy. "
+        f"Nie pisz jeszcze pisma - podaj tylko uporządkowane fakty."
+    )
+    reduce_prompt = (
+        f"Jesteś wysoce doświadczonym ekspertem prawnym, specjalizującym się w prawie cywilnym, egzekucyjnym i socjalnym w Polsce. "
+        f"Poniżej znajdują się częściowe zestawienia faktów przygotowane z różnych fragmentów dokumentacji. "
+        f"Połącz je w jedno zwięzłe zestawienie, usuwając powtórzenia i zachowując wszystkie daty, kwoty, "
+        f"sygnatury akt oraz nazwy dokumentów."
+    )
+
+    # Drzewo jest identyfikowane skrótem danych wejściowych i poleceń - ten sam zestaw analiz wznawia te same węzły
+    tree_hash = hashlib.sha256("\x00".join(
+        [MODEL_NAME, str(SUMMARY_TREE_FAN_IN), base_overall_prompt, map_prompt, reduce_prompt, ""]).encode("utf-8"))
+    for part in iter_summary_parts():
+        tree_hash.update(part.encode("utf-8"))
+    tree_hash.update("\x00".join(
+        ["", source_passages, json.dumps(generation_options.TASK_PROFILES["global_summary"])]).encode("utf-8"))
+    tree_id = tree_hash.hexdigest()[:16]
+    tree_folder = os.path.join(SUMMARY_TREE_FOLDER, tree_id)
+    os.makedirs(tree_folder, exist_ok=True)
+
+    source_section = f"\n\n--- Fragmenty dokumentów źródłowych ---\n\n{source_passages}" if source_passages else ""
+    root_budget = (MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE - text_chunker.count_tokens(base_overall_prompt)
+                   - text_chunker.count_tokens(source_section))
+    reduce_budget = MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE - text_chunker.count_tokens(reduce_prompt)
+    tree_stats = {"levels": 0, "calls": 0, "reused": 0}
+    node_separator = "\n\n---\n\n"
+
+    # Całość mieści się w jednym wywołaniu, jeśli podział na części o limicie korzenia daje tylko jedną część
+    root_chunks = text_chunker.iter_chunks_from_parts(iter_summary_parts(), root_budget)
+    root_input = next(root_chunks, "")
+    if next(root_chunks, None) is not None:
+        root_chunks.close()
+        # Poziom 0 (map): fakty z każdego fragmentu połączonych analiz, dzielonych w miarę czytania z dysku
+        map_budget = MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE - text_chunker.count_tokens(map_prompt)
+        nodes = run_summary_tree_level(tree_folder, 0,
+                                       text_chunker.iter_chunks_from_parts(iter_summary_parts(), map_budget),
+                                       map_prompt, tree_stats)
+
+        # Kolejne poziomy (reduce): łączenie po SUMMARY_TREE_FAN_IN węzłów, aż całość zmieści się w jednym wywołaniu
+        level = 1
+        while len(nodes) > 1 and text_chunker.count_tokens(node_separator.join(nodes)) > root_budget:
+            groups = group_summary_tree_nodes(nodes, reduce_budget)
+            nodes = run_summary_tree_level(tree_folder, level, (node_separator.join(group) for group in groups),
+                                           reduce_prompt, tree_stats, pass_through=[len(group) == 1 for group in groups])
+            level += 1
+        root_input = node_separator.join(nodes)
+
+    # Korzeń: jedno wywołanie z pełnym poleceniem, strumieniowane do pliku wynikowego
+    root_path = os.path.join(tree_folder, "root.json")
+    tree_stats["levels"] += 1
+    final_overall_summary = load_summary_tree_node(root_path)
+    streamed = False
+    if final_overall_summary is not None:
+        tree_stats["reused"] += 1
+        print("  Globalne podsumowanie (korzeń drzewa) wczytano z poprzedniego uruchomienia.")
+    else:
+        stream_writer = OrderedStreamWriter(output_path, "\n\n") if STREAM_RESPONSES else None
+        streamed = stream_writer is not None
 
-        messages_payload = [{'role': 'user', 'content': prompt_content}]
-        request_body = json.dumps({
-            "model": MODEL_NAME,
-            "messages": messages_payload,
-            "stream": False
-        })
+        def summarize_root(root_text, host, port):
+            return summarize_overall_part_with_bielik("część 1", root_text, base_overall_prompt, host, port,
+                                                      stream_writer)
 
-        current_summary_part = ""
         try:
-            conn = http.client.HTTPConnection(OLLAMA_HOST, OLLAMA_PORT, timeout=None)  # Timeout 5 minut
-            headers = {'Content-Type': 'application/json'}
-
-            print(f"  Wysyłanie zapytania do BIELIK API (Ollama) dla globalnego podsumowania, część {i + 1}...")
-            conn.request("POST", "/api/chat", body=request_body, headers=headers)
-            response = conn.getresponse()
-            response_data_raw = response.read()
-            response_data_decoded = response_data_raw.decode('utf-8')
-            conn.close()
-
-            print(f"  Status odpowiedzi BIELIK API dla globalnego podsumowania, część {i + 1}: {response.status}")
-
-            if response.status == 200:
-                result = json.loads(response_data_decoded)
-                if 'message' in result and 'content' in result['message']:
-                    current_summary_part = result['message']['content'].strip()
-                    overall_summary_parts.append(current_summary_part)
-                    print(f"  Otrzymano fragment globalnego podsumowania od BIELIKA (część {i + 1}).")
-                else:
-                    print(
-                        f"  OSTRZEŻENIE: BIELIK nie zwrócił oczekiwanej treści dla globalnego podsumowania (część {i + 1}).")
-                    print(f"  Pełna odpowiedź BIELIKA: {response_data_decoded}")
-                    overall_summary_parts.append(
-                        f"[BRAK PODSUMOWANIA OD BIELIKA DLA TEJ CZĘŚCI - BŁĄD FORMATU]\n{response_data_decoded}\n")
-            else:
-                print(
-                    f"  BŁĄD: Serwer BIELIK (Ollama) zwrócił błąd HTTP {response.status} dla globalnego podsumowania (część {i + 1}).")
-                print(f"  Odpowiedź serwera: {response_data_decoded}")
-                overall_summary_parts.append(
-                    f"[BŁĄD SERWERA BIELIK ({response.status}) DLA GLOBALNEGO PODSUMOWANIA, CZĘŚĆ {i + 1}]\n{response_data_decoded}\n")
+            final_overall_summary, root_ok = list(dispatch_to_ollama_backends([root_input + source_section],
+                                                                              summarize_root))[0]
+            if stream_writer:
+                stream_writer.finish(0, final_overall_summary)
+        finally:
+            if stream_writer:
+                stream_writer.close()
+        tree_stats["calls"] += 1
+        save_summary_tree_node(root_path, final_overall_summary, root_ok)
+
+    # Plik wynikowy jest zapisywany tu tylko wtedy, gdy podsumowanie nie było do niego strumieniowane
+    if output_path and not streamed and final_overall_summary:
+        try:
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(final_overall_summary)
+        except OSError as e:
+            print(f"BŁĄD (BIELIK): Nie można zapisać globalnego podsumowania: {e}")
+
+    print(f"\n--- Drzewo globalnego podsumowania: głębokość {tree_stats['levels']}, "
+          f"wywołań modelu {tree_stats['calls']}, węzłów wznowionych z dysku {tree_stats['reused']} "
+          f"(katalog: {tree_folder}) ---")
+    return final_overall_summary
 
-        except http.client.RemoteDisconnected as e:
-            print(
-                f"KRYTYCZNY BŁĄD: Połączenie z serwerem BIELIK (Ollama) zostało nieoczekiwanie zamknięte dla globalnego podsumowania, część {i + 1}: {e}")
-            overall_summary_parts.append(
-                f"[BŁĄD POŁĄCZENIA Z BIELIKIEM (RemoteDisconnected) DLA GLOBALNEGO PODSUMOWANIA, CZĘŚĆ {i + 1}: {e}]\n")
-        except ConnectionRefusedError as e:
-            print(
-                f"KRYTYCZNY BŁĄD: Nie można połączyć się z serwerem BIELIK (Ollama) dla globalnego podsumowania - {OLLAMA_HOST}:{OLLAMA_PORT}. Błąd: {e}")
-            overall_summary_parts.append(
-                f"[BŁĄD POŁĄCZENIA Z BIELIKIEM (ConnectionRefused) DLA GLOBALNEGO PODSUMOWANIA, CZĘŚĆ {i + 1}: {e}]\n")
-        except Exception as e:
-            print(f"KRYTYCZNY BŁĄD: Podczas komunikacji z BIELIK API dla globalnego podsumowania (część {i + 1}): {e}")
-            overall_summary_parts.append(f"[GLOBALNE PODSUMOWANIE BIELIK: BŁĄD ANALIZY DLA TEJ CZĘŚCI: {e}]\n")
-            if 'response_data_decoded' in locals():
-                print(f"  Surowa odpowiedź (jeśli dostępna): {response_data_decoded}")
 
-    final_overall_summary = "\n\n".join(overall_summary_parts)
-    return final_overall_summary
+# --- Węzły drzewa globalnego podsumowania ---
+def save_summary_tree_node(node_path, node_text, ok):
+    # Węzeł ma jawny status - węzeł z błędem (ok=False) zostanie policzony ponownie przy wznowieniu
+    status = run_journal.STATUS_OK if ok and node_text else run_journal.STATUS_FAILED
+    tmp_path = node_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"status": status, "text": node_text}, f, ensure_ascii=False)
+    os.replace(tmp_path, node_path)
 
 
-def write_usage_summary(total_files, total_duration):
+def load_summary_tree_node(node_path):
+    """Tekst węzła zapisanego przez wcześniejsze uruchomienie ze statusem ok albo None."""
+    try:
+        with open(node_path, "r", encoding="utf-8") as f:
+            node = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return node["text"] if node.get("status") == run_journal.STATUS_OK else None
+
+
+def group_summary_tree_nodes(nodes, token_budget):
+    """
+    Dzieli węzły na kolejne grupy po najwyżej SUMMARY_TREE_FAN_IN węzłów mieszczące się w token_budget.
+    Jeśli limit tokenów nie pozwoliłby zmniejszyć liczby węzłów, grupy są tworzone tylko według SUMMARY_TREE_FAN_IN.
+    """
+    groups = []
+    current, current_tokens = [], 0
+    for node in nodes:
+        node_tokens = text_chunker.count_tokens(node)
+        if current and (len(current) >= SUMMARY_TREE_FAN_IN or current_tokens + node_tokens > token_budget):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(node)
+        current_tokens += node_tokens
+    if current:
+        groups.append(current)
+
+    if len(groups) == len(nodes):
+        groups = [nodes[i:i + SUMMARY_TREE_FAN_IN] for i in range(0, len(nodes), SUMMARY_TREE_FAN_IN)]
+    return groups
+
+
+def run_summary_tree_level(tree_folder, level, inputs, instruction_prompt, tree_stats, pass_through=None):
+    """
+    Liczy wszystkie węzły jednego poziomu drzewa (równolegle, przez OLLAMA_BACKENDS) i zwraca ich wyniki w kolejności.
+    Węzły zapisane na dysku przez wcześniejsze, przerwane uruchomienie są wczytywane zamiast ponownego liczenia.
+    """
+    tree_stats["levels"] += 1
+    stats_lock = threading.Lock()
+
+    def summarize_node(task, host, port):
+        node_index, node_input = task
+        if pass_through and pass_through[node_index]:
+            return node_input  # Pojedynczy węzeł w grupie przechodzi na wyższy poziom bez wywołania modelu
+        node_path = os.path.join(tree_folder, f"level{level}_node{node_index:04d}.json")
+        node_text = load_summary_tree_node(node_path)
+        if node_text is not None:
+            with stats_lock:
+                tree_stats["reused"] += 1
+            return node_text
+        node_text, node_ok = summarize_overall_part_with_bielik(f"poziom {level}, węzeł {node_index + 1}",
+                                                                node_input, instruction_prompt, host, port)
+        save_summary_tree_node(node_path, node_text, node_ok)
+        with stats_lock:
+            tree_stats["calls"] += 1
+        return node_text
+
+    nodes = list(dispatch_to_ollama_backends(enumerate(inputs), summarize_node))
+    print(f"  Poziom {level} drzewa globalnego podsumowania: {len(nodes)} węzłów.")
+    return nodes
+
+
+def summarize_overall_part_with_bielik(part_label, chunk, instruction_prompt, host, port, stream_writer=None,
+                                      stream_index=0):
+    """
+    Wysyła jedną część (węzeł) globalnego podsumowania do BIELIKA i zwraca (wynik lub opis błędu, ok) dla tej części.
+    """
+    print(f"Analizuję {part_label} globalnego podsumowania z BIELIKIEM ({len(chunk)} znaków)...")
+    messages_payload = build_bielik_messages(instruction_prompt, f"Analizy do podsumowania:\n\n{chunk}")
+    return request_bielik_response(messages_payload, host, port, f"globalnego podsumowania ({part_label})",
+                                   f"DLA GLOBALNEGO PODSUMOWANIA, {part_label.upper()}",
+                                   "BRAK PODSUMOWANIA OD BIELIKA DLA TEJ CZĘŚCI", stream_writer, stream_index,
+                                   task="global_summary")
+
+
+def write_usage_summary(total_files, total_duration, run_peak_rss=None):
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file_path = os.path.join(LOG_FOLDER, f"bielik_usage_summary_{timestamp}.txt")
 
-    # Uproszczone podsumowanie, bez tokenów, bo Ollama API ich nie zwraca standardowo
+    # Tokeny i podział czasu pochodzą z liczników zwracanych przez Ollama w każdej odpowiedzi /api/chat
     summary_content = (
         f"--- Podsumowanie Uruchomienia BLOX-TAK-BIELIK ---\n"
         f"Data i czas uruchomienia: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
         f"Przetworzone plików PDF: {total_files}\n"
         f"Użyty model BIELIK (przez Ollama): {MODEL_NAME} na {OLLAMA_HOST}:{OLLAMA_PORT}\n"
         f"Łączny czas przetwarzania: {total_duration:.2f} sekund\n"
+        f"Szczytowe zużycie pamięci (RSS) w tym przebiegu: {call_metrics.describe_peak_rss(run_peak_rss)}\n"
+        f"{deduplication_summary_text()}"
         f"--------------------------------------------------\n"
-        f"UWAGA: Zliczanie tokenów nie jest wspierane bezpośrednio przez to API Ollama. "
-        f"Sprawdź logi konsoli powyżej dla szczegółów odpowiedzi od BIELIKA.\n"
     )
+    if call_metrics_log is not None and call_metrics_log.records:
+        summary_content += (
+            f"Tokeny i czasy wywołań BIELIKA (liczniki Ollama):\n"
+            f"{call_metrics_log.summary_text()}"
+            f"Szczegóły każdego wywołania: {call_metrics_log.jsonl_path} oraz {call_metrics_log.csv_path}\n"
+        )
+    else:
+        summary_content += "Brak wywołań BIELIKA w tym przebiegu (wyniki z dziennika lub cache).\n"
 
     try:
         with open(log_file_path, "w", encoding="utf-8") as f:
@@ -341,151 +1259,540 @@ def write_usage_summary(total_files, total_duration):
         print(f"BŁĄD: Nie można zapisać pliku podsumowania zużycia (BIELIK): {e}")
 
 
-def process_all_pdfs_with_bielik():
+# --- Model przypięty na czas przebiegu wsadowego: ładowanie na wszystkich serwerach i zwolnienie po przebiegu ---
+pinned_models = []  # [(ModelLifecycle, wątek ładowania)]
+
+
+def pin_models_for_run():
+    """
+    Ładuje model równolegle na wszystkich serwerach z OLLAMA_BACKENDS (w tle - pierwsze strony są w tym czasie
+    wyodrębniane) i przypina go do końca przebiegu. Czas ładowania trafia do metryk jako osobna pozycja.
+    """
+    def pin(lifecycle, backend):
+        try:
+            was_loaded, load_seconds, data = lifecycle.pin()
+        except Exception as e:
+            print(f"OSTRZEŻENIE: Nie udało się wstępnie załadować modelu {lifecycle}: {e}. "
+                  f"Model zostanie załadowany przy pierwszym zapytaniu.")
+            return
+        if was_loaded:
+            print(f"INFO: Model {lifecycle} był już w pamięci - przypięty do końca przebiegu.")
+        else:
+            print(f"INFO: Model {lifecycle} załadowany w {load_seconds:.1f} s i przypięty do końca przebiegu.")
+        if call_metrics_log is not None:
+            call_metrics_log.record("ładowanie modelu", call_metrics.from_ollama_response(data, load_seconds),
+                                    backend=backend, file_name="ŁADOWANIE_MODELU")
+
+    # Pełne części dokumentu wypełniają okno kontekstu - model jest od razu ładowany z num_ctx dla takich części,
+    # a krótsze zapytania używają go bez przeładowania
+    load_options = {"num_ctx": MODEL_CONTEXT_TOKENS}
+    for host, port in OLLAMA_BACKENDS:
+        with backend_settings_lock:
+            backend_settings[(host, port, MODEL_NAME)] = {"loaded_context": MODEL_CONTEXT_TOKENS,
+                                                          "keep_alive": model_lifecycle.PINNED_KEEP_ALIVE}
+        lifecycle = model_lifecycle.ModelLifecycle(host, port, MODEL_NAME, OLLAMA_KEEP_ALIVE, load_options)
+        thread = threading.Thread(target=pin, args=(lifecycle, f"{host}:{port}"), name=f"pin-{host}:{port}",
+                                  daemon=True)
+        thread.start()
+        pinned_models.append((lifecycle, thread))
+
+
+def release_pinned_models():
+    for lifecycle, thread in pinned_models:
+        thread.join()
+        try:
+            print(f"INFO: Koniec przypięcia modelu {lifecycle}: {lifecycle.release()}.")
+        except Exception as e:
+            print(f"OSTRZEŻENIE: Nie udało się zwolnić modelu {lifecycle}: {e}")
+    pinned_models.clear()
+
+
+# --- Wyniki plików w dzienniku i manifeście: skrót pliku wynikowego zamiast pełnego tekstu analizy ---
+EMPTY_FILE_MARKER = "[PLIK PUSTY LUB BEZ TEKSTU DO ANALIZY]"
+
+
+def file_result_record(output_text, processed, plan=None, dependencies=None, plans_by_file=None):
+    """
+    plan - zakres stron i skrót zawartości pliku (wznowienie odtwarza z nich indeks powtórzeń).
+    dependencies - strony innych plików, do których wynik się odwołuje (iter_unique_pages); zapisywane ze skrótem
+    zawartości tamtego pliku, więc jego zmiana lub usunięcie unieważnia ten wynik (stale_dependency).
+    """
+    record = {"processed": processed, "output_sha256": text_spool.text_sha256(output_text)}
+    if plan is not None:
+        record.update(content_hash=plan["content_hash"], page_range=[plan["start_page"], plan["end_page"]])
+    if dependencies:
+        record["depends_on"] = {source_file: {"content_hash": plan_content_hash(plans_by_file[source_file]),
+                                              "pages": sorted(pages)}
+                                for source_file, pages in sorted(dependencies.items())}
+    return record
+
+
+def analysis_output_path(pdf_file):
+    # Zmieniona nazwa pliku wyjściowego, aby odróżnić od wyników Gemini
+    return os.path.join(OUTPUT_FOLDER, f"{os.path.splitext(pdf_file)[0]}_bielik_analysis.txt")
+
+
+def plan_content_hash(plan):
+    # Plik wczytany z dziennika nie ma policzonego skrótu - liczony dopiero, gdy inny plik od niego zależy
+    if plan.get("content_hash") is None:
+        plan["content_hash"] = pdf_text_cache.file_content_hash(plan["path"])
+    return plan["content_hash"]
+
+
+def stale_dependency(plan, plans_by_file):
+    """
+    Zwraca nazwę pliku, od którego zależy wynik wczytany dla planu, a który zniknął, zmienił zawartość
+    lub nie obejmuje już stron wskazanych w odwołaniach (None - zależności aktualne).
+    """
+    for source_file, dependency in plan["reused"].get("depends_on", {}).items():
+        source_plan = plans_by_file.get(source_file)
+        if source_plan is None or plan_content_hash(source_plan) != dependency["content_hash"]:
+            return source_file
+        start_p, end_p = source_plan.get("start_page"), source_plan.get("end_page")
+        if start_p is None:
+            start_p, end_p = source_plan["reused"].get("page_range") or (None, None)
+        if start_p is None or not all(start_p <= page <= end_p for page in dependency["pages"]):
+            return source_file
+    return None
+
+
+def reused_output_matches(record, output_path):
+    # Starsze wpisy zawierają pełny tekst analizy; nowe wskazują plik wynikowy, który nie mógł się od tego czasu zmienić
+    return "analysis" in record or text_spool.file_sha256(output_path) == record["output_sha256"]
+
+
+def reused_analysis_parts(plan):
+    """Tekst wyniku pliku wczytanego z dziennika lub manifestu do globalnego podsumowania - z pliku wynikowego."""
+    record = plan["reused"]
+    if "analysis" in record:
+        return record["analysis"]
+    if not record["processed"]:
+        return f"--- Analiza BIELIK dla pliku: {plan['file']} ---\n{EMPTY_FILE_MARKER}\n"
+    return text_spool.iter_text_file(plan["output"])
+
+
+def process_all_pdfs_with_bielik(run_id=None, page_ranges=None):
+    """
+    page_ranges=None - zakres stron wybierany interaktywnie dla każdego pliku (input()).
+    Lista par (wzorzec, zakres) - tryb wsadowy bez interakcji, niepasujące pliki są przetwarzane w całości.
+    Zwraca liczbę plików przeanalizowanych w tym przebiegu (bez wczytanych z dziennika).
+    """
+    rss_sampler = call_metrics.RssSampler()  # Szczyt pamięci tego przebiegu, a nie całego procesu (kolejka, usługa)
+    try:
+        return _process_all_pdfs(run_id, page_ranges, rss_sampler)
+    finally:
+        rss_sampler.stop()
+        release_pinned_models()  # Także po przerwaniu (Ctrl+C) lub błędzie
+        evict_caches()
+
+
+# --- Pilnowanie limitów rozmiaru cache - raz na przebieg, a nie przy każdym zapisie ---
+def evict_caches():
+    if USE_PDF_TEXT_CACHE:
+        pdf_text_cache.evict_to_size(PDF_TEXT_CACHE_FOLDER)
+    if USE_LLM_RESPONSE_CACHE:
+        llm_response_cache.evict(LLM_RESPONSE_CACHE_FOLDER)
+
+
+def ensure_output_folders():
+    # Tworzone dopiero przed analizą - samo wczytanie skryptu (benchmark, testy) nie zakłada katalogów
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(LOG_FOLDER, exist_ok=True)
+
+
+def _process_all_pdfs(run_id, page_ranges, rss_sampler):
     print(f"Rozpoczynam analizę plików PDF z folderu: {PDF_INPUT_FOLDER} używając BIELIKA")
+    ensure_output_folders()
+
+    # Dziennik przebiegu - ponowne uruchomienie z tym samym --run-id pomija ukończone pliki i części
+    journal = run_journal.RunJournal(RUN_JOURNAL_FOLDER, run_id or datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+    print(f"Identyfikator przebiegu: {journal.run_id} (wznowienie: --run-id {journal.run_id}). "
+          f"Ukończone pliki w dzienniku: {len(journal.files_done)}.")
+
+    global call_metrics_log, page_duplicates, chunk_duplicates
+    call_metrics_log = call_metrics.CallMetricsLog(CALL_METRICS_FOLDER, journal.run_id)
+    reset_backend_settings()
+    page_duplicates = near_duplicates.DuplicateIndex(DEDUP_SIMILARITY_THRESHOLD) if USE_DEDUPLICATION else None
+    chunk_duplicates = near_duplicates.DuplicateIndex(DEDUP_SIMILARITY_THRESHOLD) if USE_DEDUPLICATION else None
+    source_store = open_vector_store()
 
     pdf_files = [f for f in os.listdir(PDF_INPUT_FOLDER) if f.lower().endswith(".pdf")]
 
+    corpus = corpus_manifest.CorpusManifest(CORPUS_MANIFEST_PATH) if USE_CORPUS_MANIFEST else None
+    current_analysis_version = analysis_version()
+    if corpus is not None:
+        for removed_file in corpus.prune(pdf_files):
+            print(f"INFO: Plik '{removed_file}' usunięto z folderu wejściowego - pomijam go w globalnym podsumowaniu.")
+
     if not pdf_files:
         print("INFO: Brak plików PDF w folderze do analizy.")
-        return
+        return 0
 
     processed_files_count = 0
-    legal_summaries = []
-    all_individual_analyses_text = []
+    newly_processed_count = 0
+    file_reports = []  # Jedna linia na plik - pełne analizy są tylko w plikach wynikowych
 
     start_time_script = datetime.datetime.now()
 
+    # Etap planowania: wyniki z dziennika i manifestu oraz zakresy stron (także pytania input()) dla wszystkich plików
+    # przed startem potoku - dzięki temu ekstrakcja kolejnego pliku może biec w tle podczas analizy bieżącego.
+    file_plans = []
     for pdf_file in pdf_files:
         pdf_path = os.path.join(PDF_INPUT_FOLDER, pdf_file)
-        base_name = os.path.splitext(pdf_file)[0]
-        # Zmieniona nazwa pliku wyjściowego, aby odróżnić od wyników Gemini
-        output_txt_path = os.path.join(OUTPUT_FOLDER, f"{base_name}_bielik_analysis.txt")
-
-        print(f"\n--- Przetwarzanie pliku (BIELIK): {pdf_file} ---")
+        output_txt_path = analysis_output_path(pdf_file)
+        plan = {"file": pdf_file, "path": pdf_path, "output": output_txt_path, "reused": None}
+
+        file_record = journal.get_file_result(pdf_file)
+        if file_record is not None and reused_output_matches(file_record, output_txt_path):
+            print(f"INFO: Plik '{pdf_file}' został ukończony we wcześniejszym przebiegu - wynik wczytano z dziennika.")
+            plan["reused"] = file_record
+            file_plans.append(plan)
+            continue
+        if file_record is not None:
+            print(f"OSTRZEŻENIE: Plik wynikowy '{output_txt_path}' zmienił się od zapisu w dzienniku - "
+                  f"analizuję '{pdf_file}' ponownie (ukończone części zostaną wczytane z dziennika).")
 
         num_pages = 0
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                num_pages = len(pdf.pages)
+            num_pages = get_pdf_page_count(pdf_path)
         except Exception as e:
             print(
                 f"BŁĄD: Nie można otworzyć pliku PDF '{pdf_file}' w celu sprawdzenia liczby stron: {e}. Pomijam plik.")
             continue
 
-        start_p, end_p = get_page_range_input(pdf_file, num_pages)
-        extracted_text = extract_selected_pages_from_pdf(pdf_path, start_p, end_p)
-
-        if extracted_text is None:
-            print(f"BŁĄD: Pomijam plik '{pdf_file}' z powodu problemów z ekstrakcją tekstu.")
-            summary_content = f"--- Analiza BIELIK dla pliku: {pdf_file} ---\n[BŁĄD EKSTRAKCJI TEKSTU Z PDF]\n"
-            try:
-                with open(output_txt_path, "w", encoding="utf-8") as f:
-                    f.write("[BŁĄD EKSTRAKCJI TEKSTU Z PDF]")
-            except Exception as e_write:
-                print(f"BŁĄD zapisu informacji o błędzie ekstrakcji dla {pdf_file}: {e_write}")
-            legal_summaries.append(summary_content)
-            all_individual_analyses_text.append(summary_content)
+        if page_ranges is None:
+            start_p, end_p = get_page_range_input(pdf_file, num_pages)
+        else:
+            start_p, end_p = resolve_page_range(pdf_file, num_pages, page_ranges)
+        plan.update(start_page=start_p, end_page=end_p, content_hash=pdf_text_cache.file_content_hash(pdf_path))
+
+        corpus_entry = None
+        if corpus is not None and os.path.exists(output_txt_path):
+            corpus_entry = corpus.get_unchanged(pdf_file, plan["content_hash"], (start_p, end_p),
+                                                current_analysis_version)
+        if corpus_entry is not None and reused_output_matches(corpus_entry, output_txt_path):
+            print(f"INFO: Plik '{pdf_file}' nie zmienił się od analizy z {corpus_entry['updated']} - "
+                  f"używam zapisanego wyniku ({output_txt_path}).")
+            plan["reused"] = corpus_entry
+        file_plans.append(plan)
+
+    # Wynik odwołujący się do stron innego pliku jest aktualny tylko, dopóki tamten plik się nie zmienił
+    plans_by_file = {plan["file"]: plan for plan in file_plans}
+    for plan in file_plans:
+        source_file = stale_dependency(plan, plans_by_file) if plan["reused"] is not None else None
+        if source_file is None:
             continue
-
-        if not extracted_text.strip():  # Sprawdzamy czy tekst nie jest pusty po usunięciu białych znaków
-            print(
-                f"INFO: Plik '{pdf_file}' jest pusty lub nie zawiera tekstu po ekstrakcji dla wybranego zakresu. Pomijam analizę BIELIKIEM.")
-            summary_content = f"--- Analiza BIELIK dla pliku: {pdf_file} ---\n[PLIK PUSTY LUB BEZ TEKSTU DO ANALIZY]\n"
+        print(f"INFO: Wynik pliku '{plan['file']}' odwołuje się do stron pliku '{source_file}', który zmienił się "
+              f"lub zniknął - analizuję '{plan['file']}' ponownie.")
+        if plan.get("start_page") is None:  # Plik wczytany z dziennika - zakres stron jak w tamtym przebiegu
+            plan["start_page"], plan["end_page"] = plan["reused"]["page_range"]
+            plan_content_hash(plan)
+        plan["reused"] = None
+
+    # Model ładuje się w tle tylko wtedy, gdy jest co analizować - cykle kolejki bez nowych plików go nie budzą
+    if PIN_MODEL_DURING_RUN and any(plan["reused"] is None for plan in file_plans):
+        pin_models_for_run()
+
+    # Etap ekstrakcji (wątek tła): strony kolejnych plików trafiają do kolejki o rozmiarze PIPELINE_PAGE_BUFFER
+    def iter_corpus_pages(extraction_plans):
+        for plan in extraction_plans:
             try:
-                with open(output_txt_path, "w", encoding="utf-8") as f:
-                    f.write("[PLIK PUSTY LUB BEZ TEKSTU DO ANALIZY]")
-            except Exception as e_write:
-                print(f"BŁĄD zapisu informacji o pustym pliku dla {pdf_file}: {e_write}")
-            legal_summaries.append(summary_content)
-            all_individual_analyses_text.append(summary_content)
-            continue
-
-        # Analiza z BIELIKIEM
-        legal_analysis_result = analyze_text_with_bielik(extracted_text)
-        processed_files_count += 1
-
-        if legal_analysis_result is not None and legal_analysis_result.strip():
-            try:
-                with open(output_txt_path, "w", encoding="utf-8") as f:
-                    f.write(legal_analysis_result)
-                print(f"SUKCES (BIELIK): Wynik analizy prawnej zapisano do: {output_txt_path}")
-                summary_content_for_list = f"--- Analiza BIELIK dla pliku: {pdf_file} ---\n" + legal_analysis_result + "\n"
+                for page_text in iter_selected_pages_from_pdf(plan["path"], plan["start_page"], plan["end_page"]):
+                    yield plan, page_text
             except Exception as e:
-                print(f"BŁĄD (BIELIK): Nie można zapisać wyniku analizy dla {pdf_file}: {e}")
-                summary_content_for_list = f"--- Analiza BIELIK dla pliku: {pdf_file} ---\n[BŁĄD ZAPISU WYNIKU ANALIZY BIELIK: {e}]\n"
-        else:
-            print(
-                f"OSTRZEŻENIE (BIELIK): Nie uzyskano sensownego wyniku analizy dla '{pdf_file}'. Sprawdź logi.")
-            summary_content_for_list = f"--- Analiza BIELIK dla pliku: {pdf_file} ---\n[NIE UZYSKANO WYNIKU ANALIZY Z BIELIKA LUB WYNIK PUSTY]\n"
+                print(f"BŁĄD: Nie można wyodrębnić tekstu z {plan['path']} dla stron "
+                      f"{plan['start_page']}-{plan['end_page']}: {e}")
+                yield plan, PdfExtractionError(str(e))
+                continue
+            yield plan, _END_OF_STREAM
+
+    def iter_plan_pages(corpus_pages, plan):
+        for page_plan, page_text in corpus_pages:
+            assert page_plan is plan
+            if page_text is _END_OF_STREAM:
+                return
+            if isinstance(page_text, PdfExtractionError):
+                raise page_text
+            yield page_text
+
+    corpus_pages = prefetch(iter_corpus_pages([plan for plan in file_plans if plan["reused"] is None]),
+                            PIPELINE_PAGE_BUFFER)
+    # Analizy do globalnego podsumowania trafiają od razu na dysk, w pamięci zostaje tylko analiza bieżącego pliku
+    analyses_spool = text_spool.TextSpool(os.path.join(SPOOL_FOLDER, f"{journal.run_id}_analyses.txt"), "\n\n")
+    try:
+        for plan in file_plans:
+            check_cancelled()
+            pdf_file, output_txt_path = plan["file"], plan["output"]
+
+            if plan["reused"] is not None:
+                if any(other["reused"] is None for other in file_plans):  # Indeksy są potrzebne tylko przy analizie
+                    seed_duplicate_indexes(plan, journal.get_file_result(pdf_file) is plan["reused"])
+                analyses_spool.append(reused_analysis_parts(plan))
+                processed_files_count += plan["reused"]["processed"]
+                file_reports.append(f"{pdf_file}: wynik z wcześniejszego przebiegu -> {output_txt_path}")
+                continue
+
+            print(f"\n--- Przetwarzanie pliku (BIELIK): {pdf_file} ---")
+            call_metrics_log.current_file = pdf_file
+            start_p, end_p, content_hash = plan["start_page"], plan["end_page"], plan["content_hash"]
+
+            # Podział na części i inferencja pobierają strony z kolejki w miarę potrzeby; indeks wektorowy
+            # (opcjonalnie) dostaje te same części tekstu we własnym wątku
+            plan_pages = iter_plan_pages(corpus_pages, plan)
+            dependencies = {}  # Strony innych plików, do których odwołuje się wynik tego pliku
+            document_parts = iter_joined_pages(iter_unique_pages(plan_pages, pdf_file, max(1, start_p), dependencies))
+            embedding_stage = None
+            legal_analysis_result = None
+            analysis_ok = False
+            extraction_failed = False
             try:
-                with open(output_txt_path, "w", encoding="utf-8") as f:  # Zapisz informację o braku wyniku
-                    f.write("[NIE UZYSKANO WYNIKU ANALIZY Z BIELIKA LUB WYNIK PUSTY]")
-            except Exception as e_write:
-                print(f"BŁĄD zapisu informacji o braku wyniku dla {pdf_file}: {e_write}")
-
-        legal_summaries.append(summary_content_for_list)
-        # Dodajemy tylko faktyczną analizę, jeśli istnieje, do globalnego podsumowania
-        if legal_analysis_result and "[BŁĄD" not in legal_analysis_result and "[BRAK ANALIZY" not in legal_analysis_result:
-            all_individual_analyses_text.append(legal_analysis_result)
-        else:  # Jeśli był błąd lub brak analizy, dodajemy notatkę
-            all_individual_analyses_text.append(
-                f"[PROBLEM Z ANALIZĄ PLIKU {pdf_file} - POMINIĘTO W GLOBALNYM PODSUMOWANIU]\n{legal_analysis_result if legal_analysis_result else ''}")
-
-        print(f"--- Zakończono przetwarzanie pliku '{pdf_file}' z BIELIKIEM ---")
-        print("-------------------------------------------------")
+                first_part = next(document_parts, None)
+                if first_part is not None:
+                    if source_store is not None:
+                        embedding_stage = BackgroundStage(
+                            f"indeks wektorowy ({pdf_file})", lambda parts, source=pdf_file: source_store.add_document(source, parts),
+                            PIPELINE_EMBEDDING_BUFFER)
+                        document_parts = embedding_stage.tee(document_parts)
+                    # Analiza z BIELIKIEM
+                    legal_analysis_result, analysis_ok = analyze_text_with_bielik(
+                        itertools.chain([first_part], document_parts), output_path=output_txt_path,
+                        checkpoint=journal.file_checkpoint(pdf_file))
+            except PdfExtractionError:
+                extraction_failed = True
+            finally:
+                if embedding_stage is not None:
+                    embedding_stage.close()
+            for _ in plan_pages:  # Strony tego pliku nieodebrane przez analizę (kolejka przechodzi do następnego pliku)
+                pass
+
+            if extraction_failed:
+                print(f"BŁĄD: Pomijam plik '{pdf_file}' z powodu problemów z ekstrakcją tekstu.")
+                summary_content = f"--- Analiza BIELIK dla pliku: {pdf_file} ---\n[BŁĄD EKSTRAKCJI TEKSTU Z PDF]\n"
+                try:
+                    with open(output_txt_path, "w", encoding="utf-8") as f:
+                        f.write("[BŁĄD EKSTRAKCJI TEKSTU Z PDF]")
+                except Exception as e_write:
+                    print(f"BŁĄD zapisu informacji o błędzie ekstrakcji dla {pdf_file}: {e_write}")
+                file_reports.append(f"{pdf_file}: [BŁĄD EKSTRAKCJI TEKSTU Z PDF]")
+                analyses_spool.append(summary_content)
+                continue
+
+            if legal_analysis_result is None:  # Brak tekstu po ekstrakcji (same białe znaki lub puste strony)
+                print(
+                    f"INFO: Plik '{pdf_file}' jest pusty lub nie zawiera tekstu po ekstrakcji dla wybranego zakresu. Pomijam analizę BIELIKIEM.")
+                summary_content = f"--- Analiza BIELIK dla pliku: {pdf_file} ---\n{EMPTY_FILE_MARKER}\n"
+                try:
+                    with open(output_txt_path, "w", encoding="utf-8") as f:
+                        f.write(EMPTY_FILE_MARKER)
+                except Exception as e_write:
+                    print(f"BŁĄD zapisu informacji o pustym pliku dla {pdf_file}: {e_write}")
+                file_reports.append(f"{pdf_file}: {EMPTY_FILE_MARKER}")
+                analyses_spool.append(summary_content)
+                file_result = file_result_record(EMPTY_FILE_MARKER, 0, plan)
+                journal.mark_file_done(pdf_file, file_result)
+                if corpus is not None:
+                    corpus.record(pdf_file, content_hash, (start_p, end_p), current_analysis_version, file_result)
+                continue
+
+            processed_files_count += 1
+            newly_processed_count += 1
+
+            if legal_analysis_result.strip():
+                try:
+                    with open(output_txt_path, "w", encoding="utf-8") as f:
+                        f.write(legal_analysis_result)
+                    print(f"SUKCES (BIELIK): Wynik analizy prawnej zapisano do: {output_txt_path}")
+                    file_report = f"{pdf_file}: {len(legal_analysis_result)} znaków analizy -> {output_txt_path}"
+                except Exception as e:
+                    print(f"BŁĄD (BIELIK): Nie można zapisać wyniku analizy dla {pdf_file}: {e}")
+                    file_report = f"{pdf_file}: [BŁĄD ZAPISU WYNIKU ANALIZY BIELIK: {e}]"
+            else:
+                print(
+                    f"OSTRZEŻENIE (BIELIK): Nie uzyskano sensownego wyniku analizy dla '{pdf_file}'. Sprawdź logi.")
+                file_report = f"{pdf_file}: [NIE UZYSKANO WYNIKU ANALIZY Z BIELIKA LUB WYNIK PUSTY]"
+                try:
+                    with open(output_txt_path, "w", encoding="utf-8") as f:  # Zapisz informację o braku wyniku
+                        f.write("[NIE UZYSKANO WYNIKU ANALIZY Z BIELIKA LUB WYNIK PUSTY]")
+                except Exception as e_write:
+                    print(f"BŁĄD zapisu informacji o braku wyniku dla {pdf_file}: {e_write}")
+
+            # Dodajemy tylko faktyczną analizę, jeśli istnieje, do globalnego podsumowania
+            if legal_analysis_result and analysis_ok:
+                analyses_spool.append(legal_analysis_result)
+                # Plik z błędami nie jest oznaczany jako ukończony - przy wznowieniu zostaną powtórzone tylko nieudane części
+                file_result = file_result_record(legal_analysis_result, 1, plan, dependencies, plans_by_file)
+                journal.mark_file_done(pdf_file, file_result)
+                if corpus is not None:
+                    corpus.record(pdf_file, content_hash, (start_p, end_p), current_analysis_version, file_result)
+            else:  # Jeśli był błąd lub brak analizy, dodajemy notatkę
+                file_report += " (analiza z błędami - nieudane części zostaną powtórzone przy wznowieniu)"
+                analyses_spool.append(
+                    f"[PROBLEM Z ANALIZĄ PLIKU {pdf_file} - POMINIĘTO W GLOBALNYM PODSUMOWANIU]\n{legal_analysis_result if legal_analysis_result else ''}")
+            file_reports.append(file_report)
+
+            print(f"--- Zakończono przetwarzanie pliku '{pdf_file}' z BIELIKIEM ---")
+            print("-------------------------------------------------")
+    except BaseException:
+        analyses_spool.close()
+        raise
+    finally:
+        corpus_pages.close()
 
     end_time_script = datetime.datetime.now()
     total_processing_duration = (end_time_script - start_time_script).total_seconds()
 
     print("\n--- Zakończono przetwarzanie wszystkich plików PDF z BIELIKIEM. ---")
 
+    # Pełne analizy są w plikach wynikowych - na konsolę (i do logu zadania) trafia jedna linia na plik
     print("\n\n--- ZBIORCZE PODSUMOWANIE PRAWNE (BIELIK) DLA KAŻDEGO DOKUMENTU ---")
-    for summary in legal_summaries:
-        print(summary)
+    for file_report in file_reports:
+        print(f"- {file_report}")
     print("----------------------------------------------------------\n")
 
-    combined_analyses_for_overall_summary = "\n\n".join(
-        filter(None, all_individual_analyses_text))  # Filtruj puste wpisy
-
-    if combined_analyses_for_overall_summary.strip():
-        overall_legal_summary = summarize_overall_legal_findings_with_bielik(combined_analyses_for_overall_summary)
-        print("\n\n--- GLOBALNE PODSUMOWANIE PRAWNE (BIELIK - dla wszystkich dokumentów) ---")
-        if overall_legal_summary and overall_legal_summary.strip():
-            print(overall_legal_summary)
+    try:
+        if analyses_spool.has_content:
+            print(f"INFO: Analizy do globalnego podsumowania: {analyses_spool.entries} plików, "
+                  f"{analyses_spool.size / (1024 * 1024):.1f} MB na dysku ({analyses_spool.path}).")
+            call_metrics_log.current_file = "GLOBALNE_PODSUMOWANIE"
             global_summary_file_path = os.path.join(OUTPUT_FOLDER,
                                                     f"GLOBAL_BIELIK_SUMMARY_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
-            try:
-                with open(global_summary_file_path, "w", encoding="utf-8") as f:
-                    f.write(overall_legal_summary)
-                print(f"\nGlobalne podsumowanie (BIELIK) zapisano do: {global_summary_file_path}")
-            except Exception as e:
-                print(f"BŁĄD (BIELIK): Nie można zapisać globalnego podsumowania: {e}")
+            source_passages = retrieve_source_passages(source_store) if source_store is not None else ""
+            overall_legal_summary = summarize_overall_legal_findings_with_bielik(analyses_spool,
+                                                                                  output_path=global_summary_file_path,
+                                                                                  source_passages=source_passages)
+            print("\n\n--- GLOBALNE PODSUMOWANIE PRAWNE (BIELIK - dla wszystkich dokumentów) ---")
+            if overall_legal_summary and overall_legal_summary.strip():
+                # Treść trafiła do pliku (i na konsolę przy STREAM_RESPONSES) już podczas generowania
+                print(f"Globalne podsumowanie (BIELIK, {len(overall_legal_summary)} znaków) zapisano do: "
+                      f"{global_summary_file_path}")
+            else:
+                print("[BRAK GLOBALNEGO PODSUMOWANIA OD BIELIKA - MOŻLIWY PROBLEM Z API LUB BRAK TREŚCI DO PODSUMOWANIA]")
         else:
-            print("[BRAK GLOBALNEGO PODSUMOWANIA OD BIELIKA - MOŻLIWY PROBLEM Z API LUB BRAK TREŚCI DO PODSUMOWANIA]")
-    else:
-        print("[BRAK TREŚCI Z INDYWIDUALNYCH ANALIZ DO STWORZENIA GLOBALNEGO PODSUMOWANIA BIELIK]")
+            print("[BRAK TREŚCI Z INDYWIDUALNYCH ANALIZ DO STWORZENIA GLOBALNEGO PODSUMOWANIA BIELIK]")
+    finally:
+        analyses_spool.close()
+
+    if deduplication_summary_text():
+        print(f"INFO: {deduplication_summary_text()}", end="")
+    run_peak_rss = rss_sampler.stop()
+    print(f"INFO: Szczytowe zużycie pamięci (RSS) w tym przebiegu: {call_metrics.describe_peak_rss(run_peak_rss)}.")
 
     print("------------------------------------------------------------------\n")
 
-    write_usage_summary(processed_files_count, total_processing_duration)
+    write_usage_summary(processed_files_count, total_processing_duration, run_peak_rss)
+    return newly_processed_count
+
+
+# --- Tryb kolejki: ciągłe przetwarzanie nowych plików pojawiających się w PDF_INPUT_FOLDER ---
+def run_pdf_queue(run_id, page_ranges, poll_seconds):
+    """
+    Pracuje bez końca (przerwanie: Ctrl+C). Dziennik przebiegu o stałym run_id sprawia, że w każdym cyklu
+    analizowane są tylko pliki, których jeszcze nie ukończono - model nie czeka na ręczne uruchomienie.
+    """
+    journal_path = os.path.join(RUN_JOURNAL_FOLDER, f"{run_id}.jsonl")
+    print(f"Tryb kolejki: sprawdzam folder {PDF_INPUT_FOLDER} co {poll_seconds} s (przebieg: {run_id}).")
+    while True:
+        journal = run_journal.RunJournal(RUN_JOURNAL_FOLDER, run_id)
+        pending_files = [f for f in os.listdir(PDF_INPUT_FOLDER)
+                         if f.lower().endswith(".pdf") and f not in journal.files_done]
+        if pending_files:
+            print(f"\nKolejka: {len(pending_files)} plików do analizy ({journal_path}).")
+            process_all_pdfs_with_bielik(run_id=run_id, page_ranges=page_ranges)
+        time.sleep(poll_seconds)
+
+
+# --- Tryb obserwacji: analiza uruchamiana automatycznie po dodaniu lub zmianie plików PDF ---
+def pdf_folder_snapshot():
+    snapshot = {}
+    for file_name in os.listdir(PDF_INPUT_FOLDER):
+        if file_name.lower().endswith(".pdf"):
+            try:
+                stat = os.stat(os.path.join(PDF_INPUT_FOLDER, file_name))
+            except OSError:
+                continue  # Plik usunięty w trakcie listowania
+            snapshot[file_name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def wait_for_folder_change(inotify, poll_seconds):
+    if inotify is not None:
+        inotify.read(timeout=poll_seconds * 1000)  # Wraca od razu po zdarzeniu w folderze albo po poll_seconds
+    else:
+        time.sleep(poll_seconds)
+
+
+def watch_pdf_folder(page_ranges, poll_seconds):
+    """
+    Pracuje bez końca (przerwanie: Ctrl+C). Po każdej zmianie zawartości folderu wejściowego uruchamia przebieg,
+    w którym dzięki manifestowi korpusu analizowane są tylko pliki nowe lub zmienione.
+    Zdarzenia systemu plików (inotify) są używane, jeśli dostępny jest pakiet inotify_simple, w przeciwnym razie
+    folder jest sprawdzany co poll_seconds sekund.
+    """
+    inotify = None
+    try:
+        from inotify_simple import INotify, flags
+        inotify = INotify()
+        inotify.add_watch(PDF_INPUT_FOLDER, flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE)
+        print(f"Tryb obserwacji: zdarzenia inotify w folderze {PDF_INPUT_FOLDER}.")
+    except Exception:  # Brak pakietu inotify_simple lub system bez inotify
+        print(f"Tryb obserwacji: sprawdzam folder {PDF_INPUT_FOLDER} co {poll_seconds} s.")
+
+    processed_snapshot = None
+    while True:
+        snapshot = pdf_folder_snapshot()
+        if snapshot != processed_snapshot:
+            time.sleep(WATCH_SETTLE_SECONDS)
+            if pdf_folder_snapshot() != snapshot:
+                continue  # Pliki wciąż są kopiowane - czekamy, aż rozmiary przestaną się zmieniać
+            print(f"\nObserwacja: zmiana w folderze wejściowym ({len(snapshot)} plików PDF) - uruchamiam analizę.")
+            process_all_pdfs_with_bielik(page_ranges=page_ranges)
+            processed_snapshot = snapshot
+        wait_for_folder_change(inotify, poll_seconds)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analiza prawna plików PDF z BIELIKIEM (Ollama).")
+    parser.add_argument("--run-id", help="Identyfikator przebiegu do wznowienia (wypisywany na początku każdego przebiegu)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Tryb bez interakcji: zakresy stron z --manifest/--pages, domyślnie wszystkie strony")
+    parser.add_argument("--manifest", help="Plik JSON/YAML z zakresami stron dla plików (włącza tryb --batch)")
+    parser.add_argument("--pages", action="append", metavar="WZORZEC=ZAKRES",
+                        help="Zakres stron dla plików pasujących do wzorca, np. 'SPRZECIW_*.pdf=1-5' (włącza --batch)")
+    parser.add_argument("--queue", action="store_true",
+                        help="Tryb kolejki: ciągłe przetwarzanie nowych plików z folderu wejściowego (włącza --batch)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Tryb obserwacji: analiza nowych i zmienionych plików po każdej zmianie w folderze wejściowym "
+                             "(włącza --batch)")
+    parser.add_argument("--poll-seconds", type=int, default=60,
+                        help="Odstęp sprawdzania folderu w trybie --queue i --watch")
+    args = parser.parse_args()
+
+    cli_page_ranges = None
+    if args.batch or args.manifest or args.pages or args.queue or args.watch:
+        cli_page_ranges = parse_page_range_arguments(args.pages)  # --pages ma pierwszeństwo przed manifestem
+        if args.manifest:
+            cli_page_ranges += load_page_range_manifest(args.manifest)
+
     # Sprawdzenie, czy serwer Ollama jest dostępny przed uruchomieniem
     try:
-        conn_test = http.client.HTTPConnection(OLLAMA_HOST, OLLAMA_PORT, timeout=None)
-        conn_test.request("GET", "/api/tags")  # Proste zapytanie, aby sprawdzić czy serwer odpowiada
-        response_test = conn_test.getresponse()
-        if response_test.status == 200:
+        # Proste zapytanie, aby sprawdzić czy serwer odpowiada (połączenie zostaje w puli klienta)
+        status_test, _, _ = ollama_client.get_client(OLLAMA_HOST, OLLAMA_PORT, OLLAMA_REQUEST_TIMEOUT).request_json(
+            "GET", "/api/tags", timeout=30)
+        if status_test == 200:
             print(f"Pomyślnie połączono z serwerem Ollama/BIELIK na {OLLAMA_HOST}:{OLLAMA_PORT}.")
-            conn_test.close()
-            process_all_pdfs_with_bielik()
+            for profile_warning in generation_options.validate_profiles(llm_response_cache.MODFILE_PATH,
+                                                                        MODEL_CONTEXT_TOKENS, RESPONSE_TOKEN_RESERVE):
+                print(f"OSTRZEŻENIE: {profile_warning}")
+            if args.watch:
+                watch_pdf_folder(cli_page_ranges, args.poll_seconds)
+            elif args.queue:
+                run_pdf_queue(args.run_id or "queue", cli_page_ranges, args.poll_seconds)
+            else:
+                process_all_pdfs_with_bielik(run_id=args.run_id, page_ranges=cli_page_ranges)
         else:
             print(
-                f"BŁĄD: Nie można uzyskać poprawnej odpowiedzi od serwera Ollama/BIELIK na {OLLAMA_HOST}:{OLLAMA_PORT}. Status: {response_test.status}")
+                f"BŁĄD: Nie można uzyskać poprawnej odpowiedzi od serwera Ollama/BIELIK na {OLLAMA_HOST}:{OLLAMA_PORT}. Status: {status_test}")
             print("Upewnij się, że serwer Ollama jest uruchomiony i model BIELIK jest dostępny.")
-        conn_test.close()
     except ConnectionRefusedError:
         print(f"KRYTYCZNY BŁĄD: Nie można połączyć się z serwerem Ollama/BIELIK na {OLLAMA_HOST}:{OLLAMA_PORT}.")
         print("Upewnij się, że serwer Ollama jest uruchomiony.")
@@ -0,0 +1,218 @@
+import os
+import re
+import math
+import argparse
+import collections
+import unicodedata
+
+import text_chunker
+import ollama_client
+import model_lifecycle
+import generation_options
+
+# --- Konfiguracja lokalnego indeksu artykułów (np. konstytucja.txt) ---
+ARTICLES_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "konstytucja.txt")
+DEFAULT_TOP_K = 3  # Ile najlepiej dopasowanych artykułów trafia do promptu
+BM25_K1 = 1.5  # Nasycenie częstości słowa w artykule
+BM25_B = 0.75  # Wpływ długości artykułu na wynik
+STEM_LENGTH = 6  # Słowa skracane do 6 znaków - przybliżone sprowadzenie polskich odmian do wspólnego rdzenia
+
+OLLAMA_HOST = "localhost"
+OLLAMA_PORT = 11434
+MODEL_NAME = "bielik-4.5b-q4km-final"
+OLLAMA_KEEP_ALIVE = "30m"
+
+ARTICLE_PATTERN = re.compile(r"^Art\.\s*(\d+[a-z]?)\.\s*(.*)$")
+CHAPTER_PATTERN = re.compile(r"^Rozdział\s+([IVXLC]+)\s*$")
+# Stopka strony z PDF Kancelarii Sejmu, np. "2015-01-07©Kancelaria Sejmu s. 2/56"
+PAGE_FOOTER_PATTERN = re.compile(r"^(?:\d{4}-\d{2}-\d{2})?©Kancelaria Sejmu s\. \d+/\d+\s*$")
+# Tytuł podrozdziału ("Zasady ogólne") - krótka linia bez końcowej interpunkcji, tuż przed kolejnym artykułem
+SECTION_TITLE_PATTERN = re.compile(r"^[A-ZĄĆĘŁŃÓŚŹŻ][^.;:]{0,80}[^.;:,]$")
+# Pytanie o konkretny artykuł: "artykuł 13", "art. 13", "artykule 30"
+ARTICLE_REFERENCE_PATTERN = re.compile(r"\bart(?:\.|ykuł\w*)\s*(\d+[a-z]?)\b", re.IGNORECASE)
+
+STOPWORDS = {
+    "a", "aby", "albo", "ale", "bez", "by", "czy", "dla", "do", "i", "ich", "innych", "jak", "jest", "jego", "jej",
+    "lub", "ma", "mi", "na", "nie", "o", "od", "oraz", "po", "pod", "przez", "przy", "sie", "sa", "ta", "tak", "te",
+    "tego", "to", "tym", "w", "we", "z", "za", "ze", "ktory", "ktora", "ktore", "co", "jaki", "jakie", "mowi",
+}
+
+
+# --- Normalizacja polskiego tekstu: małe litery, bez znaków diakrytycznych, przybliżone rdzenie słów ---
+def _fold(text):
+    text = text.lower().replace("ł", "l")
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def normalize_tokens(text):
+    return [word[:STEM_LENGTH] for word in re.findall(r"[a-z0-9]+", _fold(text)) if word not in STOPWORDS]
+
+
+# --- Podział tekstu na artykuły z numerem, rozdziałem i podrozdziałem ---
+def parse_articles(text):
+    """
+    Zwraca listę słowników {"number", "chapter", "chapter_title", "section", "text"} w kolejności w dokumencie.
+    Wstęp (preambuła) przed pierwszym artykułem jest pomijany.
+    """
+    articles = []
+    chapter = chapter_title = section = ""
+    reading_chapter_title = False
+    current = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or PAGE_FOOTER_PATTERN.match(line):
+            continue
+
+        chapter_match = CHAPTER_PATTERN.match(line)
+        if chapter_match:
+            chapter, chapter_title, section = chapter_match.group(1), "", ""
+            reading_chapter_title = True
+            continue
+
+        article_match = ARTICLE_PATTERN.match(line)
+        if article_match:
+            reading_chapter_title = False
+            if current is not None and len(current["lines"]) > 1 and SECTION_TITLE_PATTERN.match(current["lines"][-1]):
+                section = current["lines"].pop()
+            current = {"number": article_match.group(1), "chapter": chapter, "chapter_title": chapter_title,
+                       "section": section, "lines": [f"Art. {article_match.group(1)}. {article_match.group(2)}"]}
+            articles.append(current)
+            continue
+
+        if reading_chapter_title:
+            # Tytuł rozdziału (wielkimi literami), a po nim ewentualnie tytuł pierwszego podrozdziału
+            if line.isupper():
+                chapter_title = f"{chapter_title} {line}".strip()
+            else:
+                section = line
+            continue
+
+        if current is not None:
+            current["lines"].append(line)
+
+    for article in articles:
+        article["text"] = "\n".join(article.pop("lines"))
+    return articles
+
+
+# --- Indeks odwrócony z rankingiem BM25 ---
+class ArticleIndex:
+    def __init__(self, articles):
+        self.articles = articles
+        self.by_number = {article["number"]: article for article in articles}
+        self.postings = collections.defaultdict(dict)  # rdzeń słowa -> {pozycja artykułu: liczba wystąpień}
+        self.lengths = []
+        for position, article in enumerate(articles):
+            tokens = normalize_tokens(f"{article['chapter_title']} {article['section']} {article['text']}")
+            self.lengths.append(len(tokens))
+            for token, count in collections.Counter(tokens).items():
+                self.postings[token][position] = count
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    @classmethod
+    def from_file(cls, path=None):
+        with open(path or ARTICLES_SOURCE_PATH, "r", encoding="utf-8") as f:
+            return cls(parse_articles(f.read()))
+
+    def get(self, number):
+        return self.by_number.get(str(number))
+
+    def _bm25(self, query_tokens):
+        scores = collections.defaultdict(float)
+        total = len(self.articles)
+        for token in set(query_tokens):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, count in postings.items():
+                length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / self.average_length)
+                scores[position] += idf * count * (BM25_K1 + 1) / (count + length_norm)
+        return scores
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """
+        Zwraca do top_k par (wynik, artykuł). Artykuły wskazane w pytaniu numerem ("artykuł 13")
+        są zawsze na początku listy, pozostałe miejsca wypełnia ranking BM25.
+        """
+        results = []
+        for number in ARTICLE_REFERENCE_PATTERN.findall(query):
+            article = self.get(number)
+            if article is not None and all(article is not found for _, found in results):
+                results.append((float("inf"), article))
+
+        query_without_references = ARTICLE_REFERENCE_PATTERN.sub(" ", query)
+        ranked = sorted(self._bm25(normalize_tokens(query_without_references)).items(), key=lambda item: -item[1])
+        for position, score in ranked:
+            if len(results) >= top_k:
+                break
+            if all(self.articles[position] is not found for _, found in results):
+                results.append((score, self.articles[position]))
+        return results
+
+
+def format_article(article):
+    location = f"Rozdział {article['chapter']} {article['chapter_title']}".strip()
+    if article["section"]:
+        location += f" - {article['section']}"
+    return f"[{location}]\n{article['text']}"
+
+
+# --- Pytanie do BIELIKA tylko z najlepiej dopasowanymi artykułami zamiast całego dokumentu ---
+def build_question_messages(question, articles):
+    instructions = (
+        "Jesteś ekspertem prawa konstytucyjnego Rzeczypospolitej Polskiej. Odpowiedz na pytanie wyłącznie "
+        "na podstawie podanych artykułów, cytując ich numery. Jeśli podane artykuły nie wystarczają, powiedz to wprost."
+    )
+    context = "\n\n".join(format_article(article) for article in articles)
+    return [
+        {'role': 'system', 'content': instructions},
+        {'role': 'user', 'content': f"Artykuły:\n\n{context}\n\nPytanie: {question}"},
+    ]
+
+
+def ask_bielik(question, articles, host=OLLAMA_HOST, port=OLLAMA_PORT):
+    messages = build_question_messages(question, articles)
+    options = generation_options.options_for("question", sum(text_chunker.count_tokens(m['content']) for m in messages),
+                                             loaded_context=model_lifecycle.loaded_context_length(host, port, MODEL_NAME))
+    client = ollama_client.get_client(host, port)
+    response = client.chat(MODEL_NAME, messages, stream=True, on_token=lambda token: print(token, end="", flush=True),
+                           options=options,
+                           keep_alive=model_lifecycle.keep_alive_for(host, port, MODEL_NAME, OLLAMA_KEEP_ALIVE))
+    print()
+    if response.status != 200:
+        print(f"BŁĄD: Serwer BIELIK (Ollama) zwrócił błąd HTTP {response.status}: {response.raw}")
+        return None
+    return response.content
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Wyszukiwanie artykułów (BM25) w tekście aktu prawnego i pytanie do BIELIKA tylko o znalezione artykuły.")
+    parser.add_argument("question", help="Pytanie, np. \"Co mówi artykuł 13?\" lub \"wolność prasy\".")
+    parser.add_argument("--source", default=ARTICLES_SOURCE_PATH, help="Plik tekstowy z artykułami (domyślnie konstytucja.txt).")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Liczba artykułów przekazywanych do BIELIKA.")
+    parser.add_argument("--ask", action="store_true", help="Wyślij pytanie ze znalezionymi artykułami do BIELIKA.")
+    args = parser.parse_args()
+
+    index = ArticleIndex.from_file(args.source)
+    print(f"INFO: Zaindeksowano {len(index.articles)} artykułów z '{args.source}'.")
+
+    results = index.search(args.question, args.top_k)
+    if not results:
+        print("INFO: Nie znaleziono pasujących artykułów.")
+    for score, article in results:
+        score_label = "numer z pytania" if score == float("inf") else f"BM25 {score:.2f}"
+        print(f"\n--- Art. {article['number']} ({score_label}) ---\n{format_article(article)}")
+
+    if args.ask and results:
+        found_articles = [article for _, article in results]
+        with open(args.source, "r", encoding="utf-8") as f:
+            whole_document_tokens = text_chunker.count_tokens(f.read())
+        prompt_tokens = sum(text_chunker.count_tokens(m['content']) for m in build_question_messages(args.question, found_articles))
+        print(f"\nINFO: Prompt ~{prompt_tokens} tokenów zamiast ~{whole_document_tokens} tokenów całego dokumentu.\n")
+        try:
+            ask_bielik(args.question, found_articles)
+        except Exception as e:
+            print(f"KRYTYCZNY BŁĄD: Podczas komunikacji z BIELIK API (Ollama) na {OLLAMA_HOST}:{OLLAMA_PORT}: {e}")
@@ -0,0 +1,59 @@
+import heapq
+import itertools
+import threading
+import contextlib
+import collections
+
+# --- Kolejka priorytetowa zapytań do serwerów Ollama ---
+# Każde zapytanie do modelu zajmuje jedno miejsce na serwerze (MAX_IN_FLIGHT_PER_BACKEND miejsc na serwer).
+# Zwolnione miejsce dostaje czekające zapytanie o najniższym priorytecie, a przy równych - najwcześniejsze.
+# Krótkie zadania interaktywne (poprawa akapitu) wyprzedzają więc części analiz wsadowych czekające w kolejce;
+# trwające już generowanie nie jest przerywane.
+INTERACTIVE_PRIORITY = 0
+BATCH_PRIORITY = 10
+
+
+class BackendScheduler:
+    def __init__(self, backends, slots_per_backend=1):
+        self.free_slots = collections.deque()
+        for _ in range(slots_per_backend):
+            for backend in backends:  # Naprzemiennie, aby pierwsze zapytania trafiły na różne serwery
+                self.free_slots.append(tuple(backend))
+        self.capacity = len(self.free_slots)
+        self.waiting = []  # Kopiec (priorytet, numer zgłoszenia) zapytań czekających na miejsce
+        self.tickets = itertools.count()
+        self.condition = threading.Condition()
+
+    def acquire(self, priority):
+        """Czeka na wolne miejsce i zwraca serwer (host, port); miejsce trzeba oddać przez release()."""
+        with self.condition:
+            ticket = (priority, next(self.tickets))
+            heapq.heappush(self.waiting, ticket)
+            while not (self.free_slots and self.waiting[0] == ticket):
+                self.condition.wait()
+            heapq.heappop(self.waiting)
+            backend = self.free_slots.popleft()
+            self.condition.notify_all()  # Kolejny w kolejce może dostać następne wolne miejsce
+            return backend
+
+    def release(self, backend):
+        with self.condition:
+            self.free_slots.append(backend)
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, priority):
+        backend = self.acquire(priority)
+        try:
+            yield backend
+        finally:
+            self.release(backend)
+
+    def status(self):
+        with self.condition:
+            return {
+                "capacity": self.capacity,
+                "free": len(self.free_slots),
+                "waiting_interactive": sum(1 for priority, _ in self.waiting if priority < BATCH_PRIORITY),
+                "waiting_batch": sum(1 for priority, _ in self.waiting if priority >= BATCH_PRIORITY),
+            }
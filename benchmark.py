@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import argparse
+import tempfile
+import threading
+import importlib.util
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import text_chunker
+import pdf_extractors
+import call_metrics
+import ollama_client
+
+# --- Benchmark potoku BLOX-TAK-BIELIK bez prawdziwego modelu ---
+# Lokalny serwer udający Ollamę (/api/tags, /api/ps, /api/generate, /api/chat, /api/embeddings) z konfigurowalnym opóźnieniem i tempem
+# generowania pozwala mierzyć ekstrakcję, podział na części, narzut zapytań i przepustowość całego potoku offline.
+SCRIPT_FOLDER = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_PDF_PATH = os.path.join(SCRIPT_FOLDER, "KONSTYTUCJA_RP.pdf")
+BUNDLED_TEXT_PATH = os.path.join(SCRIPT_FOLDER, "konstytucja.txt")
+MOCK_MODEL_NAME = "bielik-4.5b-q4km-final"
+MOCK_EMBEDDING_DIMENSIONS = 64
+REGRESSION_TOLERANCE = 0.20  # Wynik gorszy o ponad 20% od wyniku bazowego (--baseline) jest zgłaszany jako regresja
+
+
+# --- Serwer zastępczy Ollama ---
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, jak w prawdziwej Ollamie
+    latency_seconds = 0.05  # Czas "prefillu" przed pierwszym tokenem
+    tokens_per_second = 200.0  # Tempo generowania odpowiedzi
+    response_tokens = 40  # Liczba tokenów (słów) w każdej odpowiedzi
+    loaded_models = set()  # Modele "w pamięci" (osobny zbiór dla każdego serwera z start_mock_server)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, payload):
+        line = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": MOCK_MODEL_NAME}]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [{"name": name} for name in sorted(self.loaded_models)]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/embeddings":
+            vector = [0.0] * MOCK_EMBEDDING_DIMENSIONS
+            for word in request.get("prompt", "").lower().split():
+                vector[zlib.crc32(word.encode("utf-8")) % MOCK_EMBEDDING_DIMENSIONS] += 1.0
+            self._send_json({"embedding": vector})
+            return
+        if self.path == "/api/generate":
+            # Puste zapytanie ładuje model, keep_alive 0 go zwalnia
+            if request.get("keep_alive") == 0:
+                self.loaded_models.discard(request.get("model"))
+            else:
+                self.loaded_models.add(request.get("model"))
+            self._send_json({"model": request.get("model"), "response": "", "done": True, "load_duration": 0})
+            return
+        if self.path != "/api/chat":
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        prompt_chars = sum(len(message.get("content", "")) for message in request.get("messages", []))
+        time.sleep(self.latency_seconds)
+        words = [f"słowo{i}" for i in range(self.response_tokens)]
+        decode_seconds = self.response_tokens / self.tokens_per_second
+        counters = {
+            "done": True,
+            "prompt_eval_count": int(prompt_chars / text_chunker.CHARS_PER_TOKEN),
+            "prompt_eval_duration": int(self.latency_seconds * 1e9),
+            "eval_count": self.response_tokens,
+            "eval_duration": int(decode_seconds * 1e9),
+            "load_duration": 0,
+            "total_duration": int((self.latency_seconds + decode_seconds) * 1e9),
+        }
+
+        if not request.get("stream"):
+            time.sleep(decode_seconds)
+            self._send_json(dict(counters, message={"role": "assistant", "content": " ".join(words)}))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in words:
+            time.sleep(1 / self.tokens_per_second)
+            self._send_chunk({"message": {"role": "assistant", "content": word + " "}, "done": False})
+        self._send_chunk(dict(counters, message={"role": "assistant", "content": ""}))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_mock_server(latency_seconds, tokens_per_second, response_tokens):
+    handler = type("ConfiguredMockOllamaHandler", (MockOllamaHandler,), {
+        "latency_seconds": latency_seconds,
+        "tokens_per_second": tokens_per_second,
+        "response_tokens": response_tokens,
+        "loaded_models": set(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Syntetyczny PDF (bez dodatkowych pakietów): strony z liniami tekstu czcionką Helvetica ---
+def write_synthetic_pdf(path, pages, lines_per_page=40):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        lines = [f"Art. {page * lines_per_page + line + 1}. Synthetic legal text line {line + 1} on page {page + 1}."
+                 for line in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 50 800 Td 12 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+# --- Pomiary ---
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def load_analysis_module():
+    # Nazwa skryptu zawiera myślnik, więc jest ładowany z pliku, a nie przez zwykły import
+    spec = importlib.util.spec_from_file_location("analysis_summary", os.path.join(SCRIPT_FOLDER, "analysis-summary.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def configure_analysis_module(analysis, work_folder, host, port):
+    """
+    Kieruje skrypt na serwer zastępczy i katalogi tymczasowe; cache są wyłączone, aby mierzyć rzeczywistą pracę.
+    """
+    for name in ("PDF_INPUT_FOLDER", "OUTPUT_FOLDER", "LOG_FOLDER", "PDF_TEXT_CACHE_FOLDER", "LLM_RESPONSE_CACHE_FOLDER",
+                 "SUMMARY_TREE_FOLDER", "CALL_METRICS_FOLDER", "RUN_JOURNAL_FOLDER", "VECTOR_STORE_FOLDER"):
+        folder = os.path.join(work_folder, name)
+        os.makedirs(folder, exist_ok=True)
+        setattr(analysis, name, folder)
+    analysis.CORPUS_MANIFEST_PATH = os.path.join(work_folder, "corpus_manifest.json")
+    analysis.OLLAMA_HOST, analysis.OLLAMA_PORT = host, port
+    analysis.OLLAMA_BACKENDS = [(host, port)]
+    analysis.USE_LLM_RESPONSE_CACHE = False
+    analysis.USE_PDF_TEXT_CACHE = False
+    analysis.USE_VECTOR_STORE = False
+
+
+def install_call_metrics_log(analysis, run_id):
+    analysis.call_metrics_log = call_metrics.CallMetricsLog(analysis.CALL_METRICS_FOLDER, run_id)
+    return analysis.call_metrics_log
+
+
+def result_row(name, seconds, units, unit_label, latencies=(), rss_sampler=None):
+    # Szczytowe RSS samego pomiaru - kolejne pomiary działają w tym samym procesie
+    return {
+        "benchmark": name,
+        "seconds": round(seconds, 3),
+        "throughput": round(units / seconds, 2) if seconds > 0 else 0.0,
+        "throughput_unit": unit_label,
+        "p50_latency": round(percentile(latencies, 0.50), 3),
+        "p95_latency": round(percentile(latencies, 0.95), 3),
+        "peak_rss_mb": rss_sampler.stop() if rss_sampler else None,
+    }
+
+
+def bench_extraction(analysis, pdf_path, label, workers, extractor="auto"):
+    analysis.PDF_TEXT_EXTRACTOR = extractor
+    num_pages = analysis.get_pdf_page_count(pdf_path)
+    rss_sampler = call_metrics.RssSampler()
+    start = time.perf_counter()
+    page_texts = analysis.extract_page_texts(pdf_path, 0, num_pages, workers=workers)
+    elapsed = time.perf_counter() - start
+    assert len(page_texts) == num_pages
+    return result_row(f"ekstrakcja {label} [{extractor}] ({num_pages} stron, procesów: {workers})", elapsed, num_pages,
+                      "stron/s", rss_sampler=rss_sampler)
+
+
+def bench_chunking(text):
+    rss_sampler = call_metrics.RssSampler()
+    start = time.perf_counter()
+    chunks = list(text_chunker.iter_chunks(text, 1024, 64))
+    elapsed = time.perf_counter() - start
+    return result_row(f"podział na części ({len(chunks)} części)", elapsed, len(text) / 1000, "tys. znaków/s",
+                      rss_sampler=rss_sampler)
+
+
+def bench_request_overhead(host, port, requests):
+    client = ollama_client.get_client(host, port)
+    latencies = []
+    rss_sampler = call_metrics.RssSampler()
+    start = time.perf_counter()
+    for _ in range(requests):
+        request_start = time.perf_counter()
+        client.chat(MOCK_MODEL_NAME, [{"role": "user", "content": "ping"}], stream=True)
+        latencies.append(time.perf_counter() - request_start)
+    elapsed = time.perf_counter() - start
+    return result_row(f"zapytania /api/chat ({requests}x, strumień)", elapsed, requests, "zapytań/s", latencies,
+                      rss_sampler=rss_sampler)
+
+
+def bench_analysis(analysis, text, work_folder):
+    metrics_log = install_call_metrics_log(analysis, "bench_analysis")
+    rss_sampler = call_metrics.RssSampler()
+    start = time.perf_counter()
+    result, result_ok = analysis.analyze_text_with_bielik(text, output_path=os.path.join(work_folder,
+                                                                                      "bench_analysis.txt"))
+    elapsed = time.perf_counter() - start
+    assert result_ok, result[:500]
+    latencies = [record["wall_seconds"] for record in metrics_log.records]
+    return result_row(f"analyze_text_with_bielik ({len(latencies)} części)", elapsed, len(text) / 1000,
+                      "tys. znaków/s", latencies, rss_sampler=rss_sampler)
+
+
+def bench_global_summary(analysis, text, work_folder):
+    metrics_log = install_call_metrics_log(analysis, "bench_summary")
+    rss_sampler = call_metrics.RssSampler()
+    start = time.perf_counter()
+    result = analysis.summarize_overall_legal_findings_with_bielik(
+        text, output_path=os.path.join(work_folder, "bench_summary.txt"))
+    elapsed = time.perf_counter() - start
+    assert "[BŁĄD" not in result, result[:500]
+    latencies = [record["wall_seconds"] for record in metrics_log.records]
+    return result_row(f"summarize_overall_legal_findings_with_bielik ({len(latencies)} wywołań)", elapsed,
+                      len(text) / 1000, "tys. znaków/s", latencies, rss_sampler=rss_sampler)
+
+
+def print_report(results):
+    print("\n--- Wyniki benchmarku ---")
+    for row in results:
+        peak_rss = f"{row['peak_rss_mb']} MB" if row["peak_rss_mb"] is not None else "niedostępny"
+        print(f"{row['benchmark']}\n    czas: {row['seconds']:.3f} s, przepustowość: {row['throughput']} {row['throughput_unit']}, "
+              f"p50: {row['p50_latency']:.3f} s, p95: {row['p95_latency']:.3f} s, szczytowy RSS: {peak_rss}")
+
+
+def compare_with_baseline(results, baseline_path):
+    """
+    Zwraca listę opisów regresji (przepustowość niższa o ponad REGRESSION_TOLERANCE niż w pliku bazowym).
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {row["benchmark"]: row for row in json.load(f)}
+    regressions = []
+    for row in results:
+        previous = baseline.get(row["benchmark"])
+        if previous and previous["throughput"] > 0 and row["throughput"] < previous["throughput"] * (1 - REGRESSION_TOLERANCE):
+            regressions.append(f"{row['benchmark']}: {row['throughput']} < {previous['throughput']} {row['throughput_unit']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark potoku BIELIKA z lokalnym serwerem zastępczym Ollama.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Opóźnienie serwera przed pierwszym tokenem (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Tempo generowania serwera")
+    parser.add_argument("--response-tokens", type=int, default=40, help="Długość każdej odpowiedzi w tokenach")
+    parser.add_argument("--requests", type=int, default=50, help="Liczba zapytań w pomiarze narzutu /api/chat")
+    parser.add_argument("--synthetic-pages", type=int, default=60, help="Liczba stron syntetycznego PDF")
+    parser.add_argument("--context-tokens", type=int, default=4096,
+                        help="Okno kontekstu na czas benchmarku (mniejsze = więcej części i wywołań)")
+    parser.add_argument("--json", help="Zapisz wyniki do pliku JSON (np. jako wynik bazowy)")
+    parser.add_argument("--baseline", help="Plik JSON z poprzednimi wynikami - regresje kończą skrypt kodem 1")
+    args = parser.parse_args()
+
+    server = start_mock_server(args.latency, args.tokens_per_second, args.response_tokens)
+    host, port = server.server_address
+    work_folder = tempfile.mkdtemp(prefix="bielik_benchmark_")
+    print(f"Serwer zastępczy Ollama: {host}:{port}, katalog roboczy: {work_folder}")
+
+    try:
+        analysis = load_analysis_module()
+        configure_analysis_module(analysis, work_folder, host, port)
+        analysis.MODEL_CONTEXT_TOKENS = args.context_tokens
+        analysis.RESPONSE_TOKEN_RESERVE = min(analysis.RESPONSE_TOKEN_RESERVE, args.context_tokens // 4)
+
+        synthetic_pdf = os.path.join(work_folder, "synthetic.pdf")
+        write_synthetic_pdf(synthetic_pdf, args.synthetic_pages)
+        with open(BUNDLED_TEXT_PATH, "r", encoding="utf-8") as f:
+            bundled_text = f.read()
+
+        results = [bench_extraction(analysis, synthetic_pdf, "syntetyczny PDF", 1)]
+        if analysis.EXTRACTION_WORKERS > 1:
+            results.append(bench_extraction(analysis, synthetic_pdf, "syntetyczny PDF", analysis.EXTRACTION_WORKERS))
+        if os.path.exists(BUNDLED_PDF_PATH):
+            for extractor in ["auto"] + pdf_extractors.available_backends():
+                results.append(bench_extraction(analysis, BUNDLED_PDF_PATH, "KONSTYTUCJA_RP.pdf",
+                                                analysis.EXTRACTION_WORKERS, extractor))
+            analysis.PDF_TEXT_EXTRACTOR = "auto"
+        results.append(bench_chunking(bundled_text))
+        results.append(bench_request_overhead(host, port, args.requests))
+        results.append(bench_analysis(analysis, bundled_text, work_folder))
+        results.append(bench_global_summary(analysis, bundled_text, work_folder))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"\nWyniki zapisano do: {args.json}")
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline)
+        for regression in regressions:
+            print(f"REGRESJA: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("Brak regresji względem wyników bazowych.")
@@ -1,8 +1,171 @@
 # standard imports for LibreOffice macros
 import uno
 import unohelper
+import os
+import re
+import sys
 import json
-import http.client  # For making HTTP requests
+import time
+import difflib
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from com.sun.star.awt import XCallback
+
+# Deployment: copy this macro together with ollama_client.py, model_lifecycle.py, generation_options.py and
+# text_chunker.py into the LibreOffice Python scripts folder (e.g. ~/.config/libreoffice/4/user/Scripts/python/).
+# These modules provide the shared Ollama client (connection pool, timeouts, retries), the model lifecycle
+# (warm-up, keep_alive pinning) and per-task generation options (num_ctx, num_predict).
+# job_service.py (with backend_scheduler.py and call_metrics.py) is optional - without it paragraphs go
+# straight to Ollama.
+# Wdrożenie: skopiuj to makro razem z ollama_client.py, model_lifecycle.py, generation_options.py i text_chunker.py
+# do katalogu skryptów Pythona LibreOffice (np. ~/.config/libreoffice/4/user/Scripts/python/).
+# Te moduły to wspólny klient Ollamy (pula połączeń, limity czasu, ponowienia), cykl życia modelu (ładowanie,
+# przypięcie keep_alive) i opcje generowania dla zadań (num_ctx, num_predict).
+# job_service.py (z backend_scheduler.py i call_metrics.py) jest opcjonalny - bez niego akapity trafiają
+# bezpośrednio do Ollamy.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+try:
+    import ollama_client
+    import model_lifecycle
+    import generation_options
+    import text_chunker
+except ImportError as e:
+    print(f"ERROR: {e} - copy ollama_client.py, model_lifecycle.py, generation_options.py and text_chunker.py "
+          f"next to bielik_corrector.py.")
+    print(f"BŁĄD: {e} - skopiuj ollama_client.py, model_lifecycle.py, generation_options.py i text_chunker.py "
+          f"obok bielik_corrector.py.")
+    raise
+try:
+    import job_service
+except ImportError:
+    # Without the job service module corrections go straight to Ollama
+    # Bez modułu usługi zadań poprawki trafiają bezpośrednio do Ollamy
+    job_service = None
+
+# --- Paragraph correction cache configuration ---
+# --- Konfiguracja cache poprawionych akapitów ---
+CORRECTION_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".bielik_corrector_cache.json")
+CORRECTION_CACHE_MAX_ENTRIES = 5000  # Oldest entries are dropped above this limit
+# Najstarsze wpisy są usuwane po przekroczeniu tego limitu
+
+# Words, whitespace runs and single punctuation marks - the units compared by the diff
+# Słowa, ciągi białych znaków i pojedyncze znaki interpunkcyjne - jednostki porównywane przez diff
+DIFF_TOKEN_PATTERN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+# Raised from the token callback to stop a running generation
+# Zgłaszany z funkcji obsługi tokenów, aby przerwać trwające generowanie
+class CorrectionCancelled(Exception):
+    pass
+
+
+# The correction currently running in the background (one at a time): {"thread": ..., "cancel": threading.Event}
+# (thread is None while the correction is being prepared)
+# Poprawka wykonywana obecnie w tle (tylko jedna naraz): {"thread": ..., "cancel": threading.Event}
+# (thread jest None, gdy poprawka jest jeszcze przygotowywana)
+_active_job = None
+_active_job_lock = threading.Lock()
+
+
+# Runs a Python function on the LibreOffice main thread - document changes must not come from a worker thread
+# Uruchamia funkcję Pythona w głównym wątku LibreOffice - dokument nie może być zmieniany z wątku roboczego
+class _MainThreadCall(unohelper.Base, XCallback):
+    def __init__(self, function):
+        self.function = function
+
+    def notify(self, data):
+        try:
+            self.function()
+        except Exception as e:
+            print(f"ERROR: Main thread callback failed: {e}")
+            print(f"BŁĄD: Wywołanie w głównym wątku nie powiodło się: {e}")
+
+
+def _run_on_main_thread(function):
+    ctx = uno.getComponentContext()
+    async_callback = ctx.ServiceManager.createInstanceWithContext("com.sun.star.awt.AsyncCallback", ctx)
+    async_callback.addCallback(_MainThreadCall(function), None)
+
+
+# Print each streamed token to the console log as it arrives
+# Wypisuj każdy strumieniowany token do logu konsoli zaraz po jego otrzymaniu
+def _print_token(token):
+    print(token, end="", flush=True)
+
+
+# Load and save the per-paragraph cache (key: hash of model + prompt + paragraph text)
+# Odczyt i zapis cache akapitów (klucz: skrót modelu + promptu + tekstu akapitu)
+def _load_correction_cache():
+    try:
+        with open(CORRECTION_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_correction_cache(cache):
+    while len(cache) > CORRECTION_CACHE_MAX_ENTRIES:
+        del cache[next(iter(cache))]
+    try:
+        tmp_path = CORRECTION_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, CORRECTION_CACHE_PATH)
+    except OSError as e:
+        print(f"WARNING: Could not save the correction cache: {e}")
+        print(f"OSTRZEŻENIE: Nie można zapisać cache poprawek: {e}")
+
+
+def _cache_key(model_name, prompt, text):
+    return hashlib.sha256("\x00".join([model_name, prompt, text]).encode("utf-8")).hexdigest()
+
+
+# Split a text range into paragraphs through the UNO paragraph enumeration (tables and frames are skipped)
+# Podziel zakres tekstu na akapity przez wyliczenie akapitów UNO (tabele i ramki są pomijane)
+def _paragraph_units(text_range):
+    text = text_range.getString()
+    # A selection inside one paragraph is corrected as it is
+    # Zaznaczenie wewnątrz jednego akapitu jest poprawiane w takiej postaci
+    if ("\n" not in text and "\r" not in text) or not hasattr(text_range, 'createEnumeration'):
+        return [text_range]
+    units = []
+    enumeration = text_range.createEnumeration()
+    while enumeration.hasMoreElements():
+        element = enumeration.nextElement()
+        if element.supportsService("com.sun.star.text.Paragraph"):
+            units.append(element)
+    return units
+
+
+# Write only the changed words back, so formatting of the untouched text is preserved
+# Zapisz z powrotem tylko zmienione słowa, aby zachować formatowanie niezmienionego tekstu
+def _apply_diff(unit, original_text, corrected_text):
+    original_tokens = DIFF_TOKEN_PATTERN.findall(original_text)
+    corrected_tokens = DIFF_TOKEN_PATTERN.findall(corrected_text)
+    offsets = [0]
+    for token in original_tokens:
+        offsets.append(offsets[-1] + len(token))
+
+    opcodes = difflib.SequenceMatcher(None, original_tokens, corrected_tokens, autojunk=False).get_opcodes()
+    changes = 0
+    # Apply from the end of the paragraph, so earlier character offsets stay valid
+    # Zmiany od końca akapitu, aby wcześniejsze pozycje znaków pozostały aktualne
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == "equal":
+            continue
+        cursor = unit.getText().createTextCursorByRange(unit.getStart())
+        cursor.goRight(offsets[i1], False)
+        cursor.goRight(offsets[i2] - offsets[i1], True)
+        cursor.setString("".join(corrected_tokens[j1:j2]))
+        changes += 1
+
+    if unit.getString() != corrected_text:
+        # Fields or objects inside the paragraph shifted the offsets - replace the paragraph text as a whole
+        # Pola lub obiekty w akapicie przesunęły pozycje - zastąp tekst akapitu w całości
+        unit.setString(corrected_text)
+    return changes
 
 
 # Main macro function to correct text using Ollama
@@ -26,65 +189,71 @@ def correct_text_with_ollama(*args):
         return
 
     selection = controller.getSelection()
-    selected_text_original = ""  # Variable to store the text to be sent to Ollama
-    selection_object = None  # Variable to store the actual selection object for later replacement
+    text_ranges = []  # Text ranges to be corrected paragraph by paragraph
+    # Zakresy tekstu do poprawy akapit po akapicie
 
     # Try to get the selected text
     # Spróbuj pobrać zaznaczony tekst
     if hasattr(selection, 'getString') and selection.supportsService("com.sun.star.text.TextRange"):
-        selected_text_original = selection.getString()
-        selection_object = selection
+        if selection.getString().strip():
+            text_ranges.append(selection)
         print("INFO: Text acquired from current selection (TextRange).")
         print("INFO: Tekst pobrany z bieżącego zaznaczenia (TextRange).")
     elif hasattr(selection, 'hasElements') and selection.hasElements():
         # Handle multiple selections or complex selections (e.g., table cells)
         # Obsługa wielokrotnych zaznaczeń lub złożonych zaznaczeń (np. komórek tabeli)
-        text_builder = []
         try:
             for i in range(selection.getCount()):
                 element = selection.getByIndex(i)
                 if hasattr(element, 'getString') and element.supportsService("com.sun.star.text.TextRange"):
-                    text_builder.append(element.getString())
+                    if element.getString().strip():
+                        text_ranges.append(element)
                 elif hasattr(element, 'getText') and element.getText().supportsService("com.sun.star.text.XText"):
-                    text_builder.append(element.getText().getString())
+                    text_ranges.append(element.getText())
                 else:
                     print(f"DEBUG: Selected element type {type(element)} is not a recognizable text type. Skipping.")
                     print(
                         f"DEBUG: Typ zaznaczonego elementu {type(element)} nie jest rozpoznawalnym typem tekstowym. Pomijam.")
-            selected_text_original = "\n".join(text_builder)
-            selection_object = selection  # Keep the original complex selection object for replacement
             print("INFO: Text acquired from complex selection (XIndexAccess).")
             print("INFO: Tekst pobrany ze złożonego zaznaczenia (XIndexAccess).")
         except Exception as e:
             print(f"WARNING: Error iterating through complex selection: {e}. Falling back to entire document.")
             print(
                 f"OSTRZEŻENIE: Błąd podczas iteracji przez złożone zaznaczenie: {e}. Zamiast tego używam całego dokumentu.")
-            selected_text_original = ""  # Reset to force full document text
+            text_ranges = []  # Reset to force full document text
     else:
         print("INFO: No valid text selection found or selection is not directly text-like.")
         print("INFO: Nie znaleziono prawidłowego zaznaczenia tekstu lub zaznaczenie nie jest bezpośrednio tekstowe.")
 
-    # If no text was selected, get the entire document text
-    # Jeśli nie zaznaczono tekstu, pobierz cały tekst dokumentu
-    if not selected_text_original.strip():
+    # If no text was selected, use the entire document text
+    # Jeśli nie zaznaczono tekstu, użyj całego tekstu dokumentu
+    if not text_ranges:
         text_document_object = model.Text
         if not text_document_object:
             print("ERROR: Could not get the document's main text object.")
             print("BŁĄD: Nie można uzyskać głównego obiektu tekstu dokumentu.")
             return
 
-        selected_text_original = text_document_object.getString()
-        selection_object = text_document_object  # To will replace the entire document
+        text_ranges.append(text_document_object)
         print("INFO: No text selection found. Acquiring entire document text.")
         print("INFO: Nie znaleziono zaznaczenia tekstu. Pobieram cały tekst dokumentu.")
 
-    if not selected_text_original.strip():
+    # Split into paragraphs; empty paragraphs are left untouched
+    # Podział na akapity; puste akapity pozostają bez zmian
+    units = []
+    for text_range in text_ranges:
+        for unit in _paragraph_units(text_range):
+            unit_text = unit.getString()
+            if unit_text.strip():
+                units.append((unit, unit_text))
+
+    if not units:
         print("INFO: Document or selected text is empty. Nothing to correct.")
         print("INFO: Dokument lub zaznaczony tekst jest pusty. Brak tekstu do poprawy.")
         return
 
-    print(f"Text to correct (first 100 characters): {selected_text_original[:100]}...")
-    print(f"Tekst do poprawy (pierwsze 100 znaków): {selected_text_original[:100]}...")
+    print(f"Paragraphs to correct: {len(units)} (first 100 characters: {units[0][1][:100]}...)")
+    print(f"Akapity do poprawy: {len(units)} (pierwsze 100 znaków: {units[0][1][:100]}...)")
 
     # --- Ollama API configuration ---
     # --- Konfiguracja API Ollamy ---
@@ -93,77 +262,281 @@ def correct_text_with_ollama(*args):
     OLLAMA_PORT = 11434
     MODEL_NAME = "bielik-4.5b-q4km-final"  # Ensure this is the name of your model in Ollama
     # Upewnij się, że to nazwa Twojego modelu w Ollamie
+    STREAM_RESPONSE = True  # Stream tokens as they are generated (NDJSON) instead of waiting for the whole answer
+    # Strumieniuj tokeny w trakcie generowania (NDJSON) zamiast czekać na całą odpowiedź
+    REQUEST_TIMEOUT = 600  # Seconds per network operation; dropped connections and 5xx errors are retried
+    # Limit czasu (s) na operację sieciową; zerwane połączenia i błędy 5xx są ponawiane
+    MAX_PARALLEL_REQUESTS = 2  # Paragraphs corrected at the same time (see OLLAMA_NUM_PARALLEL in Ollama)
+    # Liczba akapitów poprawianych jednocześnie (por. OLLAMA_NUM_PARALLEL w Ollamie)
+    RUN_IN_BACKGROUND = True  # Run requests on a worker thread, so Writer stays responsive during generation
+    # Wykonuj zapytania w wątku roboczym, aby Writer reagował na użytkownika w trakcie generowania
+    # Send paragraphs through the local job service (job_service.py) when it is running - corrections then go ahead
+    # of batch analysis chunks waiting for the same Ollama server
+    # Wysyłaj akapity przez lokalną usługę zadań (job_service.py), gdy działa - poprawki wyprzedzają wtedy części
+    # analiz wsadowych czekające na ten sam serwer Ollamy
+    USE_JOB_SERVICE = True
+    STATUS_UPDATE_SECONDS = 0.5  # Minimum interval between status bar updates
+    # Minimalny odstęp między aktualizacjami paska stanu
+    # Tokens are printed to the console only when paragraphs are corrected one at a time
+    # Tokeny są wypisywane na konsolę tylko przy poprawianiu akapitów pojedynczo
+    print_tokens = STREAM_RESPONSE and MAX_PARALLEL_REQUESTS == 1
+    # In background mode the answer is always streamed: partial output goes to the status bar and can be cancelled
+    # W trybie w tle odpowiedź jest zawsze strumieniowana: częściowy wynik trafia na pasek stanu i można go przerwać
+    stream_tokens = STREAM_RESPONSE or RUN_IN_BACKGROUND
 
     # Prepare the prompt for Ollama exactly as it worked in the console
     # Przygotuj prompt dla Ollamy dokładnie tak, jak zadziałał w konsoli
-    full_console_prompt = (
+    correction_prompt = (
         f"BIELIKU, popraw błędy ortograficzne, gramatyczne i stylistyczne w poniższym tekście. "
         f"Upewnij się, że tekst jest poprawny językowo i naturalnie brzmiący po polsku. "
         f"Zwróć tylko poprawiony tekst, bez dodatkowych komentarzy. "
-        f"Tekst do poprawy: {selected_text_original}"
+        f"Tekst do poprawy: "
     )
 
-    messages_payload = [
-        {'role': 'user', 'content': full_console_prompt}
-    ]
+    global _active_job
+    with _active_job_lock:
+        if _active_job is not None and (_active_job["thread"] is None or _active_job["thread"].is_alive()):
+            print("WARNING: A correction is already running. Run cancel_bielik_correction to stop it.")
+            print("OSTRZEŻENIE: Poprawka już trwa. Uruchom cancel_bielik_correction, aby ją przerwać.")
+            return
+        # The job is registered under the same lock as the check (thread None = still being prepared),
+        # so a second run started meanwhile sees it and does not start a parallel correction
+        # Zadanie jest rejestrowane pod tą samą blokadą co sprawdzenie (thread None = jeszcze przygotowywane),
+        # więc uruchomione w międzyczasie drugie poprawianie je widzi i nie startuje równolegle
+        cancel_event = threading.Event()
+        job = {"thread": None, "cancel": cancel_event}
+        _active_job = job
 
     try:
-        # Connect to Ollama API
-        # Połącz się z API Ollamy
-        conn = http.client.HTTPConnection(OLLAMA_HOST, OLLAMA_PORT)
-        headers = {'Content-Type': 'application/json'}
-        body = json.dumps({
-            "model": MODEL_NAME,
-            "messages": messages_payload,
-            "stream": False  # Set to False for single response
-            # Ustaw na False dla pojedynczej odpowiedzi
-        })
-
-        print(f"Sending request to Ollama API at http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/chat...")
-        print(f"Wysyłam zapytanie do API Ollamy na http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/chat...")
-
-        conn.request("POST", "/api/chat", body=body, headers=headers)
-        response = conn.getresponse()
-        response_data = response.read().decode('utf-8')
-        conn.close()
-
-        print(f"Ollama API Response Status: {response.status}")
-        print(f"Status odpowiedzi API Ollamy: {response.status}")
-        print(f"Full Ollama API Response (for diagnostics): {response_data}")
-        print(f"Pełna odpowiedź API Ollamy (do diagnostyki): {response_data}")
-
-        if response.status == 200:
-            result = json.loads(response_data)
-
-            # Extract corrected text from Ollama's response
-            # Wyodrębnij poprawiony tekst z odpowiedzi Ollamy
-            corrected_text = ""
-            if 'message' in result and 'content' in result['message']:
-                corrected_text = result['message']['content'].strip()
-
-            if corrected_text:
-                # Replace the original text (either selection or entire document) with the corrected text
-                # Zastąp oryginalny tekst (zaznaczenie lub cały dokument) poprawionym tekstem
-                if selection_object and hasattr(selection_object, 'setString'):
-                    selection_object.setString(corrected_text)
-                    print("SUCCESS: Text corrected successfully by BIELIK!")
-                    print("SUKCES: Tekst poprawiony pomyślnie przez BIELIK-a!")
-                else:
-                    print("ERROR: Could not replace text. Selection object is invalid or lacks setString method.")
-                    print(
-                        "BŁĄD: Nie można zastąpić tekstu. Obiekt zaznaczenia jest nieprawidłowy lub nie ma metody setString.")
+        # Send the requests through the shared pooled client (keep-alive, per-request timeout, retries)
+        # Wyślij zapytania przez wspólnego klienta z pulą połączeń (keep-alive, limit czasu, ponowienia)
+        client = ollama_client.get_client(OLLAMA_HOST, OLLAMA_PORT, REQUEST_TIMEOUT)
+        cache = _load_correction_cache()
+        use_job_service = USE_JOB_SERVICE and job_service is not None and job_service.service_available()
+        if use_job_service:
+            print(f"INFO: Paragraphs are sent through the job service at {job_service.SERVICE_HOST}:{job_service.SERVICE_PORT}.")
+            print(f"INFO: Akapity są wysyłane przez usługę zadań na {job_service.SERVICE_HOST}:{job_service.SERVICE_PORT}.")
+
+        # Paragraphs already corrected earlier (or produced by an earlier correction) are not sent again
+        # Akapity poprawione wcześniej (lub będące wynikiem wcześniejszej poprawki) nie są wysyłane ponownie
+        pending = []
+        cached_corrections = {}
+        for index, (unit, unit_text) in enumerate(units):
+            cached = cache.get(_cache_key(MODEL_NAME, correction_prompt, unit_text.strip()))
+            if cached is not None:
+                cached_corrections[index] = cached
+            else:
+                pending.append(index)
+        print(f"INFO: {len(units) - len(pending)} paragraphs taken from the correction cache, {len(pending)} sent to Ollama.")
+        print(f"INFO: {len(units) - len(pending)} akapitów pobrano z cache poprawek, {len(pending)} wysłano do Ollamy.")
+
+        # Answer length is capped by the "correction" profile (proportional to the paragraph), the context by its size
+        # Długość odpowiedzi ogranicza profil "correction" (proporcjonalnie do akapitu), a kontekst - jego rozmiar
+        def correction_options(index, loaded_context=None):
+            paragraph_tokens = text_chunker.count_tokens(units[index][1].strip())
+            prompt_tokens = text_chunker.count_tokens(correction_prompt) + paragraph_tokens
+            return generation_options.options_for("correction", prompt_tokens, input_tokens=paragraph_tokens,
+                                                  loaded_context=loaded_context)
+
+        # Start loading the model right away (with a context fitting the longest paragraph); a model pinned by
+        # a running batch analysis stays pinned
+        # Rozpocznij ładowanie modelu od razu (z kontekstem dla najdłuższego akapitu); model przypięty przez
+        # trwającą analizę wsadową pozostaje przypięty
+        # The loaded context and keep_alive are resolved once here, not with every paragraph request
+        # Załadowany kontekst i keep_alive są ustalane raz tutaj, a nie przy każdym zapytaniu o akapit
+        loaded_context = None
+        keep_alive = model_lifecycle.DEFAULT_KEEP_ALIVE
+        if pending:
+            longest = max(pending, key=lambda index: len(units[index][1]))
+            warm_up_context = correction_options(longest)["num_ctx"]
+            # After the warm-up the model has at least the context of the longest paragraph (a larger one is kept)
+            # Po załadowaniu model ma co najmniej kontekst najdłuższego akapitu (większy jest zachowywany)
+            loaded_context = max(model_lifecycle.loaded_context_length(OLLAMA_HOST, OLLAMA_PORT, MODEL_NAME) or 0,
+                                 warm_up_context)
+            keep_alive = model_lifecycle.keep_alive_for(OLLAMA_HOST, OLLAMA_PORT, MODEL_NAME)
+            model_lifecycle.warm_up_in_background(OLLAMA_HOST, OLLAMA_PORT, MODEL_NAME,
+                                                  options={"num_ctx": warm_up_context})
+
+        # Status bar indicator of the document window (progress and the latest streamed text)
+        # Wskaźnik na pasku stanu okna dokumentu (postęp i ostatni strumieniowany tekst)
+        indicator = None
+        try:
+            indicator = controller.getFrame().createStatusIndicator()
+            indicator.start("BIELIK", max(1, len(pending)))
+        except Exception as e:
+            print(f"WARNING: Status bar indicator not available: {e}")
+            print(f"OSTRZEŻENIE: Wskaźnik na pasku stanu niedostępny: {e}")
+        status = {"done": 0, "last_update": 0.0}
+
+        def on_main_thread(function):
+            if RUN_IN_BACKGROUND:
+                _run_on_main_thread(function)
             else:
-                print("WARNING: Ollama returned an empty corrected text.")
-                print("OSTRZEŻENIE: Ollama zwróciła pusty poprawiony tekst.")
-        else:
-            print(f"ERROR: Ollama server error: HTTP {response.status} - {response_data}")
-            print(f"BŁĄD: Błąd serwera Ollamy: HTTP {response.status} - {response_data}")
+                function()
+
+        def report_status(text, force=False):
+            now = time.monotonic()
+            if indicator is None or (not force and now - status["last_update"] < STATUS_UPDATE_SECONDS):
+                return
+            status["last_update"] = now
+            done = status["done"]
+
+            def update_indicator():
+                indicator.setValue(done)
+                indicator.setText(text)
+
+            on_main_thread(update_indicator)
+
+        result = {"changed": 0, "failed": 0, "skipped": 0}
+
+        def apply_correction(index, corrected_text):
+            # Runs on the main thread. A paragraph edited by the user in the meantime is left as it is
+            # Działa w głównym wątku. Akapit zmieniony w międzyczasie przez użytkownika pozostaje bez zmian
+            unit, unit_text = units[index]
+            stripped = unit_text.strip()
+            if corrected_text == stripped:
+                return
+            try:
+                if unit.getString() != unit_text:
+                    print(f"WARNING: Paragraph {index + 1} was edited during correction - skipped.")
+                    print(f"OSTRZEŻENIE: Akapit {index + 1} zmieniono w trakcie poprawiania - pominięto.")
+                    result["skipped"] += 1
+                    return
+                # Write back keeping leading/trailing whitespace of the original
+                # Zapis z zachowaniem białych znaków na brzegach oryginału
+                leading = unit_text[:len(unit_text) - len(unit_text.lstrip())]
+                trailing = unit_text[len(unit_text.rstrip()):]
+                _apply_diff(unit, unit_text, leading + corrected_text + trailing)
+                result["changed"] += 1
+            except Exception as e:
+                print(f"ERROR: Could not replace text of paragraph {index + 1}: {e}")
+                print(f"BŁĄD: Nie można zastąpić tekstu akapitu {index + 1}: {e}")
 
-    except Exception as e:
-        print(f"CRITICAL ERROR: During communication with Ollama: {e}")
-        print(f"KRYTYCZNY BŁĄD: Podczas komunikacji z Ollamą: {e}")
+        def correct_paragraph(index):
+            # Runs in a worker thread - only HTTP here, the document is changed on the main thread
+            # Działa w wątku roboczym - tylko HTTP, dokument jest zmieniany w głównym wątku
+            if cancel_event.is_set():
+                raise CorrectionCancelled()
+            partial = []
+
+            def on_token(token):
+                if cancel_event.is_set():
+                    raise CorrectionCancelled()  # Stops reading the stream and closes the connection
+                    # Przerywa odczyt strumienia i zamyka połączenie
+                partial.append(token)
+                if print_tokens:
+                    _print_token(token)
+                report_status(f"BIELIK {status['done'] + 1}/{len(pending)}: ...{''.join(partial)[-60:]}")
+
+            if use_job_service:
+                corrected_text = job_service.correct_paragraph(job_service.SERVICE_HOST, job_service.SERVICE_PORT,
+                                                               correction_prompt, units[index][1].strip(), on_token,
+                                                               model=MODEL_NAME)
+                if print_tokens:
+                    print()
+                return (corrected_text or "").strip()
+
+            messages_payload = [{'role': 'user', 'content': correction_prompt + units[index][1].strip()}]
+            options = correction_options(index, loaded_context)
+            response = client.chat(MODEL_NAME, messages_payload, stream=stream_tokens,
+                                   on_token=on_token if stream_tokens else None, options=options,
+                                   keep_alive=keep_alive)
+            if print_tokens:
+                print()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status} - {response.raw}")
+            # A cut answer would drop the end of the paragraph - it is not applied
+            # Ucięta odpowiedź usunęłaby koniec akapitu - nie jest stosowana
+            if (response.data or {}).get("done_reason") == "length":
+                raise RuntimeError(f"num_predict limit reached ({options['num_predict']} tokens)")
+            return (response.content or "").strip()
+
+        def run_corrections():
+            for index, corrected_text in sorted(cached_corrections.items()):
+                on_main_thread(lambda index=index, corrected_text=corrected_text: apply_correction(index, corrected_text))
+
+            cancelled = False
+            with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as executor:
+                futures = {index: executor.submit(correct_paragraph, index) for index in pending}
+                for index, future in futures.items():
+                    try:
+                        corrected_text = future.result()
+                    except CorrectionCancelled:
+                        cancelled = True
+                        continue
+                    except ollama_client.PartialResponseError as e:
+                        # The stream broke mid-answer - this paragraph is left untouched
+                        # Strumień przerwał się w połowie odpowiedzi - ten akapit pozostaje bez zmian
+                        print(f"\nCRITICAL ERROR: Ollama stream interrupted, paragraph {index + 1} not replaced: {e}")
+                        print(f"KRYTYCZNY BŁĄD: Strumień Ollamy przerwany, akapit {index + 1} nie został zastąpiony: {e}")
+                        result["failed"] += 1
+                        continue
+                    except Exception as e:
+                        print(f"CRITICAL ERROR: During communication with Ollama (paragraph {index + 1}): {e}")
+                        print(f"KRYTYCZNY BŁĄD: Podczas komunikacji z Ollamą (akapit {index + 1}): {e}")
+                        result["failed"] += 1
+                        continue
+                    status["done"] += 1
+                    report_status(f"BIELIK {status['done']}/{len(pending)}", force=True)
+                    if not corrected_text:
+                        print(f"WARNING: Ollama returned an empty corrected text for paragraph {index + 1}.")
+                        print(f"OSTRZEŻENIE: Ollama zwróciła pusty poprawiony tekst dla akapitu {index + 1}.")
+                        continue
+                    cache[_cache_key(MODEL_NAME, correction_prompt, units[index][1].strip())] = corrected_text
+                    cache[_cache_key(MODEL_NAME, correction_prompt, corrected_text)] = corrected_text
+                    on_main_thread(lambda index=index, corrected_text=corrected_text: apply_correction(index, corrected_text))
+
+            _save_correction_cache(cache)
+
+            def finish():
+                if indicator is not None:
+                    indicator.end()
+                if cancelled:
+                    print(f"INFO: Correction cancelled - {result['changed']} paragraphs were already corrected.")
+                    print(f"INFO: Poprawianie przerwane - poprawiono już {result['changed']} akapitów.")
+                print(f"SUCCESS: BIELIK corrected {result['changed']} of {len(units)} paragraphs "
+                      f"({result['failed']} failed, {result['skipped']} edited meanwhile).")
+                print(f"SUKCES: BIELIK poprawił {result['changed']} z {len(units)} akapitów "
+                      f"(nieudanych: {result['failed']}, zmienionych w międzyczasie: {result['skipped']}).")
+
+            on_main_thread(finish)
+
+        print(f"Sending requests to Ollama API at http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/chat...")
+        print(f"Wysyłam zapytania do API Ollamy na http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/chat...")
+
+        if not RUN_IN_BACKGROUND:
+            run_corrections()
+            return
+
+        worker = threading.Thread(target=run_corrections, name="bielik-corrector", daemon=True)
+        with _active_job_lock:
+            job["thread"] = worker
+        worker.start()
+        print("INFO: Correction runs in the background - progress on the status bar, stop with cancel_bielik_correction.")
+        print("INFO: Poprawianie działa w tle - postęp na pasku stanu, przerwanie: cancel_bielik_correction.")
+    finally:
+        # No background thread was started (synchronous run, error while preparing) - release the registration
+        # Nie uruchomiono wątku w tle (poprawianie synchroniczne, błąd podczas przygotowania) - zwolnij rejestrację
+        if job["thread"] is None:
+            with _active_job_lock:
+                if _active_job is job:
+                    _active_job = None
+
+
+# Cancel the correction running in the background (paragraphs already corrected are kept)
+# Przerwij poprawianie działające w tle (już poprawione akapity pozostają)
+def cancel_bielik_correction(*args):
+    with _active_job_lock:
+        job = _active_job
+    if job is None or (job["thread"] is not None and not job["thread"].is_alive()):
+        print("INFO: No correction is running.")
+        print("INFO: Żadne poprawianie nie jest w toku.")
+        return
+    job["cancel"].set()
+    print("INFO: Cancelling the correction...")
+    print("INFO: Przerywam poprawianie...")
 
 
 # Register the macro for LibreOffice (required for execution)
 # Rejestracja makra dla LibreOffice (wymagane do wykonania)
-g_exportedScripts = correct_text_with_ollama,
\ No newline at end of file
+g_exportedScripts = correct_text_with_ollama, cancel_bielik_correction
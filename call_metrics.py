@@ -0,0 +1,215 @@
+import os
+import sys
+import csv
+import json
+import resource
+import threading
+
+# --- Telemetria wywołań BIELIKA na podstawie liczników zwracanych przez Ollama /api/chat ---
+# Ollama podaje w odpowiedzi (w trybie strumieniowym - w ostatnim obiekcie "done": true):
+# prompt_eval_count / prompt_eval_duration - tokeny i czas przetwarzania promptu (prefill),
+# eval_count / eval_duration - tokeny i czas generowania odpowiedzi (decode),
+# load_duration - czas ładowania modelu, total_duration - łączny czas po stronie serwera. Czasy są w nanosekundach.
+NS_PER_SECOND = 1_000_000_000
+
+CSV_FIELDS = [
+    "file", "part", "backend", "cached", "prompt_tokens", "output_tokens",
+    "load_seconds", "prefill_seconds", "decode_seconds", "server_seconds", "wall_seconds",
+    "prefill_tokens_per_second", "decode_tokens_per_second",
+    "sent_prompt_tokens", "reused_prompt_tokens", "prefill_seconds_saved",
+]
+SUMMED_FIELDS = ["prompt_tokens", "output_tokens", "load_seconds", "prefill_seconds", "decode_seconds",
+                 "server_seconds", "wall_seconds", "sent_prompt_tokens", "reused_prompt_tokens", "prefill_seconds_saved"]
+
+
+def _rate(tokens, seconds):
+    return round(tokens / seconds, 2) if seconds > 0 else 0.0
+
+
+def peak_rss_mb():
+    """
+    Szczytowe zużycie pamięci (RSS) procesu i jego zakończonych procesów potomnych (pula ekstrakcji), w MB,
+    od uruchomienia procesu.
+    """
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss: bajty na macOS, kilobajty na Linuksie
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / divisor, 1)
+
+
+def _process_rss_bytes(pid):
+    with open(f"/proc/{pid}/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _child_pids():
+    pids = []
+    for task in os.listdir("/proc/self/task"):
+        try:
+            with open(f"/proc/self/task/{task}/children", "r") as f:
+                pids.extend(f.read().split())
+        except OSError:
+            continue  # Jądro bez CONFIG_PROC_CHILDREN - liczony jest tylko proces główny
+    return pids
+
+
+def current_rss_mb():
+    """
+    Bieżące RSS procesu i jego działających procesów potomnych (pula ekstrakcji), w MB.
+    None, gdy system nie udostępnia /proc (np. macOS).
+    """
+    try:
+        total = _process_rss_bytes("self")
+    except (OSError, ValueError, IndexError):
+        return None
+    for pid in _child_pids():
+        try:
+            total += _process_rss_bytes(pid)
+        except (OSError, ValueError, IndexError):
+            continue  # Proces potomny zdążył się zakończyć
+    return round(total / (1024 * 1024), 1)
+
+
+# --- Szczytowe RSS jednego przebiegu (tryb kolejki, obserwacji katalogu i usługa działają w jednym procesie) ---
+RSS_SAMPLE_SECONDS = 0.5
+
+
+class RssSampler:
+    """
+    Próbkuje bieżące RSS co RSS_SAMPLE_SECONDS w wątku w tle, od utworzenia do stop().
+    ru_maxrss (peak_rss_mb) jest szczytem od uruchomienia procesu, więc w kolejnych przebiegach tego samego
+    procesu pokazywałby największy wcześniejszy przebieg. Bez /proc stop() zwraca ru_maxrss tylko wtedy,
+    gdy przebieg ustanowił nowy szczyt procesu (inaczej None).
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.start_peak = peak_rss_mb()
+        self.peak = current_rss_mb()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self):
+        """Kończy próbkowanie (można wywołać wielokrotnie) i zwraca szczytowe RSS przebiegu w MB albo None."""
+        if not self.stop_event.is_set():
+            self.stop_event.set()
+            self.thread.join()
+            self.sample()
+        if self.peak is None:
+            process_peak = peak_rss_mb()
+            return process_peak if process_peak > self.start_peak else None
+        return self.peak
+
+
+def describe_peak_rss(peak_mb):
+    if peak_mb is None:
+        return "niedostępne (brak /proc; szczyt procesu nie został przekroczony w tym przebiegu)"
+    return f"{peak_mb} MB (próbki co {RSS_SAMPLE_SECONDS} s, z procesami ekstrakcji)"
+
+
+# --- Metryki jednego wywołania z odpowiedzi Ollama ---
+def from_ollama_response(data, wall_seconds, sent_prompt_tokens=0):
+    """
+    data - sparsowana odpowiedź /api/chat (lub ostatni obiekt strumienia); brakujące liczniki liczone są jako 0
+    (Ollama pomija np. prompt_eval_count, gdy cały prompt pochodzi z jej pamięci podręcznej).
+    sent_prompt_tokens - liczba tokenów wysłanych wiadomości. Ollama liczy w prompt_eval_count tylko tokeny
+    faktycznie przetworzone, więc różnica to prefiks wzięty z cache KV, a jej czas - zaoszczędzony prefill
+    (bez tokenizera Bielika liczba wysłanych tokenów jest szacowana, więc wynik jest przybliżony).
+    """
+    data = data or {}
+    prompt_tokens = data.get("prompt_eval_count", 0)
+    output_tokens = data.get("eval_count", 0)
+    prefill_seconds = data.get("prompt_eval_duration", 0) / NS_PER_SECOND
+    decode_seconds = data.get("eval_duration", 0) / NS_PER_SECOND
+    reused_prompt_tokens = max(0, sent_prompt_tokens - prompt_tokens) if prompt_tokens else 0
+    prefill_rate = prompt_tokens / prefill_seconds if prefill_seconds > 0 else 0.0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "load_seconds": round(data.get("load_duration", 0) / NS_PER_SECOND, 3),
+        "prefill_seconds": round(prefill_seconds, 3),
+        "decode_seconds": round(decode_seconds, 3),
+        "server_seconds": round(data.get("total_duration", 0) / NS_PER_SECOND, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "prefill_tokens_per_second": _rate(prompt_tokens, prefill_seconds),
+        "decode_tokens_per_second": _rate(output_tokens, decode_seconds),
+        "sent_prompt_tokens": sent_prompt_tokens,
+        "reused_prompt_tokens": reused_prompt_tokens,
+        "prefill_seconds_saved": round(reused_prompt_tokens / prefill_rate, 3) if prefill_rate > 0 else 0.0,
+    }
+
+
+class CallMetricsLog:
+    """
+    Zbiera metryki wywołań jednego przebiegu i dopisuje je na bieżąco do <run_id>.jsonl oraz <run_id>.csv.
+    current_file - plik PDF (lub etap, np. globalne podsumowanie), do którego przypisywane są kolejne wywołania.
+    """
+
+    def __init__(self, log_folder, run_id):
+        os.makedirs(log_folder, exist_ok=True)
+        self.jsonl_path = os.path.join(log_folder, f"{run_id}.jsonl")
+        self.csv_path = os.path.join(log_folder, f"{run_id}.csv")
+        self.lock = threading.Lock()
+        self.current_file = None
+        self.records = []
+
+    def record(self, part, metrics, backend="", cached=False, file_name=None):
+        file_name = self.current_file if file_name is None else file_name
+        entry = {"file": file_name or "", "part": part, "backend": backend, "cached": cached}
+        entry.update(metrics)
+        with self.lock:
+            self.records.append(entry)
+            try:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                write_header = not os.path.exists(self.csv_path)
+                with open(self.csv_path, "a", encoding="utf-8", newline="") as f:
+                    writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+                    if write_header:
+                        writer.writeheader()
+                    writer.writerow(entry)
+            except OSError as e:
+                print(f"OSTRZEŻENIE: Nie można zapisać metryk wywołania BIELIKA: {e}")
+
+    # --- Sumy dla całego przebiegu lub jednego pliku ---
+    def totals(self, file_name=None):
+        selected = [r for r in self.records if file_name is None or r["file"] == file_name]
+        totals = {field: sum(r[field] for r in selected) for field in SUMMED_FIELDS}
+        totals["calls"] = sum(1 for r in selected if not r["cached"])
+        totals["cached_calls"] = sum(1 for r in selected if r["cached"])
+        totals["prefill_tokens_per_second"] = _rate(totals["prompt_tokens"], totals["prefill_seconds"])
+        totals["decode_tokens_per_second"] = _rate(totals["output_tokens"], totals["decode_seconds"])
+        return totals
+
+    def file_names(self):
+        return list(dict.fromkeys(r["file"] for r in self.records))
+
+    def summary_text(self):
+        """
+        Tekst do podsumowania użycia: sumy przebiegu i podział czasu na ładowanie modelu, prefill i generowanie.
+        """
+        lines = []
+        for label, totals in [("CAŁY PRZEBIEG", self.totals())] + [(name, self.totals(name))
+                                                                    for name in self.file_names()]:
+            lines.append(
+                f"[{label}] wywołania: {totals['calls']} (+{totals['cached_calls']} z cache), "
+                f"tokeny promptu: {totals['prompt_tokens']}, tokeny odpowiedzi: {totals['output_tokens']}\n"
+                f"    ładowanie modelu: {totals['load_seconds']:.1f} s, "
+                f"prefill: {totals['prefill_seconds']:.1f} s ({totals['prefill_tokens_per_second']} tok/s), "
+                f"generowanie: {totals['decode_seconds']:.1f} s ({totals['decode_tokens_per_second']} tok/s), "
+                f"czas po stronie serwera: {totals['server_seconds']:.1f} s, suma czasów oczekiwania na odpowiedź: {totals['wall_seconds']:.1f} s\n"
+                f"    prefiks promptu z cache KV: {totals['reused_prompt_tokens']} z {totals['sent_prompt_tokens']} tokenów, "
+                f"zaoszczędzony prefill: {totals['prefill_seconds_saved']:.1f} s "
+                f"(średnio {totals['prefill_seconds_saved'] / max(1, totals['calls']):.2f} s na wywołanie)"
+            )
+        return "\n".join(lines) + "\n"
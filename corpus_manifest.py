@@ -0,0 +1,67 @@
+import os
+import json
+import datetime
+import threading
+
+# --- Manifest korpusu: co i czym przeanalizowano dla każdego pliku PDF ---
+# Dla każdego pliku zapamiętywany jest skrót zawartości, zakres stron i wersja analizy (model, Modfile, prompt),
+# które dały zapisany wynik. Plik bez zmian w żadnym z tych pól nie jest analizowany ponownie.
+
+
+class CorpusManifest:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+            if not isinstance(self.entries, dict):
+                self.entries = {}
+                raise ValueError("oczekiwano obiektu JSON")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"OSTRZEŻENIE: Nie można odczytać manifestu korpusu '{path}' ({e}). Wszystkie pliki zostaną przeanalizowane.")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)  # Zapis atomowy - przerwany zapis nie uszkodzi manifestu
+
+    # --- Wynik zapisany dla niezmienionego pliku (None, jeśli plik jest nowy lub zmieniony) ---
+    def get_unchanged(self, file_name, content_hash, page_range, analysis_version):
+        entry = self.entries.get(file_name)
+        if (isinstance(entry, dict) and entry.get("content_hash") == content_hash
+                and entry.get("page_range") == list(page_range) and entry.get("analysis_version") == analysis_version):
+            return entry
+        return None
+
+    def record(self, file_name, content_hash, page_range, analysis_version, result):
+        """
+        result - {"processed", "output_sha256"} jak w dzienniku przebiegu (run_journal): tekst analizy jest tylko
+        w pliku wynikowym, a skrót pozwala sprawdzić, czy plik od tego czasu się nie zmienił.
+        """
+        with self.lock:
+            self.entries[file_name] = dict(result, content_hash=content_hash, page_range=list(page_range),
+                                           analysis_version=analysis_version,
+                                           updated=datetime.datetime.now().isoformat(timespec="seconds"))
+            try:
+                self._save()
+            except OSError as e:
+                print(f"OSTRZEŻENIE: Nie można zapisać manifestu korpusu '{self.path}': {e}")
+
+    # --- Usunięcie wpisów plików, których nie ma już w folderze wejściowym ---
+    def prune(self, existing_file_names):
+        with self.lock:
+            removed = [name for name in self.entries if name not in set(existing_file_names)]
+            for name in removed:
+                del self.entries[name]
+            if removed:
+                try:
+                    self._save()
+                except OSError as e:
+                    print(f"OSTRZEŻENIE: Nie można zapisać manifestu korpusu '{self.path}': {e}")
+        return removed
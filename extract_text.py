@@ -1,34 +1,99 @@
 import pdfplumber
 import PyPDF2
 import os
+import collections
+
+import pdf_text_cache
+import pdf_extractors
+
+
+# --- Odczyt stron przez cache (klucz: skrót zawartości PDF + użyty ekstraktor + normalizacja tekstu) ---
+# read_pages(pdf_path, start_page, end_page) zwraca (liczba_stron, indeks_pierwszej_strony, lista_tekstów_stron,
+# lista_ekstraktorów_stron). normalized=False - surowy tekst ekstraktora (pdfplumber, PyPDF2 poniżej) nie jest
+# mieszany w cache z tekstem znormalizowanym przez pdf_extractors (ekstrakcja "auto" i analiza).
+def extract_pages_cached(pdf_path, extractor, start_page, end_page, read_pages, normalized=True):
+    num_pages = pdf_text_cache.get_cached_page_count(pdf_path)
+    if num_pages is not None:
+        start_index = max(0, start_page - 1)
+        end_index = max(start_index, min(num_pages, end_page))
+        page_texts = pdf_text_cache.get_cached_pages(pdf_path, extractor, start_index, end_index, normalized=normalized)
+        if page_texts is not None:
+            print(f"Tekst stron {start_page}-{end_page} ({extractor}) pobrano z cache.")
+            return page_texts
+
+    num_pages, start_index, page_texts, page_backends = read_pages(pdf_path, start_page, end_page)
+    backend = pdf_extractors.choose_backends(pdf_path)[0] if extractor == "auto" else extractor
+    pdf_text_cache.store_page_count(pdf_path, num_pages)
+    pdf_text_cache.store_pages(pdf_path, extractor, backend, start_index, page_texts, page_backends=page_backends,
+                               normalized=normalized)
+    return page_texts
+
 
 # --- Funkcja do ekstrakcji tekstu za pomocą pdfplumber (preferowana) ---
+def _read_pages_pdfplumber(pdf_path, start_page, end_page):
+    page_texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        # Indeksowanie stron w pdfplumber (i PyPDF2) zaczyna się od 0
+        # Więc "strona X" z dokumentu to indeks X-1
+        for i in range(start_page - 1, end_page):
+            if 0 <= i < len(pdf.pages): # Sprawdź, czy strona istnieje w dokumencie
+                page_texts.append(pdf.pages[i].extract_text())
+        return len(pdf.pages), max(0, start_page - 1), page_texts, ["pdfplumber"] * len(page_texts)
+
+
 def extract_pages_pdfplumber(pdf_path, start_page, end_page):
     text = ""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Indeksowanie stron w pdfplumber (i PyPDF2) zaczyna się od 0
-            # Więc "strona X" z dokumentu to indeks X-1
-            for i in range(start_page - 1, end_page):
-                if 0 <= i < len(pdf.pages): # Sprawdź, czy strona istnieje w dokumencie
-                    text += pdf.pages[i].extract_text() + "\n" # Dodaj znak nowej linii po każdej stronie
+        for page_text in extract_pages_cached(pdf_path, "pdfplumber", start_page, end_page, _read_pages_pdfplumber,
+                                              normalized=False):
+            text += page_text + "\n" # Dodaj znak nowej linii po każdej stronie
         return text
     except Exception as e:
         print(f"Błąd pdfplumber podczas przetwarzania pliku '{pdf_path}': {e}")
         print("Spróbuj użyć alternatywnej metody (PyPDF2) lub sprawdź plik PDF.")
         return None # Zwróć None w przypadku błędu
 
+# --- Ekstrakcja najszybszym ekstraktorem dla dokumentu, z zapasowymi ekstraktorami dla każdej strony ---
+def _read_pages_auto(pdf_path, start_page, end_page):
+    backends = pdf_extractors.choose_backends(pdf_path)
+    num_pages = pdf_extractors.page_count(pdf_path, backends)
+    start_index = max(0, start_page - 1)
+    pages = pdf_extractors.extract_pages(pdf_path, start_index, max(start_index, min(num_pages, end_page)), backends)
+    page_backends = [backend for _, backend in pages]
+    print(f"Ekstraktory stron: {pdf_extractors.describe_page_backends(collections.Counter(page_backends))}")
+    return num_pages, start_index, [page_text for page_text, _ in pages], page_backends
+
+
+def extract_pages_auto(pdf_path, start_page, end_page):
+    text = ""
+    try:
+        for page_text in extract_pages_cached(pdf_path, "auto", start_page, end_page, _read_pages_auto):
+            text += page_text + "\n"
+        return text
+    except Exception as e:
+        print(f"Błąd ekstrakcji tekstu z pliku '{pdf_path}': {e}")
+        print("Upewnij się, że plik PDF nie jest uszkodzony lub zabezpieczony.")
+        return None
+
 # --- Alternatywna funkcja do ekstrakcji tekstu za pomocą PyPDF2 ---
 # Użyj tej funkcji, jeśli pdfplumber napotka błędy (np. "No /Root object!")
+def _read_pages_pypdf2(pdf_path, start_page, end_page):
+    page_texts = []
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for i in range(start_page - 1, end_page):
+            if 0 <= i < len(reader.pages):
+                page_obj = reader.pages[i]
+                page_texts.append(page_obj.extract_text())
+        return len(reader.pages), max(0, start_page - 1), page_texts, ["pypdf2"] * len(page_texts)
+
+
 def extract_pages_pypdf2(pdf_path, start_page, end_page):
     text = ""
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for i in range(start_page - 1, end_page):
-                if 0 <= i < len(reader.pages):
-                    page_obj = reader.pages[i]
-                    text += page_obj.extract_text() + "\n"
+        for page_text in extract_pages_cached(pdf_path, "pypdf2", start_page, end_page, _read_pages_pypdf2,
+                                              normalized=False):
+            text += page_text + "\n"
         return text
     except Exception as e:
         print(f"Błąd PyPDF2 podczas przetwarzania pliku '{pdf_path}': {e}")
@@ -53,12 +118,8 @@ if not os.path.exists(pdf_file_name):
     print(f"Błąd: Plik PDF '{pdf_file_name}' nie został znaleziony w katalogu '{os.getcwd()}'")
     print("Upewnij się, że plik został zmieniony i przeniesiony do tego katalogu.")
 else:
-    extracted_text = extract_pages_pdfplumber(pdf_file_name, start_page_num, end_page_num)
-
-    # Jeśli pdfplumber zawiódł, spróbuj PyPDF2
-    if extracted_text is None:
-        print("\nPróba użycia PyPDF2 jako alternatywy...")
-        extracted_text = extract_pages_pypdf2(pdf_file_name, start_page_num, end_page_num)
+    # Najszybszy ekstraktor dla dokumentu; strony, na których zawiedzie, są czytane kolejnym (pdfplumber, PyPDF2...)
+    extracted_text = extract_pages_auto(pdf_file_name, start_page_num, end_page_num)
 
     if extracted_text:
         try:
@@ -68,4 +129,5 @@ else:
         except Exception as e:
             print(f"Błąd podczas zapisu pliku tekstowego: {e}")
     else:
-        print("Nie udało się wyodrębnić tekstu z PDF za pomocą żadnej z metod.")
\ No newline at end of file
+        print("Nie udało się wyodrębnić tekstu z PDF za pomocą żadnej z metod.")
+    pdf_text_cache.evict_to_size()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import math
+
+# --- Profile opcji generowania (Ollama "options") dla poszczególnych zadań ---
+# Bez opcji Ollama używa domyślnego num_ctx (obcina długie prompty) i nie ogranicza długości odpowiedzi.
+# num_predict ogranicza odpowiedź według zadania, więc czas generowania jednej części ma górną granicę.
+# num_ctx wynika ze zmierzonej liczby tokenów promptu + num_predict, zaokrąglonej w górę do potęgi dwójki - zmiana
+# num_ctx wymusza ponowne załadowanie modelu w Ollamie, dlatego rozmiarów jest niewiele, a model załadowany już
+# z wystarczającym kontekstem jest używany bez przeładowania.
+MODEL_CONTEXT_TOKENS = 32_768  # Okno kontekstu Bielik-4.5B-v3.0-Instruct
+MIN_CONTEXT_TOKENS = 4_096  # Najmniejszy num_ctx wysyłany do Ollamy
+CONTEXT_MARGIN_TOKENS = 256  # Zapas na znaczniki szablonu czatu (<|im_start|> ...) i błąd szacowania liczby tokenów
+MIN_PREDICT_TOKENS = 256  # num_predict nie spada poniżej tej wartości (także dla bardzo krótkich akapitów)
+
+TASK_PROFILES = {
+    # Analiza części dokumentu: fakty i ocena prawna po polsku i angielsku oraz treść promptu na końcu
+    "analysis": {"num_predict": 3_072},
+    # Węzły drzewa i korzeń globalnego podsumowania (trzon pisma do kancelarii)
+    "global_summary": {"num_predict": 4_096},
+    # Poprawa akapitu (makro LibreOffice): odpowiedź niewiele dłuższa od poprawianego tekstu
+    "correction": {"num_predict": 2_048, "output_ratio": 1.5},
+    # Odpowiedź na pytanie o wybrane artykuły (article_index.py)
+    "question": {"num_predict": 1_024},
+}
+PROFILE_SETTINGS = {"output_ratio"}  # Klucze profilu, które nie są opcjami Ollamy
+
+
+def context_size(needed_tokens, max_context=MODEL_CONTEXT_TOKENS):
+    size = MIN_CONTEXT_TOKENS
+    while size < needed_tokens and size < max_context:
+        size *= 2
+    return min(size, max_context)
+
+
+def options_for(task, prompt_tokens, input_tokens=None, max_context=MODEL_CONTEXT_TOKENS, loaded_context=None):
+    """
+    Opcje Ollamy dla zapytania zadania task. prompt_tokens - zmierzona liczba tokenów wiadomości,
+    input_tokens - tokeny poprawianego tekstu (profile z output_ratio), loaded_context - num_ctx modelu
+    załadowanego już na serwerze (model_lifecycle.loaded_context_length), używany, jeśli wystarcza.
+    """
+    profile = TASK_PROFILES[task]
+    options = {key: value for key, value in profile.items() if key not in PROFILE_SETTINGS}
+    num_predict = profile["num_predict"]
+    if profile.get("output_ratio") and input_tokens is not None:
+        num_predict = min(num_predict, max(MIN_PREDICT_TOKENS, math.ceil(input_tokens * profile["output_ratio"])))
+
+    needed_tokens = prompt_tokens + num_predict + CONTEXT_MARGIN_TOKENS
+    if loaded_context and loaded_context >= needed_tokens:
+        num_ctx = loaded_context
+    else:
+        num_ctx = context_size(needed_tokens, max_context)
+    # Prompt ma pierwszeństwo - odpowiedź dostaje resztę okna, jeśli limit profilu by się w nim nie zmieścił
+    options["num_predict"] = max(MIN_PREDICT_TOKENS, min(num_predict, num_ctx - prompt_tokens - CONTEXT_MARGIN_TOKENS))
+    options["num_ctx"] = num_ctx
+    return options
+
+
+# --- Zgodność profili z parametrami modelu z Modfile (PARAMETER nazwa wartość) ---
+def read_modfile_parameters(modfile_path):
+    parameters = {}
+    try:
+        with open(modfile_path, "r", encoding="utf-8") as f:
+            for line in f:
+                keyword, _, rest = line.strip().partition(" ")
+                if keyword.upper() == "PARAMETER":
+                    name, _, value = rest.strip().partition(" ")
+                    parameters.setdefault(name, []).append(value.strip().strip('"'))
+    except OSError:
+        return None
+    return parameters
+
+
+def _same_value(modfile_value, value):
+    try:
+        return float(modfile_value) == float(value)
+    except ValueError:
+        return modfile_value == str(value)
+
+
+def validate_profiles(modfile_path, max_context=MODEL_CONTEXT_TOKENS, response_reserve=None):
+    """
+    Zwraca listę ostrzeżeń o niezgodności TASK_PROFILES z Modfile i oknem kontekstu (pusta lista - profile poprawne).
+    response_reserve - liczba tokenów odpowiedzi, którą podział tekstu na części zostawia wolną w oknie kontekstu.
+    """
+    parameters = read_modfile_parameters(modfile_path)
+    if parameters is None:
+        return [f"Nie można odczytać Modfile '{modfile_path}' - profile opcji nie zostały sprawdzone."]
+
+    warnings = []
+    if "stop" not in parameters:
+        warnings.append("Modfile nie ustawia 'stop' - odpowiedź może kończyć się dopiero na limicie num_predict.")
+    for name in ("num_ctx", "num_predict"):
+        if name in parameters:
+            warnings.append(f"Modfile ustawia {name} {parameters[name][0]}, ale profile zadań nadpisują go "
+                            f"w każdym zapytaniu.")
+    for task, profile in TASK_PROFILES.items():
+        num_predict = profile["num_predict"]
+        if num_predict + CONTEXT_MARGIN_TOKENS >= max_context:
+            warnings.append(f"Profil '{task}': num_predict {num_predict} nie mieści się w oknie kontekstu {max_context}.")
+        if response_reserve is not None and num_predict > response_reserve and task in ("analysis", "global_summary"):
+            warnings.append(f"Profil '{task}': num_predict {num_predict} przekracza rezerwę na odpowiedź "
+                            f"({response_reserve}) - długie części zostaną obsłużone z krótszym limitem odpowiedzi.")
+        for name, value in profile.items():
+            if name in parameters and name not in PROFILE_SETTINGS and not _same_value(parameters[name][0], value):
+                warnings.append(f"Profil '{task}' zmienia {name} z {parameters[name][0]} (Modfile) na {value}.")
+    return warnings
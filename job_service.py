@@ -0,0 +1,516 @@
+import os
+import sys
+import json
+import uuid
+import queue
+import argparse
+import datetime
+import threading
+import collections
+import http.client
+import importlib.util
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import ollama_client
+import backend_scheduler
+import generation_options
+import text_chunker
+import call_metrics
+
+# --- Lokalna usługa zadań: analizy PDF i poprawki akapitów w jednej kolejce przed serwerami Ollama ---
+# POST /jobs                 - nowe zadanie, odpowiedź: {"id": ..., "status": "queued", ...}
+#   {"type": "analysis"}                                 - przebieg wsadowy folderu PDF_INPUT_FOLDER
+#   {"type": "analysis", "pages": ["WZORZEC=ZAKRES"], "run_id": "..."} - jak --pages i --run-id skryptu
+#   {"type": "analysis", "path": "/ścieżka/plik.pdf", "pages": "1-5"}  - analiza jednego pliku
+#   {"type": "correction", "prompt": "...", "paragraphs": ["...", ...], "model": "..."} - poprawa akapitów
+#                            (jak makro korektora); bez "model" - MODEL_NAME skryptu analizy
+# GET /jobs, GET /jobs/<id>  - stan zadań i wynik
+# GET /jobs/<id>/events?from=N - strumień zdarzeń NDJSON (log, token, paragraph, status) do końca zadania
+# DELETE /jobs/<id>          - anulowanie zadania w kolejce, trwającej poprawki lub analizy (analiza kończy się
+#                              po zapytaniach już wysłanych do serwerów; ukończone części zostają w dzienniku)
+# GET /health                - stan usługi i kolejki serwerów
+# Analizy działają po kolei w jednym wątku, a ich części czekają na serwery z priorytetem wsadowym. Poprawki mają
+# priorytet interaktywny - wyprzedzają części analiz czekające w kolejce (backend_scheduler).
+SERVICE_HOST = "127.0.0.1"  # Tylko lokalnie - usługa nie ma uwierzytelniania
+SERVICE_PORT = 11500
+SERVICE_CHECK_TIMEOUT = 2  # Limit czasu (s) sprawdzenia, czy usługa działa (makro korektora)
+EVENT_WAIT_SECONDS = 15  # Co tyle sekund bez zdarzeń strumień dostaje pustą linię (wykrycie rozłączenia klienta)
+MAX_JOB_EVENTS = 20_000  # Zdarzenia trzymane dla jednego zadania - starsze są usuwane (długie przebiegi wsadowe)
+MAX_FINISHED_JOBS = 200  # Ukończone zadania trzymane w pamięci (stan i wynik)
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+SCRIPT_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_type, request, priority):
+        self.id = uuid.uuid4().hex[:12]
+        self.type = job_type
+        self.request = request
+        self.priority = priority
+        self.status = "queued"
+        self.submitted = datetime.datetime.now().isoformat(timespec="seconds")
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.events = collections.deque(maxlen=MAX_JOB_EVENTS)
+        self.next_seq = 0
+        self.condition = threading.Condition()
+
+    def _append_event(self, event_type, fields):
+        self.events.append(dict(fields, seq=self.next_seq, type=event_type))
+        self.next_seq += 1
+        self.condition.notify_all()
+
+    def emit(self, event_type, **fields):
+        with self.condition:
+            self._append_event(event_type, fields)
+
+    def start(self):
+        """Zwraca False, jeśli zadanie anulowano, zanim trafiło do wykonania."""
+        with self.condition:
+            if self.status != "queued":
+                return False
+            self.status = "running"
+            self.started = datetime.datetime.now().isoformat(timespec="seconds")
+            self._append_event("status", {"status": self.status})
+            return True
+
+    def cancel(self):
+        # Sprawdzenie stanu i zmiana pod tą samą blokadą co start() - zadanie anulowane w kolejce już nie wystartuje
+        with self.condition:
+            self.cancel_event.set()
+            if self.status == "queued":
+                self.finish("cancelled")
+
+    def finish(self, status, result=None, error=None):
+        with self.condition:
+            if self.status in FINISHED_STATUSES:
+                return
+            self.status, self.result, self.error = status, result, error
+            self.finished = datetime.datetime.now().isoformat(timespec="seconds")
+            self._append_event("status", {"status": status, "error": error})
+
+    def events_after(self, seq, timeout):
+        """Zwraca (zdarzenia od numeru seq, czy zadanie jest zakończone); czeka najwyżej timeout s na nowe."""
+        with self.condition:
+            if self.next_seq <= seq and self.status not in FINISHED_STATUSES:
+                self.condition.wait(timeout)
+            return [event for event in self.events if event["seq"] >= seq], self.status in FINISHED_STATUSES
+
+    def to_dict(self):
+        return {"id": self.id, "type": self.type, "status": self.status, "priority": self.priority,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished,
+                "result": self.result, "error": self.error, "events": self.next_seq}
+
+
+# Wątki obsługi HTTP i poprawek - ich komunikaty trafiają tylko na konsolę, a nie do logu trwającej analizy
+_untracked_threads = threading.local()
+
+
+def _mark_thread_untracked():
+    _untracked_threads.active = True
+
+
+class JobOutput:
+    """
+    Zastępuje sys.stdout: tekst trafia na konsolę i jako zdarzenia "log" do trwającej analizy
+    (komunikaty skryptu analizy, także z wątków jej potoku, i strumieniowane odpowiedzi modelu).
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.job = None
+
+    def write(self, text):
+        self.stream.write(text)
+        job = self.job
+        if job is not None and text and not getattr(_untracked_threads, "active", False):
+            job.emit("log", text=text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def load_analysis_module():
+    spec = importlib.util.spec_from_file_location("analysis_summary", os.path.join(SCRIPT_FOLDER, "analysis-summary.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class JobService:
+    def __init__(self, analysis):
+        self.analysis = analysis
+        self.scheduler = backend_scheduler.BackendScheduler(analysis.OLLAMA_BACKENDS,
+                                                            analysis.MAX_IN_FLIGHT_PER_BACKEND)
+        analysis.ollama_scheduler = self.scheduler  # Części analiz czekają na serwery w tej samej kolejce
+        self.jobs = collections.OrderedDict()
+        self.jobs_lock = threading.Lock()
+        self.analysis_jobs = queue.Queue()
+        # Pula wątków poprawek ograniczona do liczby miejsc na serwerach - więcej i tak nie generuje naraz
+        self.correction_pool = ThreadPoolExecutor(max_workers=self.scheduler.capacity,
+                                                  initializer=_mark_thread_untracked)
+        self.output = JobOutput(sys.stdout)
+        sys.stdout = self.output
+        threading.Thread(target=self._run_analysis_jobs, name="job-service-analysis", daemon=True).start()
+
+    # --- Przyjmowanie zadań ---
+    def submit(self, request):
+        job_type = request.get("type")
+        if job_type == "correction":
+            paragraphs = request.get("paragraphs")
+            if not isinstance(request.get("prompt"), str) or not isinstance(paragraphs, list) \
+                    or not all(isinstance(paragraph, str) for paragraph in paragraphs):
+                raise ValueError("Zadanie 'correction' wymaga pól 'prompt' (tekst) i 'paragraphs' (lista tekstów).")
+            if not isinstance(request.get("model", ""), str):
+                raise ValueError("Pole 'model' zadania 'correction' musi być tekstem.")
+            job = Job(job_type, request, backend_scheduler.INTERACTIVE_PRIORITY)
+        elif job_type == "analysis":
+            if request.get("path") and not os.path.isfile(request["path"]):
+                raise ValueError(f"Plik '{request['path']}' nie istnieje.")
+            if not request.get("path"):
+                self.analysis.parse_page_range_arguments(request.get("pages"))  # Błędny format - od razu ValueError
+            job = Job(job_type, request, backend_scheduler.BATCH_PRIORITY)
+        else:
+            raise ValueError(f"Nieznany typ zadania '{job_type}' (dostępne: analysis, correction).")
+
+        with self.jobs_lock:
+            self.jobs[job.id] = job
+            finished = [job_id for job_id, old_job in self.jobs.items() if old_job.status in FINISHED_STATUSES]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job_id]
+        if job_type == "correction":
+            self.correction_pool.submit(self._run_job, job, self._run_correction)
+        else:
+            self.analysis_jobs.put(job)
+        print(f"INFO: Usługa zadań: przyjęto zadanie {job.id} ({job_type}).")
+        return job
+
+    def get(self, job_id):
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.jobs_lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def cancel(self, job):
+        """
+        Anuluje zadanie w kolejce albo trwające. Trwająca analiza przerywa się przy najbliższym fragmencie
+        odpowiedzi lub przed następnym zapytaniem (analysis.check_cancelled).
+        """
+        job.cancel()
+        return True
+
+    def status(self):
+        with self.jobs_lock:
+            counts = collections.Counter(job.status for job in self.jobs.values())
+        return {"status": "ok", "backends": self.scheduler.status(), "jobs": dict(counts)}
+
+    # --- Wykonanie zadań ---
+    def _run_job(self, job, runner):
+        if not job.start():
+            return
+        try:
+            result = runner(job)
+        except (JobCancelled, self.analysis.AnalysisCancelled):
+            job.finish("cancelled")
+        except Exception as e:
+            print(f"BŁĄD: Zadanie {job.id} ({job.type}) nie powiodło się: {e}")
+            job.finish("failed", error=str(e))
+        else:
+            job.finish("done", result)
+
+    def _run_analysis_jobs(self):
+        while True:
+            job = self.analysis_jobs.get()
+            self.output.job = job
+            try:
+                self._run_job(job, self._run_analysis)
+            finally:
+                self.output.job = None
+
+    def _run_analysis(self, job):
+        analysis = self.analysis
+        analysis.cancel_event = job.cancel_event  # Analizy działają po kolei - jedno zdarzenie naraz
+        try:
+            return self._run_analysis_job(job)
+        finally:
+            analysis.cancel_event = threading.Event()
+
+    def _run_analysis_job(self, job):
+        analysis = self.analysis
+        # Znacznik czasu w promptach analizy odpowiada chwili uruchomienia zadania, a nie startu usługi
+        analysis.now = datetime.datetime.now()
+        analysis.full_timestamp = analysis.now.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+        pdf_path = job.request.get("path")
+        if not pdf_path:
+            page_ranges = analysis.parse_page_range_arguments(job.request.get("pages"))
+            return {"new_files": analysis.process_all_pdfs_with_bielik(run_id=job.request.get("run_id"),
+                                                                       page_ranges=page_ranges)}
+
+        file_name = os.path.basename(pdf_path)
+        analysis.ensure_output_folders()
+        analysis.reset_backend_settings()
+        analysis.call_metrics_log = call_metrics.CallMetricsLog(analysis.CALL_METRICS_FOLDER, f"job_{job.id}")
+        analysis.call_metrics_log.current_file = file_name
+        start_page, end_page = analysis.resolve_page_range(file_name, analysis.get_pdf_page_count(pdf_path),
+                                                           [(file_name, job.request.get("pages", "all"))])
+        output_path = analysis.analysis_output_path(file_name)
+        pages = analysis.iter_selected_pages_from_pdf(pdf_path, start_page, end_page)
+        try:
+            analysis_text, analysis_ok = analysis.analyze_text_with_bielik(analysis.iter_joined_pages(pages),
+                                                                           output_path=output_path)
+        finally:
+            analysis.evict_caches()
+        return {"output": output_path, "analysis": analysis_text, "ok": analysis_ok}
+
+    def _run_correction(self, job):
+        corrected = []
+        for index, paragraph in enumerate(job.request["paragraphs"]):
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            try:
+                corrected.append(self._correct_paragraph(job, index, paragraph.strip()))
+            except JobCancelled:
+                raise
+            except Exception as e:
+                job.emit("paragraph", index=index, text=None, error=str(e))
+                corrected.append(None)
+        return {"paragraphs": corrected}
+
+    def _correct_paragraph(self, job, index, paragraph):
+        analysis = self.analysis
+        model = job.request.get("model") or analysis.MODEL_NAME
+        prompt = job.request["prompt"]
+        paragraph_tokens = text_chunker.count_tokens(paragraph)
+
+        def on_token(token):
+            if job.cancel_event.is_set():
+                raise JobCancelled()  # Przerywa odczyt strumienia i zamyka połączenie z Ollamą
+            job.emit("token", index=index, text=token)
+
+        with self.scheduler.slot(job.priority) as (host, port):
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            # Załadowany kontekst i keep_alive są ustalane raz na serwer, a nie przy każdym akapicie
+            settings = analysis.get_backend_settings(host, port, model)
+            options = generation_options.options_for(
+                "correction", text_chunker.count_tokens(prompt) + paragraph_tokens, input_tokens=paragraph_tokens,
+                max_context=analysis.MODEL_CONTEXT_TOKENS, loaded_context=settings["loaded_context"])
+            settings["loaded_context"] = options["num_ctx"]
+            client = ollama_client.get_client(host, port, analysis.OLLAMA_REQUEST_TIMEOUT)
+            response = client.chat(model, [{'role': 'user', 'content': prompt + paragraph}], stream=True,
+                                   on_token=on_token, options=options, keep_alive=settings["keep_alive"])
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} - {response.raw}")
+        if (response.data or {}).get("done_reason") == "length":
+            raise RuntimeError(f"num_predict limit reached ({options['num_predict']} tokens)")
+        corrected_text = (response.content or "").strip()
+        job.emit("paragraph", index=index, text=corrected_text)
+        return corrected_text
+
+
+# --- Serwer HTTP ---
+class JobServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None  # JobService ustawiany w make_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        _mark_thread_untracked()
+        super().handle()
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        job = self.service.get(parts[1]) if len(parts) >= 2 and parts[0] == "jobs" else None
+        return url, parts, job
+
+    def do_GET(self):
+        url, parts, job = self._route()
+        if parts == ["health"]:
+            self._send_json(self.service.status())
+        elif parts == ["jobs"]:
+            self._send_json({"jobs": self.service.list_jobs()})
+        elif job is None:
+            self._send_json({"error": "not found"}, 404)
+        elif len(parts) == 2:
+            self._send_json(job.to_dict())
+        elif len(parts) == 3 and parts[2] == "events":
+            try:
+                from_seq = int(urllib.parse.parse_qs(url.query).get("from", ["0"])[0])
+            except ValueError:
+                self._send_json({"error": "Parametr 'from' musi być liczbą całkowitą."}, 400)
+                return
+            self._stream_events(job, from_seq)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        _, parts, _ = self._route()
+        if parts != ["jobs"]:
+            self._send_json({"error": "not found"}, 404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("Treść zadania musi być obiektem JSON.")
+            job = self.service.submit(request)
+        except ValueError as e:
+            self._send_json({"error": str(e)}, 400)
+            return
+        self._send_json(job.to_dict(), 202)
+
+    def do_DELETE(self):
+        _, parts, job = self._route()
+        if job is None or len(parts) != 2:
+            self._send_json({"error": "not found"}, 404)
+        else:
+            self.service.cancel(job)
+            self._send_json(job.to_dict())
+
+    def _stream_events(self, job, from_seq):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        seq = from_seq
+        try:
+            while True:
+                events, finished = job.events_after(seq, EVENT_WAIT_SECONDS)
+                lines = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events) or "\n"
+                data = lines.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                if events:
+                    seq = events[-1]["seq"] + 1
+                if finished:
+                    break
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Klient rozłączył się - zadanie trwa dalej
+
+
+def make_server(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    handler = type("ConfiguredJobServiceHandler", (JobServiceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# --- Klient usługi (np. makro korektora) ---
+def _request_json(host, port, method, path, payload=None, timeout=SERVICE_CHECK_TIMEOUT):
+    # Bez ponowień klienta Ollamy - niedziałająca usługa ma być wykryta od razu
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        body = json.dumps(payload) if payload is not None else None
+        conn.request(method, path, body=body, headers={'Content-Type': 'application/json'} if body else {})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8") or "null")
+    finally:
+        conn.close()
+
+
+def service_available(host=SERVICE_HOST, port=SERVICE_PORT):
+    try:
+        status, _ = _request_json(host, port, "GET", "/health")
+    except (OSError, ValueError):
+        return False
+    return status == 200
+
+
+def submit_job(host, port, request):
+    status, data = _request_json(host, port, "POST", "/jobs", request, timeout=30)
+    if status != 202:
+        raise RuntimeError(f"Usługa zadań odrzuciła zadanie (HTTP {status}): {(data or {}).get('error')}")
+    return data
+
+
+def cancel_job(host, port, job_id):
+    return _request_json(host, port, "DELETE", f"/jobs/{job_id}", timeout=30)
+
+
+def iter_job_events(host, port, job_id, from_seq=0, timeout=ollama_client.REQUEST_TIMEOUT):
+    """Zdarzenia zadania (słowniki) od numeru from_seq do końca zadania."""
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("GET", f"/jobs/{job_id}/events?from={from_seq}")
+        response = conn.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"Usługa zadań: HTTP {response.status} dla zdarzeń zadania {job_id}")
+        for raw_line in response:
+            line = raw_line.strip()
+            if line:
+                yield json.loads(line.decode("utf-8"))
+    finally:
+        conn.close()
+
+
+def correct_paragraph(host, port, prompt, paragraph, on_token=None, model=None):
+    """
+    Poprawia jeden akapit przez usługę (priorytet interaktywny) i zwraca poprawiony tekst.
+    model - model Ollamy wywołującego (np. MODEL_NAME makra); None - model skryptu analizy w usłudze.
+    Wyjątek zgłoszony przez on_token (np. przerwanie przez użytkownika) anuluje zadanie w usłudze.
+    """
+    request = {"type": "correction", "prompt": prompt, "paragraphs": [paragraph]}
+    if model:
+        request["model"] = model
+    job = submit_job(host, port, request)
+    corrected_text, error = None, None
+    try:
+        for event in iter_job_events(host, port, job["id"]):
+            if event["type"] == "token" and on_token:
+                on_token(event["text"])
+            elif event["type"] == "paragraph":
+                corrected_text, error = event.get("text"), event.get("error")
+            elif event["type"] == "status" and event["status"] in ("failed", "cancelled"):
+                error = error or event.get("error") or event["status"]
+    except BaseException:
+        try:
+            cancel_job(host, port, job["id"])
+        except OSError:
+            pass
+        raise
+    if error:
+        raise RuntimeError(error)
+    return corrected_text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokalna usługa zadań BIELIKA: analizy PDF i poprawki akapitów "
+                                                 "w jednej kolejce priorytetowej przed serwerami Ollama.")
+    parser.add_argument("--host", default=SERVICE_HOST, help="Adres nasłuchiwania (domyślnie tylko lokalnie)")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="Port usługi")
+    args = parser.parse_args()
+
+    job_service = JobService(load_analysis_module())
+    server = make_server(job_service, args.host, args.port)
+    print(f"Usługa zadań BIELIKA działa na http://{args.host}:{args.port} "
+          f"(miejsca na serwerach Ollama: {job_service.scheduler.capacity}). Zatrzymanie: Ctrl+C.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Zatrzymano usługę zadań.")
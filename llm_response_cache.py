@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+
+import pdf_text_cache
+
+# --- Konfiguracja cache odpowiedzi BIELIKA (Ollama /api/chat) ---
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CACHE_LLM_RESPONSES")
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # Maksymalny rozmiar cache odpowiedzi na dysku (256 MB)
+MODFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Modfile-q4km.txt")
+
+# Znacznik wstawiany w miejsce wartości zmiennych (np. full_timestamp) w kluczu i w zapisanej odpowiedzi
+VOLATILE_PLACEHOLDER = "\u0000VOLATILE_{}\u0000"
+
+
+# --- Parametry modelu z Modfile (FROM, TEMPLATE, PARAMETER) jako część klucza ---
+def modfile_fingerprint(modfile_path=None):
+    try:
+        with open(modfile_path or MODFILE_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _mask(text, volatile_values):
+    for i, value in enumerate(volatile_values):
+        if value:
+            text = text.replace(value, VOLATILE_PLACEHOLDER.format(i))
+    return text
+
+
+def _unmask(text, volatile_values):
+    for i, value in enumerate(volatile_values):
+        text = text.replace(VOLATILE_PLACEHOLDER.format(i), value)
+    return text
+
+
+# --- Klucz cache: skrót modelu, parametrów Modfile, opcji i pełnej listy wiadomości ---
+def make_key(model_name, messages, options=None, volatile_values=(), modfile_path=None):
+    """
+    Wartości z volatile_values (np. znacznik czasu uruchomienia wklejony w prompt) są zastępowane
+    znacznikiem, więc nie zmieniają klucza między kolejnymi uruchomieniami.
+    """
+    normalized_messages = [
+        {"role": message["role"], "content": _mask(message["content"], volatile_values)}
+        for message in messages
+    ]
+    key_material = json.dumps({
+        "model": model_name,
+        "modfile": modfile_fingerprint(modfile_path),
+        "options": options or {},
+        "messages": normalized_messages,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key, cache_folder):
+    return os.path.join(cache_folder or CACHE_FOLDER, key[:2], f"{key}.json")
+
+
+# --- Odczyt odpowiedzi z cache (None, jeśli brak) ---
+def get(key, volatile_values=(), cache_folder=None):
+    entry_path = _entry_path(key, cache_folder)
+    try:
+        with open(entry_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(entry_path)  # Odświeżenie czasu użycia dla usuwania najdawniej używanych wpisów (LRU)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"OSTRZEŻENIE: Uszkodzony wpis cache odpowiedzi BIELIKA '{entry_path}' zostanie pominięty: {e}")
+        return None
+    # Znacznik czasu z poprzedniego uruchomienia w odpowiedzi zastępujemy bieżącym
+    return _unmask(entry["response"], volatile_values)
+
+
+# --- Zapis odpowiedzi do cache (limit rozmiaru pilnuje evict() wywoływane raz na przebieg) ---
+def put(key, response_text, volatile_values=(), cache_folder=None):
+    try:
+        pdf_text_cache.save_json_atomic(_entry_path(key, cache_folder),
+                                        {"response": _mask(response_text, volatile_values)})
+    except OSError as e:
+        print(f"OSTRZEŻENIE: Nie można zapisać odpowiedzi BIELIKA do cache: {e}")
+
+
+# --- Usuwanie najdawniej używanych odpowiedzi po przekroczeniu limitu rozmiaru ---
+def evict(cache_folder=None, max_bytes=None):
+    return pdf_text_cache.evict_to_size(cache_folder or CACHE_FOLDER, CACHE_MAX_BYTES if max_bytes is None else max_bytes)
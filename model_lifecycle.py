@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import threading
+
+import ollama_client
+
+# --- Cykl życia modelu w Ollamie: wstępne ładowanie, przypięcie na czas przebiegu wsadowego, zwolnienie ---
+# Każde zapytanie do Ollamy ustawia na nowo czas, przez jaki model zostaje w pamięci (keep_alive). Skrypty i makro
+# korektora pobierają keep_alive z keep_alive_for(), więc nie skracają przypięcia ustawionego przez trwający przebieg.
+DEFAULT_KEEP_ALIVE = "30m"  # Poza przebiegiem wsadowym: model zostaje w pamięci 30 minut od ostatniego zapytania
+PINNED_KEEP_ALIVE = -1  # W trakcie przebiegu: model nie jest zwalniany mimo długich przerw (np. ekstrakcji, pytań)
+WARM_UP_TIMEOUT = 900  # Ładowanie dużego pliku GGUF (np. z karty SD) może trwać kilka minut
+# Wspólny rejestr przypięć procesów działających na tej maszynie (skrypty wsadowe, makro LibreOffice)
+PIN_STATE_PATH = os.path.join(os.path.expanduser("~"), ".bielik_model_pins.json")
+NS_PER_SECOND = 1_000_000_000
+
+_pin_state_lock = threading.Lock()
+
+
+def _model_key(host, port, model):
+    return f"{host}:{port}/{model}"
+
+
+def _same_model(name, model):
+    # Ollama zwraca nazwy z tagiem, np. "bielik-4.5b-q4km-final:latest"
+    return name == model or (":" not in model and name == f"{model}:latest")
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Proces istnieje, ale należy do innego użytkownika
+    return True
+
+
+# --- Rejestr przypięć: {model_key: [pid, ...]} - wpisy zakończonych procesów są pomijane ---
+def _load_pins():
+    try:
+        with open(PIN_STATE_PATH, "r", encoding="utf-8") as f:
+            pins = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {key: [pid for pid in pids if _process_alive(pid)] for key, pids in pins.items()}
+
+
+def _save_pins(pins):
+    tmp_path = f"{PIN_STATE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({key: pids for key, pids in pins.items() if pids}, f)
+        os.replace(tmp_path, PIN_STATE_PATH)
+    except OSError as e:
+        print(f"OSTRZEŻENIE: Nie można zapisać rejestru przypięć modelu '{PIN_STATE_PATH}': {e}")
+
+
+def keep_alive_for(host, port, model, default=DEFAULT_KEEP_ALIVE):
+    """
+    keep_alive do wysłania z zapytaniem: PINNED_KEEP_ALIVE, gdy model jest przypięty przez trwający przebieg
+    (w tym lub innym procesie), w przeciwnym razie default.
+    """
+    if _load_pins().get(_model_key(host, port, model)):
+        return PINNED_KEEP_ALIVE
+    return default
+
+
+class ModelLifecycle:
+    """
+    Model na jednym serwerze Ollama: sprawdzenie, czy jest w pamięci (/api/ps), wstępne załadowanie
+    (/api/generate bez promptu), przypięcie na czas przebiegu i zwolnienie po nim.
+    """
+
+    def __init__(self, host, port, model, default_keep_alive=DEFAULT_KEEP_ALIVE, options=None):
+        self.host = host
+        self.port = port
+        self.model = model
+        self.default_keep_alive = default_keep_alive
+        self.options = options or {}  # Opcje ładowania (np. num_ctx z generation_options) - ich zmiana przeładowuje model
+        self.client = ollama_client.get_client(host, port, WARM_UP_TIMEOUT)
+        self.pinned = False
+        self.loaded_by_us = False  # Model załadowany przez ten przebieg (a nie już obecny w pamięci)
+        self.load_seconds = 0.0
+        self.warm_up_data = None
+
+    def __str__(self):
+        return f"'{self.model}' na {self.host}:{self.port}"
+
+    def loaded_entry(self):
+        """Wpis modelu z /api/ps (m.in. context_length) albo None, jeśli model nie jest w pamięci."""
+        status, data, _ = self.client.request_json("GET", "/api/ps", timeout=30)
+        if status != 200 or not data:
+            return None
+        for entry in data.get("models", []):
+            if _same_model(entry.get("name") or entry.get("model", ""), self.model):
+                return entry
+        return None
+
+    def is_loaded(self):
+        return self.loaded_entry() is not None
+
+    def _set_keep_alive(self, keep_alive, options=None):
+        # Puste zapytanie /api/generate ładuje model (jeśli trzeba) i ustawia jego keep_alive; 0 - zwolnienie
+        payload = {"model": self.model, "keep_alive": keep_alive, "stream": False}
+        if options:
+            payload["options"] = options
+        return self.client.request_json("POST", "/api/generate", payload)
+
+    def _options_keeping_context(self, entry):
+        # Model w pamięci z wystarczającym kontekstem nie jest przeładowywany z powodu innego num_ctx
+        loaded_context = (entry or {}).get("context_length")
+        if loaded_context and loaded_context >= self.options.get("num_ctx", 0):
+            return dict(self.options, num_ctx=loaded_context)
+        return self.options
+
+    def warm_up(self, keep_alive=None):
+        """
+        Ładuje model do pamięci i zwraca (czy był już załadowany, czas ładowania w s, odpowiedź Ollamy).
+        Czas ładowania to load_duration z odpowiedzi, a jeśli go brak - czas oczekiwania na załadowanie.
+        """
+        entry = self.loaded_entry()
+        was_loaded = entry is not None
+        start = time.monotonic()
+        status, data, raw = self._set_keep_alive(self.default_keep_alive if keep_alive is None else keep_alive,
+                                                 self._options_keeping_context(entry))
+        wall_seconds = time.monotonic() - start
+        if status != 200:
+            raise RuntimeError(f"Ollama nie załadowała modelu {self} (HTTP {status}): {raw[:200]}")
+        data = data or {}
+        if "load_duration" in data:
+            self.load_seconds = data["load_duration"] / NS_PER_SECOND
+        else:
+            self.load_seconds = 0.0 if was_loaded else wall_seconds
+        self.loaded_by_us = self.loaded_by_us or not was_loaded
+        self.warm_up_data = dict(data, load_duration=int(self.load_seconds * NS_PER_SECOND))
+        return was_loaded, self.load_seconds, self.warm_up_data
+
+    # --- Przypięcie na czas przebiegu wsadowego ---
+    def pin(self):
+        with _pin_state_lock:
+            pins = _load_pins()
+            pids = pins.setdefault(_model_key(self.host, self.port, self.model), [])
+            if os.getpid() not in pids:
+                pids.append(os.getpid())
+            _save_pins(pins)
+        self.pinned = True
+        return self.warm_up(PINNED_KEEP_ALIVE)
+
+    def release(self):
+        """
+        Zdejmuje przypięcie. Model załadowany przez ten przebieg jest zwalniany z pamięci (keep_alive 0), chyba że
+        przypiął go też inny proces; model, który był w pamięci już wcześniej, wraca do domyślnego keep_alive.
+        Zwraca opis wykonanej akcji.
+        """
+        if not self.pinned:
+            return "bez zmian"
+        with _pin_state_lock:
+            pins = _load_pins()
+            key = _model_key(self.host, self.port, self.model)
+            pins[key] = [pid for pid in pins.get(key, []) if pid != os.getpid()]
+            _save_pins(pins)
+        self.pinned = False
+        if pins[key]:
+            return f"model pozostaje przypięty przez inne procesy (PID: {', '.join(map(str, pins[key]))})"
+        if self.loaded_by_us:
+            self._set_keep_alive(0)
+            return "model zwolniony z pamięci"
+        self._set_keep_alive(self.default_keep_alive, self._options_keeping_context(self.loaded_entry()))
+        return f"model był w pamięci przed przebiegiem - przywrócono keep_alive {self.default_keep_alive}"
+
+
+def loaded_context_length(host, port, model):
+    """
+    num_ctx, z jakim model jest załadowany na serwerze (None, jeśli nie jest w pamięci lub Ollama go nie podaje).
+    """
+    try:
+        entry = ModelLifecycle(host, port, model).loaded_entry()
+    except Exception:
+        return None
+    return (entry or {}).get("context_length")
+
+
+def warm_up_in_background(host, port, model, default_keep_alive=DEFAULT_KEEP_ALIVE, options=None):
+    """
+    Rozpoczyna ładowanie modelu w wątku tła (np. gdy makro dopiero przygotowuje tekst) i zwraca wątek.
+    Zachowuje przypięcie trwającego przebiegu wsadowego.
+    """
+
+    def warm_up():
+        try:
+            lifecycle = ModelLifecycle(host, port, model, default_keep_alive, options)
+            was_loaded, load_seconds, _ = lifecycle.warm_up(keep_alive_for(host, port, model, default_keep_alive))
+            if not was_loaded:
+                print(f"INFO: Model {lifecycle} załadowany w {load_seconds:.1f} s.")
+        except Exception as e:
+            print(f"OSTRZEŻENIE: Wstępne ładowanie modelu '{model}' na {host}:{port} nie powiodło się: {e}")
+
+    thread = threading.Thread(target=warm_up, name="bielik-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,140 @@
+import re
+import array
+import random
+import hashlib
+import threading
+import collections
+
+# --- Wykrywanie powtórzonych stron i części tekstu (MinHash + LSH) ---
+# Pisma sądowe i komornicze powtarzają nagłówki, pouczenia i cytowane wcześniejsze pisma. Tekst jest zamieniany
+# na zbiór "gontów" (SHINGLE_WORDS kolejnych słów), a z niego na sygnaturę MinHash - odsetek zgodnych pozycji dwóch
+# sygnatur przybliża podobieństwo Jaccarda ich zbiorów gontów. Kandydaci są wyszukiwani przez LSH (sygnatura
+# pocięta na LSH_BANDS pasm), więc nowy tekst nie jest porównywany z każdym wcześniejszym.
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 pasm po 4 pozycje: tekst o podobieństwie 0,9 trafia do kandydatów niemal na pewno
+MIN_WORDS = 40  # Krótsze teksty (np. strona z samym numerem) nie są deduplikowane
+SIMILARITY_THRESHOLD = 0.9
+NEAR_DUPLICATE_MAX_SIMILARITY = 1 - 1 / NUM_PERMUTATIONS  # Szacunek dla tekstu, który nie jest kopią dokładną
+MINHASH_SEED = 20240601  # Stałe ziarno - sygnatury są porównywalne między uruchomieniami
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_random = random.Random(MINHASH_SEED)
+_PERMUTATIONS = [(_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+_WORD_PATTERN = re.compile(r"\w+")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def _words(text):
+    # Wielkość liter, interpunkcja i podział na wiersze nie wpływają na porównanie
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def _shingle_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def signature(text):
+    """
+    Zwraca (klucz dokładny, sygnatura MinHash) tekstu albo None dla tekstu krótszego niż MIN_WORDS słów.
+    Klucz dokładny to skrót znormalizowanych słów - identyczny dla kopii różniących się tylko formatowaniem.
+    """
+    words = _words(text)
+    if len(words) < MIN_WORDS:
+        return None
+    exact_key = hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+    shingles = {_shingle_hash(" ".join(words[i:i + SHINGLE_WORDS]))
+                for i in range(len(words) - SHINGLE_WORDS + 1)}
+    minhash = array.array("Q", (min(((a * shingle + b) % _MERSENNE_PRIME) & _MAX_HASH for shingle in shingles)
+                                for a, b in _PERMUTATIONS))
+    return exact_key, minhash
+
+
+def sentences(text):
+    """Zdania i wiersze tekstu (do porównania podobnych stron zdanie po zdaniu)."""
+    return [sentence.strip() for sentence in _SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+
+def sentence_key(sentence):
+    # Jak klucz dokładny - wielkość liter i interpunkcja nie odróżniają zdań
+    return " ".join(_words(sentence))
+
+
+def similarity(minhash_a, minhash_b):
+    """Szacowane podobieństwo Jaccarda dwóch tekstów (odsetek zgodnych pozycji sygnatur)."""
+    return sum(1 for a, b in zip(minhash_a, minhash_b) if a == b) / NUM_PERMUTATIONS
+
+
+def _bands(minhash):
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    return [(band, minhash[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+
+
+class DuplicateIndex:
+    """
+    Indeks tekstów już przeanalizowanych w przebiegu. Każdy wpis ma odwołanie (np. (plik, strona)) do miejsca,
+    w którym tekst przeanalizowano; w pamięci zostają tylko sygnatury i odwołania, bez samych tekstów.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.exact = {}  # klucz dokładny -> numer wpisu
+        self.buckets = collections.defaultdict(list)  # (pasmo, wartości pasma) -> numery wpisów
+        self.minhashes = []
+        self.references = []
+        self.saved = {"items": 0, "exact": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def find(self, text, accept=None):
+        """
+        Zwraca (dopasowanie, sygnatura). Dopasowanie to (odwołanie, podobieństwo) najbardziej podobnego wpisu
+        o podobieństwie co najmniej threshold albo None. Podobieństwo 1.0 oznacza tylko kopię dokładną - tekst
+        różniący się choćby jednym słowem ma szacunek najwyżej NEAR_DUPLICATE_MAX_SIMILARITY.
+        accept(odwołanie, podobieństwo) - opcjonalny warunek dla wpisów (np. inne pliki tylko przy kopii dokładnej).
+        Sygnaturę przekazuje się do add(), jeśli tekst zostanie przeanalizowany.
+        """
+        text_signature = signature(text)
+        if text_signature is None:
+            return None, None
+        exact_key, minhash = text_signature
+        with self.lock:
+            if exact_key in self.exact:
+                reference = self.references[self.exact[exact_key]]
+                if accept is None or accept(reference, 1.0):
+                    return (reference, 1.0), text_signature
+            candidates = {item for band in _bands(minhash) for item in self.buckets.get(band, ())}
+            best_item, best_similarity = None, 0.0
+            for item in candidates:
+                # Zgodne wszystkie pozycje sygnatury nie dowodzą identyczności - klucz dokładny jest inny
+                item_similarity = min(similarity(minhash, self.minhashes[item]), NEAR_DUPLICATE_MAX_SIMILARITY)
+                if accept is not None and not accept(self.references[item], item_similarity):
+                    continue
+                if item_similarity > best_similarity:
+                    best_item, best_similarity = item, item_similarity
+            if best_item is not None and best_similarity >= self.threshold:
+                return (self.references[best_item], best_similarity), text_signature
+        return None, text_signature
+
+    def add(self, text_signature, reference):
+        if text_signature is None:
+            return
+        exact_key, minhash = text_signature
+        with self.lock:
+            if exact_key in self.exact:
+                return
+            item = len(self.references)
+            self.exact[exact_key] = item
+            self.minhashes.append(minhash)
+            self.references.append(reference)
+            for band in _bands(minhash):
+                self.buckets[band].append(item)
+
+    def mark_saved(self, similarity_value, input_tokens, output_tokens=0):
+        """Zlicza tekst pominięty w analizie: tokeny niewysłane do modelu i odpowiedzi niegenerowane ponownie."""
+        with self.lock:
+            self.saved["items"] += 1
+            self.saved["exact"] += similarity_value == 1.0
+            self.saved["input_tokens"] += input_tokens
+            self.saved["output_tokens"] += output_tokens
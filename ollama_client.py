@@ -0,0 +1,212 @@
+import json
+import time
+import queue
+import threading
+import http.client
+import collections
+
+# --- Konfiguracja wspólnego klienta HTTP dla API Ollama ---
+REQUEST_TIMEOUT = 1800  # Limit czasu (s) na każdą operację sieciową zapytania - zamiast timeout=None
+MAX_RETRIES = 3  # Liczba ponowień po zerwanym połączeniu lub błędzie 5xx
+BACKOFF_BASE_SECONDS = 2.0  # Opóźnienie przed kolejnymi ponowieniami: 2 s, 4 s, 8 s...
+POOL_SIZE = 4  # Maks. liczba bezczynnych połączeń keep-alive trzymanych dla jednego serwera
+
+RETRYABLE_STATUSES = (500, 502, 503, 504)
+RETRYABLE_ERRORS = (http.client.RemoteDisconnected, http.client.IncompleteRead, ConnectionError, BrokenPipeError)
+
+# Odpowiedź /api/chat: status HTTP, treść odpowiedzi modelu (None, gdy brak 'message.content'),
+# sparsowany JSON (w trybie strumieniowym - ostatni obiekt z licznikami Ollama) i surowa treść odpowiedzi
+ChatResponse = collections.namedtuple("ChatResponse", ["status", "content", "data", "raw"])
+
+
+class PartialResponseError(Exception):
+    """Strumień zerwany po przekazaniu części odpowiedzi - nie jest ponawiany, aby nie zdublować tekstu."""
+
+
+# --- Odczyt strumieniowej odpowiedzi Ollama /api/chat (NDJSON - jeden obiekt JSON w każdej linii) ---
+def read_chat_stream(response, on_token=None):
+    """
+    Czyta odpowiedź z "stream": true linia po linii i przekazuje każdy fragment treści do on_token(tekst).
+    Zwraca (pełna_treść, ostatni_obiekt_odpowiedzi) - ostatni obiekt ("done": true) zawiera liczniki Ollama.
+    Błąd zgłoszony przez serwer w trakcie generowania ({"error": ...}) podnosi RuntimeError, a strumień zakończony
+    bez obiektu "done" (serwer zamknął połączenie) - http.client.IncompleteRead.
+    """
+    content_parts = []
+    final_message = {}
+    for raw_line in response:
+        line = raw_line.strip()
+        if not line:
+            continue
+        message = json.loads(line.decode('utf-8'))
+        if 'error' in message:
+            raise RuntimeError(f"Ollama przerwała generowanie: {message['error']}")
+        token = message.get('message', {}).get('content', "")
+        if token:
+            content_parts.append(token)
+            if on_token:
+                on_token(token)
+        if message.get('done'):
+            final_message = message
+            break
+    if not final_message:
+        # http.client kończy odczyt linii bez błędu, gdy połączenie zamknięto przed końcem treści
+        raise http.client.IncompleteRead(b"".join(part.encode("utf-8") for part in content_parts))
+    return "".join(content_parts), final_message
+
+
+class OllamaClient:
+    """
+    Klient jednego serwera Ollama z pulą połączeń keep-alive, limitem czasu na zapytanie
+    i ponawianiem z wykładniczym opóźnieniem. Bezpieczny dla wielu wątków.
+    """
+
+    def __init__(self, host, port, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, pool_size=POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.idle_connections = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        try:
+            return self.idle_connections.get_nowait(), True
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def _release(self, conn):
+        try:
+            self.idle_connections.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _send(self, method, path, body, timeout):
+        """
+        Wysyła zapytanie i zwraca (połączenie, odpowiedź). Połączenie z puli, które serwer zdążył zamknąć,
+        jest od razu zastępowane nowym - bez liczenia tego jako ponowienia.
+        """
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        conn, reused = self._acquire()
+        try:
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            conn.request(method, path, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except RETRYABLE_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout or self.timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def _with_retries(self, attempt_request, description):
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = attempt_request()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason = f"{type(e).__name__}: {e}"
+            else:
+                if result[0] not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    return result
+                reason = f"HTTP {result[0]}"
+            delay = BACKOFF_BASE_SECONDS * (2 ** attempt)
+            print(f"  OSTRZEŻENIE: {description} na {self.host}:{self.port} nie powiodło się ({reason}). "
+                  f"Ponowienie {attempt + 1}/{self.max_retries} za {delay:.0f} s...")
+            time.sleep(delay)
+
+    # --- Zapytanie z odpowiedzią JSON (np. /api/tags, /api/chat bez strumieniowania) ---
+    def request_json(self, method, path, payload=None, timeout=None):
+        """
+        Zwraca (status, sparsowany_json lub None, surowa_treść). Odpowiedź jest czytana w całości,
+        więc połączenie wraca do puli i może być użyte ponownie (keep-alive).
+        """
+        body = json.dumps(payload) if payload is not None else None
+
+        def attempt_request():
+            conn, response = self._send(method, path, body, timeout)
+            try:
+                raw = response.read().decode('utf-8')
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            try:
+                data = json.loads(raw) if raw else None
+            except ValueError:
+                data = None
+            return response.status, data, raw
+
+        return self._with_retries(attempt_request, f"Zapytanie {method} {path}")
+
+    # --- /api/chat (z odpowiedzią jednorazową lub strumieniową) ---
+    def chat(self, model, messages, stream=False, on_token=None, options=None, keep_alive=None, timeout=None):
+        payload = {"model": model, "messages": messages, "stream": stream}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        if not stream:
+            status, data, raw = self.request_json("POST", "/api/chat", payload, timeout)
+            content = None
+            if status == 200 and data and 'message' in data and 'content' in data['message']:
+                content = data['message']['content']
+            return ChatResponse(status, content, data, raw)
+
+        body = json.dumps(payload)
+        tokens_received = []
+
+        def counting_on_token(token):
+            tokens_received.append(token)
+            if on_token:
+                on_token(token)
+
+        def attempt_request():
+            conn, response = self._send("POST", "/api/chat", body, timeout)
+            if response.status != 200:
+                raw = response.read().decode('utf-8')
+                conn.close()
+                return response.status, None, raw
+            try:
+                content, final_message = read_chat_stream(response, counting_on_token)
+                response.read()  # Dokończenie odczytu (pusty koniec strumienia) pozwala użyć połączenia ponownie
+            except RETRYABLE_ERRORS:
+                conn.close()
+                if tokens_received:
+                    raise PartialResponseError(f"Połączenie zerwane po {len(tokens_received)} fragmentach odpowiedzi")
+                raise
+            except BaseException:  # Także przerwanie z on_token - niedoczytany strumień nie wraca do puli
+                conn.close()
+                raise
+            self._release(conn)
+            return 200, content, final_message
+
+        status, content, final_message_or_raw = self._with_retries(attempt_request, "Zapytanie POST /api/chat")
+        if status != 200:
+            return ChatResponse(status, None, None, final_message_or_raw)
+        return ChatResponse(status, content, final_message_or_raw, "")
+
+
+# --- Wspólne instancje klienta: jedna pula połączeń na serwer i limit czasu (host, port, timeout) ---
+# Limit czasu jest częścią klucza - np. ładowanie modelu (WARM_UP_TIMEOUT) i makro korektora (własny
+# REQUEST_TIMEOUT) dostają klienta z własnym limitem, a nie z limitem pierwszego wywołującego.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host, port, timeout=REQUEST_TIMEOUT):
+    with _clients_lock:
+        if (host, port, timeout) not in _clients:
+            _clients[(host, port, timeout)] = OllamaClient(host, port, timeout=timeout)
+        return _clients[(host, port, timeout)]
+
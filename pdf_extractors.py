@@ -0,0 +1,243 @@
+import os
+import re
+import time
+import threading
+
+# Każdy ekstraktor jest opcjonalny - dostępne są te, których pakiety są zainstalowane
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+# --- Konfiguracja wyboru ekstraktora tekstu PDF ---
+BACKEND_ORDER = ["pypdfium2", "pypdf2", "pdfplumber"]  # Kolejność przy liczeniu stron i bez pomiaru (zwykle od najszybszego)
+SAMPLE_PAGES = 3  # Liczba stron próbnych (rozłożonych w dokumencie) przy pomiarze szybkości ekstraktorów
+QUALITY_TOLERANCE = 0.95  # Ekstraktor musi odczytać co najmniej 95% liter i cyfr najlepszego ekstraktora z próby
+
+CONTROL_CHARACTERS_PATTERN = re.compile(r"[\x00-\x08\x0b-\x1f\ufffe]")  # Np. znaczniki dzielenia wyrazów z pdfium
+
+_pdfium_lock = threading.Lock()  # Biblioteka pdfium nie jest bezpieczna wątkowo
+_choices = {}  # (ścieżka, rozmiar, mtime) -> lista ekstraktorów wybrana dla dokumentu w bieżącym procesie
+_choices_lock = threading.Lock()
+
+
+# --- Ekstraktory: otwarcie dokumentu, liczba stron, tekst strony o podanym indeksie ---
+class PdfiumDocument:
+    def __init__(self, pdf_path):
+        with _pdfium_lock:
+            self.pdf = pypdfium2.PdfDocument(pdf_path)
+            self.page_count = len(self.pdf)
+
+    def extract(self, index):
+        with _pdfium_lock:
+            page = self.pdf[index]
+            text_page = page.get_textpage()
+            try:
+                return text_page.get_text_range()
+            finally:
+                text_page.close()
+                page.close()
+
+    def close(self):
+        with _pdfium_lock:
+            self.pdf.close()
+
+
+class PyPDF2Document:
+    def __init__(self, pdf_path):
+        self.file = open(pdf_path, "rb")
+        try:
+            self.reader = PyPDF2.PdfReader(self.file)
+            self.page_count = len(self.reader.pages)
+        except Exception:
+            self.file.close()
+            raise
+
+    def extract(self, index):
+        return self.reader.pages[index].extract_text()
+
+    def close(self):
+        self.file.close()
+
+
+class PdfplumberDocument:
+    def __init__(self, pdf_path):
+        self.pdf = pdfplumber.open(pdf_path)
+        self.page_count = len(self.pdf.pages)
+
+    def extract(self, index):
+        page = self.pdf.pages[index]
+        try:
+            return page.extract_text()
+        finally:
+            page.flush_cache()  # Obiekty strony (znaki, linie) nie są już potrzebne - pamięć nie rośnie z liczbą stron
+
+    def close(self):
+        self.pdf.close()
+
+
+# nazwa -> (klasa dokumentu, czy pakiet jest zainstalowany)
+BACKENDS = {
+    "pypdfium2": (PdfiumDocument, pypdfium2 is not None),
+    "pypdf2": (PyPDF2Document, PyPDF2 is not None),
+    "pdfplumber": (PdfplumberDocument, pdfplumber is not None),
+}
+
+
+def register_backend(name, document_class):
+    """
+    Dodaje własny ekstraktor: document_class(pdf_path) z atrybutem page_count i metodami extract(index), close().
+    """
+    BACKENDS[name] = (document_class, True)
+    if name not in BACKEND_ORDER:
+        BACKEND_ORDER.append(name)
+
+
+def available_backends():
+    return [name for name in BACKEND_ORDER if BACKENDS[name][1]]
+
+
+def open_document(name, pdf_path):
+    document_class, installed = BACKENDS[name]
+    if not installed:
+        raise RuntimeError(f"Ekstraktor '{name}' jest niedostępny (brak pakietu).")
+    return document_class(pdf_path)
+
+
+# --- Wspólna postać tekstu stron, niezależna od ekstraktora ---
+def normalize_page_text(text):
+    text = CONTROL_CHARACTERS_PATTERN.sub("", (text or "").replace("\r\n", "\n").replace("\r", "\n"))
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip("\n")
+
+
+def text_quality(text):
+    # Litery i cyfry, z karą za znaki nieodczytane ("(cid:12)" w pdfplumber, U+FFFD)
+    return sum(c.isalnum() for c in text) - 10 * (text.count("(cid:") + text.count("\ufffd"))
+
+
+# --- Liczba stron (pierwszy ekstraktor, który otworzy plik) ---
+def page_count(pdf_path, backends=None):
+    last_error = None
+    for name in backends or available_backends():
+        try:
+            document = open_document(name, pdf_path)
+        except Exception as e:
+            last_error = e
+            continue
+        try:
+            return document.page_count
+        finally:
+            document.close()
+    raise last_error or RuntimeError("Brak ekstraktora PDF - zainstaluj pypdfium2, PyPDF2 lub pdfplumber.")
+
+
+# --- Wybór ekstraktora dla dokumentu ---
+def choose_backends(pdf_path, preferred="auto"):
+    """
+    Zwraca listę nazw ekstraktorów dla dokumentu: pierwszy wyodrębnia strony, kolejne są zapasowe dla stron,
+    na których zawiedzie (błąd lub pusty tekst). preferred="auto" - pomiar na SAMPLE_PAGES stronach i wybór
+    najszybszego ekstraktora, który odczytuje tekst nie gorzej niż QUALITY_TOLERANCE najlepszego.
+    """
+    available = available_backends()
+    if not available:
+        raise RuntimeError("Brak ekstraktora PDF - zainstaluj pypdfium2, PyPDF2 lub pdfplumber.")
+    if preferred != "auto":
+        return [preferred] + [name for name in available if name != preferred]
+    if len(available) == 1:
+        return available
+
+    stat = os.stat(pdf_path)
+    choice_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    with _choices_lock:
+        if choice_key in _choices:
+            return _choices[choice_key]
+
+    measurements = {}  # nazwa -> (czas próby, jakość tekstu próby)
+    for name in available:
+        try:
+            start = time.perf_counter()
+            document = open_document(name, pdf_path)
+            try:
+                total = document.page_count
+                sample = sorted({index * total // SAMPLE_PAGES for index in range(min(SAMPLE_PAGES, total))})
+                quality = sum(text_quality(normalize_page_text(document.extract(index))) for index in sample)
+            finally:
+                document.close()
+            measurements[name] = (time.perf_counter() - start, quality)
+        except Exception as e:
+            print(f"INFO: Ekstraktor '{name}' nie odczytał próby z '{os.path.basename(pdf_path)}': {e}")
+
+    if not measurements:
+        choice = available
+    else:
+        best_quality = max(quality for _, quality in measurements.values())
+        good = sorted((name for name, (_, quality) in measurements.items() if quality >= QUALITY_TOLERANCE * best_quality),
+                      key=lambda name: measurements[name][0])
+        choice = good + [name for name in available if name not in good]
+        timings = ", ".join(f"{name} {seconds:.3f} s" for name, (seconds, _) in
+                            sorted(measurements.items(), key=lambda item: item[1][0]))
+        print(f"INFO: Ekstraktor dla '{os.path.basename(pdf_path)}': {choice[0]} (próba stron: {timings}).")
+
+    with _choices_lock:
+        _choices[choice_key] = choice
+    return choice
+
+
+# --- Ekstrakcja zakresu stron z zapasowym ekstraktorem dla każdej strony ---
+def extract_pages(pdf_path, start_index, end_index, backends):
+    """
+    Zwraca listę par (tekst strony, nazwa ekstraktora) dla stron [start_index, end_index).
+    Strona, na której ekstraktor zgłosi błąd lub nie znajdzie tekstu, jest odczytywana kolejnym z listy backends.
+    Strona nieczytelna dla wszystkich ekstraktorów daje pusty tekst z ekstraktorem None.
+    """
+    documents = {}
+    failed_backends = set()
+
+    def document_for(name):
+        if name not in documents:
+            documents[name] = open_document(name, pdf_path)
+        return documents[name]
+
+    try:
+        pages = []
+        for index in range(start_index, end_index):
+            page_text, served_by = "", None
+            for name in backends:
+                if name in failed_backends:
+                    continue
+                try:
+                    text = normalize_page_text(document_for(name).extract(index))
+                except Exception as e:
+                    if name not in documents:
+                        failed_backends.add(name)  # Plik nie otwiera się tym ekstraktorem - nie próbujemy ponownie
+                    print(f"  OSTRZEŻENIE: Ekstraktor '{name}' zawiódł na stronie {index + 1} "
+                          f"pliku '{os.path.basename(pdf_path)}': {e}")
+                    continue
+                if served_by is None:
+                    page_text, served_by = text, name
+                if text.strip():
+                    page_text, served_by = text, name
+                    break
+            if served_by is None:
+                print(f"  OSTRZEŻENIE: Żaden ekstraktor nie odczytał strony {index + 1} "
+                      f"pliku '{os.path.basename(pdf_path)}' - strona zostanie pominięta.")
+            pages.append((page_text, served_by))
+        if start_index < end_index and not documents:
+            raise RuntimeError(f"Żaden ekstraktor ({', '.join(backends)}) nie otworzył pliku '{pdf_path}'.")
+        return pages
+    finally:
+        for document in documents.values():
+            document.close()
+
+
+def describe_page_backends(counts):
+    """Np. "pypdfium2: 55, pdfplumber: 1" - counts to Counter liczby stron odczytanych każdym ekstraktorem."""
+    return ", ".join(f"{name or 'brak'}: {count}" for name, count in counts.most_common())
@@ -0,0 +1,238 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+# --- Konfiguracja pamięci podręcznej tekstu wyodrębnionego z PDF ---
+# Domyślny katalog obok skryptów - skrypty mogą podać własny katalog parametrem cache_folder
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CACHE_PDF_TEXT")
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Maksymalny rozmiar cache na dysku (512 MB), aby nie zapełnić karty SD
+HASH_BLOCK_SIZE = 1024 * 1024  # Rozmiar bloku przy liczeniu skrótu SHA-256 pliku
+
+# Układ katalogu: <skrót[:2]>/<skrót>/document.json - liczba stron i ekstraktor wybrany przy "auto",
+# <skrót[:2]>/<skrót>/<ekstraktor>-<normalized|raw>/<pierwsza>-<koniec>.json - teksty jednego zakresu stron.
+# Każdy zakres jest zapisywany raz, do własnego pliku - dopisanie zakresu nie przepisuje wcześniejszych stron.
+DOCUMENT_FILE = "document.json"
+RANGE_FILE_FORMAT = "{:06d}-{:06d}.json"
+
+# Skróty plików policzone w bieżącym procesie: (ścieżka, rozmiar, mtime) -> sha256
+_file_hashes = {}
+_documents = {}  # Ścieżka document.json -> opis dokumentu wczytany lub zapisany w bieżącym procesie
+_documents_lock = threading.Lock()
+
+
+# --- Skrót zawartości pliku PDF (klucz cache niezależny od nazwy pliku) ---
+def file_content_hash(pdf_path):
+    stat = os.stat(pdf_path)
+    memo_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def _document_folder(pdf_path, cache_folder):
+    content_hash = file_content_hash(pdf_path)
+    return os.path.join(cache_folder or CACHE_FOLDER, content_hash[:2], content_hash)
+
+
+def _variant_folder(pdf_path, backend, normalized, cache_folder):
+    # Tekst znormalizowany (pdf_extractors.normalize_page_text) i surowy tego samego ekstraktora to różne wpisy
+    return os.path.join(_document_folder(pdf_path, cache_folder), f"{backend}-{'normalized' if normalized else 'raw'}")
+
+
+def _load_entry(entry_path):
+    try:
+        with open(entry_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(entry_path)  # Odczyt odświeża czas modyfikacji - na nim opiera się usuwanie najstarszych wpisów
+        return entry
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"OSTRZEŻENIE: Uszkodzony wpis cache tekstu PDF '{entry_path}' zostanie pominięty: {e}")
+        return None
+
+
+def save_json_atomic(path, data):
+    """
+    Zapis atomowy przez plik tymczasowy o unikalnej nazwie w tym samym katalogu - przerwa w zasilaniu nie zostawi
+    połowy pliku, a równoległe zapisy (wątki, procesy) nie dzielą jednego pliku tymczasowego.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# --- Opis dokumentu: liczba stron i ekstraktor wybrany przy PDF_TEXT_EXTRACTOR = "auto" ---
+def _load_document(pdf_path, cache_folder):
+    document_path = os.path.join(_document_folder(pdf_path, cache_folder), DOCUMENT_FILE)
+    with _documents_lock:
+        if document_path in _documents:
+            return _documents[document_path]
+    document = _load_entry(document_path) or {}
+    with _documents_lock:
+        _documents[document_path] = document
+    return document
+
+
+def _update_document(pdf_path, cache_folder, **fields):
+    # Zapis tylko przy zmianie - kolejne zakresy stron tego samego dokumentu nie przepisują document.json
+    document = _load_document(pdf_path, cache_folder)
+    if all(document.get(name) == value for name, value in fields.items()):
+        return
+    document = dict(document, **fields)
+    document_path = os.path.join(_document_folder(pdf_path, cache_folder), DOCUMENT_FILE)
+    with _documents_lock:
+        _documents[document_path] = document
+    try:
+        save_json_atomic(document_path, document)
+    except OSError as e:
+        print(f"OSTRZEŻENIE: Nie można zapisać cache tekstu PDF dla '{os.path.basename(pdf_path)}': {e}")
+
+
+# --- Odczyt i zapis liczby stron zapamiętanej dla pliku (niezależnej od ekstraktora) ---
+def get_cached_page_count(pdf_path, cache_folder=None):
+    return _load_document(pdf_path, cache_folder).get("num_pages")
+
+
+def store_page_count(pdf_path, num_pages, cache_folder=None):
+    _update_document(pdf_path, cache_folder, num_pages=num_pages)
+
+
+def _resolve_backend(pdf_path, extractor, cache_folder):
+    # Przy "auto" wpisy leżą pod ekstraktorem, który wybrano dla dokumentu przy pierwszej ekstrakcji
+    if extractor == "auto":
+        return _load_document(pdf_path, cache_folder).get("auto_backend")
+    return extractor
+
+
+def _cached_ranges(variant_folder):
+    ranges = []
+    try:
+        file_names = os.listdir(variant_folder)
+    except FileNotFoundError:
+        return ranges
+    for file_name in file_names:
+        if not file_name.endswith(".json"):
+            continue  # Pliki tymczasowe
+        try:
+            first, last = (int(part) for part in file_name[:-len(".json")].split("-"))
+        except ValueError:
+            continue
+        if first < last:
+            ranges.append((first, last, os.path.join(variant_folder, file_name)))
+    return sorted(ranges)
+
+
+# --- Odczyt tekstów stron z cache ---
+def get_cached_pages(pdf_path, extractor, start_index, end_index, cache_folder=None, normalized=True):
+    """
+    Zwraca listę tekstów stron [start_index, end_index) albo None, jeśli którejkolwiek strony brakuje w cache.
+    Strony mogą pochodzić z kilku zapisanych zakresów.
+    """
+    backend = _resolve_backend(pdf_path, extractor, cache_folder)
+    if backend is None:
+        return None
+    page_files = {}  # indeks strony -> (plik zakresu, pierwsza strona zakresu)
+    for first, last, path in _cached_ranges(_variant_folder(pdf_path, backend, normalized, cache_folder)):
+        for index in range(max(first, start_index), min(last, end_index)):
+            page_files.setdefault(index, (path, first))
+    if len(page_files) < end_index - start_index:
+        return None
+
+    loaded = {}
+    page_texts = []
+    for index in range(start_index, end_index):
+        path, first = page_files[index]
+        if path not in loaded:
+            loaded[path] = _load_entry(path)
+            if loaded[path] is None:
+                return None
+        page_texts.append(loaded[path]["pages"][index - first])
+    return page_texts
+
+
+# --- Zapis tekstów zakresu stron do cache ---
+def store_pages(pdf_path, extractor, backend, start_index, page_texts, cache_folder=None, page_backends=None,
+                normalized=True):
+    """
+    extractor - ustawienie ekstraktora ("auto" albo nazwa), backend - ekstraktor, który faktycznie odczytał dokument
+    (przy "auto" zapamiętywany w opisie dokumentu). page_backends - opcjonalnie nazwy ekstraktorów, które
+    odczytały kolejne strony (strony nieodczytane pierwszym ekstraktorem czytają zapasowe).
+    """
+    page_texts = list(page_texts)
+    if not page_texts:
+        return
+    entry = {"backend": backend, "normalized": normalized, "pages": page_texts}
+    if page_backends:
+        entry["page_backends"] = list(page_backends)
+    range_path = os.path.join(_variant_folder(pdf_path, backend, normalized, cache_folder),
+                              RANGE_FILE_FORMAT.format(start_index, start_index + len(page_texts)))
+    try:
+        save_json_atomic(range_path, entry)
+    except OSError as e:
+        print(f"OSTRZEŻENIE: Nie można zapisać cache tekstu PDF dla '{os.path.basename(pdf_path)}': {e}")
+        return
+    if extractor == "auto":
+        _update_document(pdf_path, cache_folder, auto_backend=backend)
+
+
+# --- Usuwanie najdawniej używanych wpisów po przekroczeniu limitu rozmiaru (raz na przebieg) ---
+def evict_to_size(cache_folder=None, max_bytes=None):
+    """
+    Wpis to katalog dokumentu <skrót[:2]>/<skrót> (opis dokumentu i wszystkie jego zakresy stron usuwane razem)
+    albo plik <klucz[:2]>/<klucz>.json cache odpowiedzi. Czas użycia wpisu to najnowszy czas modyfikacji w nim.
+    """
+    cache_folder = cache_folder or CACHE_FOLDER
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = {}  # ścieżka wpisu -> [czas ostatniego użycia, rozmiar]
+    total_bytes = 0
+    for dir_path, _, file_names in os.walk(cache_folder):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            relative_parts = os.path.relpath(path, cache_folder).split(os.sep)
+            entry = entries.setdefault(os.path.join(cache_folder, *relative_parts[:2]), [0.0, 0])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            total_bytes += stat.st_size
+
+    if total_bytes <= max_bytes:
+        return 0
+
+    removed = 0
+    for path, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+    with _documents_lock:
+        _documents.clear()  # Opisy dokumentów mogły zostać usunięte
+    print(f"INFO: Usunięto {removed} najstarszych wpisów z cache '{cache_folder}' (limit {max_bytes} bajtów).")
+    return removed
@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+import threading
+
+# --- Dziennik przebiegu (run journal) dla wznawiania przerwanych analiz wsadowych ---
+# Każde zdarzenie to jedna linia JSON dopisywana na końcu pliku <run_id>.jsonl i od razu zrzucana na dysk (fsync),
+# więc po zaniku zasilania lub zerwaniu połączenia z Ollamą ukończona praca nie jest tracona.
+# W pamięci zostaje tylko położenie (offset) zdarzenia w pliku - wynik jest czytany z dysku dopiero wtedy, gdy jest
+# potrzebny, więc dziennik długiego przebiegu nie trzyma w RAM tekstu wszystkich analiz.
+# Każde zdarzenie ma jawny status - wynik jest wznawiany tylko ze statusem STATUS_OK, niezależnie od jego treści.
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    def __init__(self, journal_folder, run_id):
+        self.run_id = run_id
+        self.path = os.path.join(journal_folder, f"{run_id}.jsonl")
+        self.lock = threading.Lock()
+        self.files_done = {}  # nazwa pliku -> offset zdarzenia file_done
+        self.chunks_done = {}  # (nazwa pliku, indeks części) -> (skrót tekstu części, offset zdarzenia chunk_done)
+        os.makedirs(journal_folder, exist_ok=True)
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            offset = 0
+            for line_number, line in enumerate(f, start=1):
+                line_offset, offset = offset, offset + len(line)
+                if not line.endswith(b"\n"):
+                    # Zapis przerwany w połowie - obcinamy go, aby kolejne zdarzenie nie zostało doklejone do niego
+                    print(f"OSTRZEŻENIE: Pominięto przerwaną linię {line_number} dziennika '{self.path}'.")
+                    f.truncate(line_offset)
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    print(f"OSTRZEŻENIE: Pominięto uszkodzoną linię {line_number} dziennika '{self.path}'.")
+                    continue
+                if event.get("status", STATUS_OK) != STATUS_OK:  # Starsze dzienniki zapisywały tylko sukcesy
+                    continue
+                if event["event"] == "chunk_done":
+                    self.chunks_done[(event["file"], event["chunk"])] = (event["chunk_hash"], line_offset)
+                elif event["event"] == "file_done":
+                    self.files_done[event["file"]] = line_offset
+
+    def _append(self, event):
+        """Dopisuje zdarzenie i zwraca jego offset w pliku dziennika."""
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        return offset
+
+    def _read_event(self, offset):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    # --- Poziom plików ---
+    def get_file_result(self, file_name):
+        offset = self.files_done.get(file_name)
+        return self._read_event(offset)["record"] if offset is not None else None
+
+    def mark_file_done(self, file_name, record):
+        with self.lock:
+            self.files_done[file_name] = self._append({"event": "file_done", "file": file_name, "status": STATUS_OK,
+                                                       "record": record})
+
+    # --- Poziom części (chunków) ---
+    def get_chunk_result(self, file_name, chunk_index, chunk_text):
+        done = self.chunks_done.get((file_name, chunk_index))
+        if done and done[0] == _text_hash(chunk_text):  # Inny tekst części (np. inny zakres stron) = brak wyniku
+            return self._read_event(done[1])["result"]
+        return None
+
+    def get_chunk_result_at(self, file_name, chunk_index):
+        """Zapisany wynik części bez porównywania jej tekstu (np. dla części uznanej za powtórzenie tamtej)."""
+        done = self.chunks_done.get((file_name, chunk_index))
+        return self._read_event(done[1])["result"] if done else None
+
+    def mark_chunk_done(self, file_name, chunk_index, chunk_text, result_text, ok):
+        """
+        ok - czy model zwrócił poprawną, pełną odpowiedź. Część z błędem jest zapisywana ze statusem STATUS_FAILED
+        i zostanie przeanalizowana ponownie przy wznowieniu.
+        """
+        chunk_hash = _text_hash(chunk_text)
+        with self.lock:
+            offset = self._append({"event": "chunk_done", "file": file_name, "chunk": chunk_index,
+                                   "status": STATUS_OK if ok else STATUS_FAILED, "chunk_hash": chunk_hash,
+                                   "result": result_text})
+            if ok:
+                self.chunks_done[(file_name, chunk_index)] = (chunk_hash, offset)
+
+    def file_checkpoint(self, file_name):
+        return FileCheckpoint(self, file_name)
+
+
+class FileCheckpoint:
+    """
+    Widok dziennika dla jednego pliku, przekazywany do analyze_text_with_bielik.
+    """
+
+    def __init__(self, journal, file_name):
+        self.journal = journal
+        self.file_name = file_name
+
+    def get(self, chunk_index, chunk_text):
+        return self.journal.get_chunk_result(self.file_name, chunk_index, chunk_text)
+
+    def put(self, chunk_index, chunk_text, result_text, ok):
+        self.journal.mark_chunk_done(self.file_name, chunk_index, chunk_text, result_text, ok)
@@ -0,0 +1,31 @@
+import os
+import sys
+import importlib.util
+
+import pytest
+
+# Moduły projektu leżą w katalogu głównym repozytorium (bez pakietu)
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_FOLDER)
+
+ANALYSIS_FOLDERS = ("PDF_INPUT_FOLDER", "OUTPUT_FOLDER", "LOG_FOLDER", "PDF_TEXT_CACHE_FOLDER",
+                    "LLM_RESPONSE_CACHE_FOLDER", "SUMMARY_TREE_FOLDER", "CALL_METRICS_FOLDER", "RUN_JOURNAL_FOLDER",
+                    "SPOOL_FOLDER", "VECTOR_STORE_FOLDER")
+
+
+@pytest.fixture(scope="session")
+def analysis_module():
+    # analysis-summary.py ma w nazwie myślnik - wczytanie przez importlib
+    spec = importlib.util.spec_from_file_location("analysis_summary", os.path.join(REPO_FOLDER, "analysis-summary.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def analysis(analysis_module, tmp_path, monkeypatch):
+    """Skrypt analizy z wszystkimi katalogami w katalogu tymczasowym testu."""
+    for name in ANALYSIS_FOLDERS:
+        monkeypatch.setattr(analysis_module, name, str(tmp_path / name))
+    monkeypatch.setattr(analysis_module, "CORPUS_MANIFEST_PATH", str(tmp_path / "corpus_manifest.json"))
+    return analysis_module
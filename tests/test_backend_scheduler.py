@@ -0,0 +1,44 @@
+import time
+import threading
+
+import backend_scheduler
+
+
+def wait_for_waiting(scheduler, count):
+    deadline = time.monotonic() + 5
+    while len(scheduler.waiting) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_interactive_requests_overtake_waiting_batch_requests():
+    scheduler = backend_scheduler.BackendScheduler([("localhost", 11434)])
+    busy_backend = scheduler.acquire(backend_scheduler.BATCH_PRIORITY)
+    order = []
+    threads = []
+
+    def request(name, priority):
+        with scheduler.slot(priority):
+            order.append(name)
+
+    for i, (name, priority) in enumerate([("batch-1", backend_scheduler.BATCH_PRIORITY),
+                                          ("batch-2", backend_scheduler.BATCH_PRIORITY),
+                                          ("interactive", backend_scheduler.INTERACTIVE_PRIORITY)]):
+        thread = threading.Thread(target=request, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        wait_for_waiting(scheduler, i + 1)  # Kolejność zgłoszeń jest ustalona
+
+    assert scheduler.status()["waiting_interactive"] == 1 and scheduler.status()["waiting_batch"] == 2
+    scheduler.release(busy_backend)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "batch-1", "batch-2"]
+    assert scheduler.status()["free"] == 1
+
+
+def test_slots_alternate_between_backends():
+    scheduler = backend_scheduler.BackendScheduler([("a", 1), ("b", 2)], slots_per_backend=2)
+    acquired = [scheduler.acquire(backend_scheduler.BATCH_PRIORITY) for _ in range(4)]
+    assert acquired == [("a", 1), ("b", 2), ("a", 1), ("b", 2)]
+    assert scheduler.status() == {"capacity": 4, "free": 0, "waiting_interactive": 0, "waiting_batch": 0}
@@ -0,0 +1,47 @@
+import os
+
+import corpus_manifest
+
+RESULT = {"processed": 1, "output_sha256": "abc"}
+
+
+def test_unchanged_entry_requires_same_content_range_and_version(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    corpus_manifest.CorpusManifest(path).record("a.pdf", "h1", (1, 5), "v1", RESULT)
+
+    manifest = corpus_manifest.CorpusManifest(path)  # Wpisy wczytane z dysku
+    entry = manifest.get_unchanged("a.pdf", "h1", (1, 5), "v1")
+    assert entry["output_sha256"] == "abc" and entry["page_range"] == [1, 5]
+    assert manifest.get_unchanged("a.pdf", "h2", (1, 5), "v1") is None  # Zmieniona zawartość
+    assert manifest.get_unchanged("a.pdf", "h1", (1, 6), "v1") is None  # Inny zakres stron
+    assert manifest.get_unchanged("a.pdf", "h1", (1, 5), "v2") is None  # Inny model lub prompt
+    assert manifest.get_unchanged("b.pdf", "h1", (1, 5), "v1") is None
+
+
+def test_damaged_manifest_means_full_analysis(tmp_path, capsys):
+    path = tmp_path / "manifest.json"
+    for content in ('{"a.pdf": {"content_ha', "[]", '{"a.pdf": {"processed": 1}}'):
+        path.write_text(content, encoding="utf-8")
+        manifest = corpus_manifest.CorpusManifest(str(path))
+        assert manifest.get_unchanged("a.pdf", "h1", (1, 5), "v1") is None
+    assert "OSTRZEŻENIE" in capsys.readouterr().out
+
+
+def test_prune_removes_missing_files(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = corpus_manifest.CorpusManifest(path)
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        manifest.record(name, "h", (1, 1), "v1", RESULT)
+
+    assert manifest.prune(["a.pdf", "c.pdf", "nowy.pdf"]) == ["b.pdf"]
+    assert manifest.prune(["a.pdf", "c.pdf"]) == []
+    assert sorted(corpus_manifest.CorpusManifest(path).entries) == ["a.pdf", "c.pdf"]
+
+
+def test_failed_save_keeps_entries_in_memory(tmp_path, capsys):
+    blocked_folder = tmp_path / "plik"
+    blocked_folder.write_text("to nie jest katalog", encoding="utf-8")
+    manifest = corpus_manifest.CorpusManifest(os.path.join(blocked_folder, "manifest.json"))
+    manifest.record("a.pdf", "h", (1, 2), "v1", RESULT)
+    assert manifest.get_unchanged("a.pdf", "h", (1, 2), "v1") is not None
+    assert "Nie można zapisać manifestu" in capsys.readouterr().out
@@ -0,0 +1,51 @@
+import generation_options
+
+
+def test_context_size_rounds_up_to_power_of_two_within_bounds():
+    assert generation_options.context_size(10) == generation_options.MIN_CONTEXT_TOKENS
+    assert generation_options.context_size(4_096) == 4_096
+    assert generation_options.context_size(4_097) == 8_192
+    assert generation_options.context_size(20_000) == 32_768
+    assert generation_options.context_size(50_000) == 32_768  # Nie więcej niż okno modelu
+    assert generation_options.context_size(5_000, max_context=6_000) == 6_000
+
+
+def test_options_reuse_loaded_context_when_it_fits():
+    options = generation_options.options_for("analysis", 1_000, loaded_context=16_384)
+    assert options == {"num_predict": 3_072, "num_ctx": 16_384}
+    assert generation_options.options_for("analysis", 1_000, loaded_context=4_096)["num_ctx"] == 8_192
+
+
+def test_prompt_has_priority_over_response_limit():
+    options = generation_options.options_for("analysis", 30_000)
+    assert options["num_ctx"] == 32_768
+    assert options["num_predict"] == 32_768 - 30_000 - generation_options.CONTEXT_MARGIN_TOKENS
+    too_long = generation_options.options_for("analysis", 40_000)
+    assert too_long["num_predict"] == generation_options.MIN_PREDICT_TOKENS
+
+
+def test_correction_limit_follows_paragraph_length():
+    assert generation_options.options_for("correction", 300, input_tokens=100)["num_predict"] == 256
+    assert generation_options.options_for("correction", 900, input_tokens=1_000)["num_predict"] == 1_500
+    assert generation_options.options_for("correction", 9_000, input_tokens=10_000)["num_predict"] == 2_048
+    assert "output_ratio" not in generation_options.options_for("correction", 300, input_tokens=100)
+
+
+def test_validate_profiles_reports_conflicts(tmp_path):
+    modfile = tmp_path / "Modfile"
+    modfile.write_text('FROM ./model.gguf\nPARAMETER num_ctx 8192\nPARAMETER num_predict 512\n', encoding="utf-8")
+    warnings = generation_options.validate_profiles(str(modfile), max_context=4_096, response_reserve=2_000)
+    assert any("'stop'" in warning for warning in warnings)
+    assert any("num_ctx 8192" in warning for warning in warnings)
+    assert any("num_predict 512" in warning for warning in warnings)
+    assert any("Profil 'global_summary': num_predict 4096 nie mieści się" in warning for warning in warnings)
+    assert any("Profil 'analysis': num_predict 3072 przekracza rezerwę" in warning for warning in warnings)
+    assert any("Profil 'analysis' zmienia num_predict z 512" in warning for warning in warnings)
+
+
+def test_validate_profiles_accepts_matching_modfile(tmp_path):
+    modfile = tmp_path / "Modfile"
+    modfile.write_text('FROM ./model.gguf\nPARAMETER stop "<|im_end|>"\n', encoding="utf-8")
+    assert generation_options.validate_profiles(str(modfile), response_reserve=4_096) == []
+    assert generation_options.validate_profiles(str(tmp_path / "brak")) == [
+        f"Nie można odczytać Modfile '{tmp_path / 'brak'}' - profile opcji nie zostały sprawdzone."]
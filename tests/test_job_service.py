@@ -0,0 +1,87 @@
+import sys
+import types
+import threading
+
+import pytest
+
+import backend_scheduler
+import job_service
+
+
+def test_cancelled_queued_job_never_starts():
+    job = job_service.Job("analysis", {}, backend_scheduler.BATCH_PRIORITY)
+    job.cancel()
+    assert job.status == "cancelled" and job.cancel_event.is_set()
+    assert job.start() is False
+    assert job.status == "cancelled"
+
+
+def test_cancel_of_running_job_only_sets_event():
+    job = job_service.Job("analysis", {}, backend_scheduler.BATCH_PRIORITY)
+    assert job.start() is True
+    job.cancel()
+    assert job.status == "running" and job.cancel_event.is_set()
+
+
+def test_cancel_races_with_start():
+    for _ in range(200):
+        job = job_service.Job("analysis", {}, backend_scheduler.BATCH_PRIORITY)
+        started = []
+        thread = threading.Thread(target=lambda: started.append(job.start()))
+        thread.start()
+        job.cancel()
+        thread.join()
+        # Albo zadanie wystartowało przed anulowaniem (i czeka na cancel_event), albo nie wystartuje wcale
+        assert (started[0], job.status) in ((True, "running"), (False, "cancelled"))
+
+
+class FakeAnalysis:
+    OLLAMA_BACKENDS = [("localhost", 11434)]
+    MAX_IN_FLIGHT_PER_BACKEND = 1
+    ollama_scheduler = None
+
+    class AnalysisCancelled(BaseException):
+        pass
+
+    @staticmethod
+    def parse_page_range_arguments(page_arguments):
+        return []
+
+
+@pytest.fixture
+def service_port(monkeypatch):
+    monkeypatch.setattr(sys, "stdout", sys.stdout)  # JobService podmienia sys.stdout - przywrócenie po teście
+    service = job_service.JobService(FakeAnalysis())
+    server = job_service.make_server(service, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield service, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    service.correction_pool.shutdown(wait=False)
+
+
+@pytest.mark.parametrize("body", [[], "x", 1, None])
+def test_request_body_must_be_json_object(service_port, body):
+    _, port = service_port
+    status, response = job_service._request_json("127.0.0.1", port, "POST", "/jobs", body)
+    if body is None:  # Pusta treść to pusty obiekt - brak typu zadania
+        assert status == 400 and "Nieznany typ zadania" in response["error"]
+    else:
+        assert (status, response) == (400, {"error": "Treść zadania musi być obiektem JSON."})
+
+
+def test_invalid_event_offset_is_rejected(service_port):
+    service, port = service_port
+    job = job_service.Job("analysis", {}, backend_scheduler.BATCH_PRIORITY)
+    service.jobs[job.id] = job
+    status, response = job_service._request_json("127.0.0.1", port, "GET", f"/jobs/{job.id}/events?from=abc")
+    assert status == 400 and "from" in response["error"]
+
+
+def test_delete_cancels_queued_job(service_port):
+    service, port = service_port
+    job = job_service.Job("analysis", {}, backend_scheduler.BATCH_PRIORITY)
+    service.jobs[job.id] = job
+    status, response = job_service._request_json("127.0.0.1", port, "DELETE", f"/jobs/{job.id}")
+    assert (status, response["status"]) == (200, "cancelled")
+    assert job_service._request_json("127.0.0.1", port, "DELETE", "/jobs/brak")[0] == 404
@@ -0,0 +1,68 @@
+import os
+import time
+
+import generation_options
+import llm_response_cache
+
+MESSAGES = [{"role": "system", "content": "Instrukcje"},
+            {"role": "user", "content": "Data: 2025-06-01 12:00\nTekst części"}]
+
+
+def test_key_is_stable_across_runs_and_masks_volatile_values(tmp_path):
+    modfile = tmp_path / "Modfile"
+    modfile.write_text("FROM ./model.gguf\nPARAMETER temperature 0.1\n", encoding="utf-8")
+    key = llm_response_cache.make_key("bielik", MESSAGES, {"num_ctx": 4096}, ("2025-06-01 12:00",), str(modfile))
+    assert key == llm_response_cache.make_key("bielik", MESSAGES, {"num_ctx": 4096}, ("2025-06-01 12:00",),
+                                              str(modfile))
+
+    later_messages = [dict(MESSAGES[0]), {"role": "user", "content": "Data: 2025-06-02 08:30\nTekst części"}]
+    assert key == llm_response_cache.make_key("bielik", later_messages, {"num_ctx": 4096}, ("2025-06-02 08:30",),
+                                              str(modfile))
+    assert key != llm_response_cache.make_key("bielik", MESSAGES, {"num_ctx": 8192}, ("2025-06-01 12:00",),
+                                              str(modfile))
+    modfile.write_text("FROM ./model.gguf\nPARAMETER temperature 0.2\n", encoding="utf-8")
+    assert key != llm_response_cache.make_key("bielik", MESSAGES, {"num_ctx": 4096}, ("2025-06-01 12:00",),
+                                              str(modfile))
+
+
+def test_put_get_restores_current_volatile_values(tmp_path):
+    folder = str(tmp_path)
+    llm_response_cache.put("ab" * 32, "Analiza z 2025-06-01 12:00", ("2025-06-01 12:00",), folder)
+    assert llm_response_cache.get("ab" * 32, ("2025-06-02 08:30",), folder) == "Analiza z 2025-06-02 08:30"
+    assert llm_response_cache.get("cd" * 32, (), folder) is None
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path):
+    folder = str(tmp_path)
+    keys = [f"{i:02d}" * 32 for i in range(4)]
+    for i, key in enumerate(keys):
+        llm_response_cache.put(key, "x" * 1000, (), folder)
+        timestamp = time.time() - 100 + i
+        os.utime(llm_response_cache._entry_path(key, folder), (timestamp, timestamp))
+    llm_response_cache.get(keys[0], (), folder)  # Odczyt odświeża wpis
+
+    assert llm_response_cache.evict(folder, max_bytes=2500) == 2
+    assert [llm_response_cache.get(key, (), folder) is not None for key in keys] == [True, False, False, True]
+    assert llm_response_cache.evict(folder, max_bytes=2500) == 0
+
+
+def test_analysis_cache_key_uses_options_sent_to_ollama(analysis, monkeypatch):
+    monkeypatch.setattr(analysis, "USE_LLM_RESPONSE_CACHE", True)
+    monkeypatch.setattr(analysis, "BYPASS_LLM_RESPONSE_CACHE", False)
+    monkeypatch.setattr(analysis, "backend_settings", {
+        ("localhost", 11434, analysis.MODEL_NAME): {"loaded_context": 16_384, "keep_alive": "30m"}})
+    prompt_tokens = analysis.count_message_tokens(MESSAGES)
+    sent_options = generation_options.options_for("analysis", prompt_tokens, max_context=analysis.MODEL_CONTEXT_TOKENS,
+                                                  loaded_context=16_384)
+    cache_key, _ = analysis.get_cached_bielik_response(MESSAGES, sent_options)
+    analysis.store_bielik_response(cache_key, "Zapisana analiza")
+
+    # Ten sam num_ctx załadowanego modelu - odpowiedź z cache, bez zapytania do serwera
+    assert analysis.request_bielik_response(MESSAGES, "localhost", 11434, "część 1", "", "BRAK") == (
+        "Zapisana analiza", True)
+    # Inny num_ctx lub limit odpowiedzi - inny klucz
+    other_options = generation_options.options_for("analysis", prompt_tokens, max_context=analysis.MODEL_CONTEXT_TOKENS)
+    assert other_options != sent_options
+    assert analysis.get_cached_bielik_response(MESSAGES, other_options) == (
+        llm_response_cache.make_key(analysis.MODEL_NAME, MESSAGES, other_options,
+                                    volatile_values=(analysis.full_timestamp,)), None)
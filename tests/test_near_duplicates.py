@@ -0,0 +1,141 @@
+import random
+
+import pytest
+
+import near_duplicates
+
+WORDS = ("sąd organ strona pismo wniosek termin odwołanie przepis ustawa wyrok postanowienie pełnomocnik "
+         "dowód opłata doręczenie skarga uzasadnienie rozprawa zażalenie egzekucja").split()
+
+
+def page(seed, words=120):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(words))
+
+
+def with_changed_words(text, changes):
+    words = text.split()
+    for i in range(changes):
+        words[len(words) - 1 - i * 7] = f"zmienione{i}"
+    return " ".join(words)
+
+
+def test_exact_copy_ignores_formatting():
+    index = near_duplicates.DuplicateIndex()
+    match, text_signature = index.find(page(1))
+    assert match is None
+    index.add(text_signature, ("a.pdf", 1))
+    match, _ = index.find(page(1).upper().replace(" ", "\n"))
+    assert match == (("a.pdf", 1), 1.0)
+
+
+def test_similarity_threshold():
+    index = near_duplicates.DuplicateIndex(threshold=0.9)
+    index.add(near_duplicates.signature(page(1)), ("a.pdf", 1))
+
+    near_match, _ = index.find(with_changed_words(page(1), 1))
+    assert near_match is not None and 0.9 <= near_match[1] < 1.0
+    assert index.find(with_changed_words(page(1), 12))[0] is None  # Poniżej progu
+    assert index.find(page(2))[0] is None
+
+
+def test_estimated_full_match_is_not_an_exact_copy():
+    index = near_duplicates.DuplicateIndex(threshold=0.9)
+    index.add(near_duplicates.signature(page(1, words=2000)), ("a.pdf", 1))
+    match, _ = index.find(with_changed_words(page(1, words=2000), 1))
+    assert match is not None and match[1] == near_duplicates.NEAR_DUPLICATE_MAX_SIMILARITY < 1.0
+
+
+def test_short_texts_are_not_indexed():
+    index = near_duplicates.DuplicateIndex()
+    assert index.find("Strona 3 z 10") == (None, None)
+
+
+def test_accept_restricts_other_files_to_exact_copies():
+    index = near_duplicates.DuplicateIndex()
+    index.add(near_duplicates.signature(page(1)), ("a.pdf", 1))
+
+    def accept(reference, similarity_value):
+        return reference[0] == "b.pdf" or similarity_value == 1.0
+
+    assert index.find(with_changed_words(page(1), 1), accept)[0] is None
+    assert index.find(page(1), accept)[0] == (("a.pdf", 1), 1.0)
+
+
+@pytest.fixture
+def dedup_analysis(analysis, monkeypatch):
+    monkeypatch.setattr(analysis, "page_duplicates", near_duplicates.DuplicateIndex(0.9))
+    monkeypatch.setattr(analysis, "chunk_duplicates", near_duplicates.DuplicateIndex(0.9))
+    return analysis
+
+
+def test_pages_dedup_within_file_and_exact_copies_across_files(dedup_analysis):
+    first = list(dedup_analysis.iter_unique_pages([page(1), page(1).upper()], "a.pdf", 1))
+    assert first[0] == page(1)
+    assert "POWTARZA STRONĘ 1 TEGO PLIKU" in first[1] and "POMINIĘTO W ANALIZIE" in first[1]
+
+    dependencies = {}
+    second = list(dedup_analysis.iter_unique_pages([with_changed_words(page(1), 1), page(1)], "b.pdf", 1,
+                                                   dependencies))
+    assert second[0] == with_changed_words(page(1), 1)  # Podobna strona innego pliku jest analizowana
+    assert "KOPIĄ STRONY 1 PLIKU 'a.pdf'" in second[1] and "a_bielik_analysis.txt" in second[1]
+    assert dependencies == {"a.pdf": {1}}
+
+
+def letter_page(date, amount):
+    sentences = [page(n, words=15) + "." for n in range(30)]
+    sentences[4] = f"Termin zapłaty upływa w dniu {date} roku."
+    sentences[20] = f"Wierzyciel domaga się zapłaty kwoty {amount} zł wraz z odsetkami."
+    return "\n".join(sentences)
+
+
+def test_similar_page_keeps_sentences_with_different_date_and_amount(dedup_analysis):
+    original = letter_page("12 marca 2024", "1 250,00")
+    changed = letter_page("19 marca 2024", "1 520,00")
+    pages = list(dedup_analysis.iter_unique_pages([original, changed], "a.pdf", 1))
+    assert pages[0] == original
+    reference, *kept = pages[1].split("\n")
+    assert "POWTARZA STRONĘ 1 TEGO PLIKU" in reference and "TYLKO ZDANIA, KTÓRE SIĘ RÓŻNIĄ" in reference
+    assert kept == ["Termin zapłaty upływa w dniu 19 marca 2024 roku.",
+                    "Wierzyciel domaga się zapłaty kwoty 1 520,00 zł wraz z odsetkami."]
+
+
+def test_similar_chunk_is_analysed_again(dedup_analysis, tmp_path):
+    import run_journal
+    journal = run_journal.RunJournal(str(tmp_path), "run1")
+    original = letter_page("12 marca 2024", "1 250,00")
+    journal.mark_chunk_done("a.pdf", 0, original, "analiza pierwszego pisma", ok=True)
+    dedup_analysis.chunk_duplicates.add(near_duplicates.signature(original), ("a.pdf", 0))
+    checkpoint = journal.file_checkpoint("a.pdf")
+
+    result, chunk_signature = dedup_analysis.reuse_duplicate_chunk(letter_page("19 marca 2024", "1 250,00"),
+                                                                    checkpoint)
+    assert result is None and chunk_signature is not None
+    result, _ = dedup_analysis.reuse_duplicate_chunk(original.upper(), journal.file_checkpoint("b.pdf"))
+    assert result.endswith("analiza pierwszego pisma")
+
+
+def test_resume_seeds_index_from_restored_file(dedup_analysis, monkeypatch):
+    monkeypatch.setattr(dedup_analysis, "iter_selected_pages_from_pdf",
+                        lambda pdf_path, start_page, end_page: iter([page(1), page(2)]))
+    restored_plan = {"file": "a.pdf", "path": "/brak/a.pdf",
+                     "reused": {"processed": 1, "page_range": [1, 2]}}
+    dedup_analysis.seed_duplicate_indexes(restored_plan, chunk_results_in_journal=True)
+    assert dedup_analysis.page_duplicates.saved["items"] == 0  # Odtworzenie indeksu nie liczy się jako oszczędność
+
+    pages = list(dedup_analysis.iter_unique_pages([page(2)], "b.pdf", 1))
+    assert "KOPIĄ STRONY 2 PLIKU 'a.pdf'" in pages[0]
+    assert dedup_analysis.chunk_duplicates.references == [("a.pdf", 0)]
+
+
+def test_stale_dependency_detects_changed_source(analysis):
+    source = {"file": "a.pdf", "content_hash": "h1", "start_page": 1, "end_page": 5, "reused": None}
+    dependent = {"file": "b.pdf", "reused": {"depends_on": {"a.pdf": {"content_hash": "h1", "pages": [2, 5]}}}}
+    plans_by_file = {"a.pdf": source, "b.pdf": dependent}
+    assert analysis.stale_dependency(dependent, plans_by_file) is None
+
+    source["end_page"] = 4  # Zakres stron nie obejmuje już strony 5
+    assert analysis.stale_dependency(dependent, plans_by_file) == "a.pdf"
+    source.update(end_page=5, content_hash="h2")
+    assert analysis.stale_dependency(dependent, plans_by_file) == "a.pdf"
+    assert analysis.stale_dependency(dependent, {"b.pdf": dependent}) == "a.pdf"
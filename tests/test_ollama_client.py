@@ -0,0 +1,108 @@
+import json
+import threading
+import http.server
+
+import pytest
+
+import ollama_client
+
+
+class ScriptedHandler(http.server.BaseHTTPRequestHandler):
+    """Każde zapytanie dostaje kolejną odpowiedź z listy serwera: (status, linie NDJSON, zerwać połączenie)."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests += 1
+        status, lines, broken = self.server.responses.pop(0)
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body) + (100 if broken else 0)))
+        self.end_headers()
+        self.wfile.write(body)
+        if broken:  # Treść krótsza niż Content-Length - serwer zamyka połączenie w trakcie odpowiedzi
+            self.wfile.flush()
+            self.close_connection = True
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(ollama_client, "BACKOFF_BASE_SECONDS", 0)
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+    httpd.requests = 0
+    httpd.responses = []
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def client_for(httpd, max_retries=2):
+    return ollama_client.OllamaClient("127.0.0.1", httpd.server_address[1], timeout=5, max_retries=max_retries)
+
+
+def token(text, done=False):
+    line = {"message": {"content": text}, "done": done}
+    if done:
+        line["done_reason"] = "stop"
+    return line
+
+
+def test_retries_server_errors_then_succeeds(server):
+    server.responses = [(503, [{"error": "busy"}], False), (200, [{"models": []}], False)]
+    status, data, _ = client_for(server).request_json("GET", "/api/tags")
+    assert (status, data, server.requests) == (200, {"models": []}, 2)
+
+
+def test_returns_last_server_error_when_retries_run_out(server):
+    server.responses = [(503, [{"error": "busy"}], False)] * 3
+    status, data, _ = client_for(server, max_retries=2).request_json("GET", "/api/tags")
+    assert (status, data, server.requests) == (503, {"error": "busy"}, 3)
+
+
+def test_client_errors_are_not_retried(server):
+    server.responses = [(404, [{"error": "model not found"}], False)]
+    assert client_for(server).chat("bielik", [], stream=True).status == 404
+    assert server.requests == 1
+
+
+def test_stream_broken_before_first_token_is_retried(server):
+    server.responses = [(200, [], True), (200, [token("Ala "), token("ma kota", done=True)], False)]
+    tokens = []
+    response = client_for(server).chat("bielik", [], stream=True, on_token=tokens.append)
+    assert (response.status, response.content, response.data["done_reason"]) == (200, "Ala ma kota", "stop")
+    assert tokens == ["Ala ", "ma kota"] and server.requests == 2
+
+
+def test_stream_broken_after_tokens_raises_partial_response(server):
+    server.responses = [(200, [token("Ala "), token("ma ")], True), (200, [token("nie", done=True)], False)]
+    tokens = []
+    with pytest.raises(ollama_client.PartialResponseError):
+        client_for(server).chat("bielik", [], stream=True, on_token=tokens.append)
+    assert tokens == ["Ala ", "ma "]
+    assert server.requests == 1  # Bez ponowienia - tekst nie zostanie zdublowany
+
+
+def test_error_reported_in_stream_raises(server):
+    server.responses = [(200, [token("Ala "), {"error": "out of memory"}], False)]
+    with pytest.raises(RuntimeError, match="out of memory"):
+        client_for(server).chat("bielik", [], stream=True)
+
+
+def test_connection_refused_after_retries(server, monkeypatch):
+    port = server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    attempts = []
+    client = ollama_client.OllamaClient("127.0.0.1", port, timeout=5, max_retries=2)
+    original_send = client._send
+    monkeypatch.setattr(client, "_send", lambda *args: attempts.append(1) or original_send(*args))
+    with pytest.raises(ConnectionRefusedError):
+        client.request_json("GET", "/api/tags")
+    assert len(attempts) == 3
@@ -0,0 +1,65 @@
+import pytest
+
+import pdf_extractors
+
+closed = []
+
+
+class FakeDocument:
+    page_count = 4
+    pages = {}
+
+    def __init__(self, pdf_path):
+        self.name = type(self).__name__
+
+    def extract(self, index):
+        page = self.pages[index]
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+    def close(self):
+        closed.append(self.name)
+
+
+class Unopenable(FakeDocument):
+    def __init__(self, pdf_path):
+        raise ValueError("uszkodzony xref")
+
+
+class Sparse(FakeDocument):
+    pages = {0: "Strona 1\r\n", 1: "   ", 2: KeyError("/Contents"), 3: ""}
+
+
+class Full(FakeDocument):
+    pages = {0: "pełna 1", 1: "pełna 2", 2: "pełna 3", 3: ""}
+
+
+@pytest.fixture(autouse=True)
+def fake_backends(monkeypatch):
+    monkeypatch.setattr(pdf_extractors, "BACKENDS", dict(pdf_extractors.BACKENDS))
+    monkeypatch.setattr(pdf_extractors, "BACKEND_ORDER", list(pdf_extractors.BACKEND_ORDER))
+    for name, document_class in (("unopenable", Unopenable), ("sparse", Sparse), ("full", Full)):
+        pdf_extractors.register_backend(name, document_class)
+    closed.clear()
+
+
+def test_each_page_falls_back_to_next_backend():
+    pages = pdf_extractors.extract_pages("a.pdf", 0, 4, ["unopenable", "sparse", "full"])
+    assert pages == [
+        ("Strona 1", "sparse"),
+        ("pełna 2", "full"),  # Pusty tekst pierwszego ekstraktora
+        ("pełna 3", "full"),  # Błąd pierwszego ekstraktora na tej stronie
+        ("", "sparse"),  # Pusta strona we wszystkich ekstraktorach - tekst pierwszego, który ją odczytał
+    ]
+    assert sorted(closed) == ["Full", "Sparse"]
+
+
+def test_page_unreadable_by_every_backend_is_empty():
+    assert pdf_extractors.extract_pages("a.pdf", 2, 3, ["unopenable", "sparse"]) == [("", None)]
+
+
+def test_file_no_backend_can_open_raises():
+    with pytest.raises(RuntimeError, match="unopenable"):
+        pdf_extractors.extract_pages("a.pdf", 0, 2, ["unopenable"])
+    assert pdf_extractors.extract_pages("a.pdf", 0, 0, ["unopenable"]) == []
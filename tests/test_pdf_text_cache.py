@@ -0,0 +1,63 @@
+import os
+import time
+
+import pdf_text_cache
+
+
+def make_pdf(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_pages_are_assembled_from_stored_ranges(tmp_path):
+    pdf_path = make_pdf(tmp_path, "dokument.pdf", b"%PDF-1.4 test")
+    folder = str(tmp_path / "cache")
+    pdf_text_cache.store_page_count(pdf_path, 5, folder)
+    pdf_text_cache.store_pages(pdf_path, "auto", "pdfplumber", 0, ["s1", "s2"], folder)
+    pdf_text_cache.store_pages(pdf_path, "auto", "pdfplumber", 2, ["s3"], folder)
+    pdf_text_cache.store_pages(pdf_path, "pypdf2", "pypdf2", 0, ["surowa"], folder, normalized=False)
+
+    assert pdf_text_cache.get_cached_page_count(pdf_path, folder) == 5
+    assert pdf_text_cache.get_cached_pages(pdf_path, "auto", 1, 3, folder) == ["s2", "s3"]
+    assert pdf_text_cache.get_cached_pages(pdf_path, "pdfplumber", 0, 3, folder) == ["s1", "s2", "s3"]
+    assert pdf_text_cache.get_cached_pages(pdf_path, "auto", 0, 4, folder) is None  # Brak strony 4
+    assert pdf_text_cache.get_cached_pages(pdf_path, "pypdf2", 0, 1, folder) is None  # Tylko tekst surowy
+    assert pdf_text_cache.get_cached_pages(pdf_path, "pypdf2", 0, 1, folder, normalized=False) == ["surowa"]
+
+
+def test_key_follows_content_not_name(tmp_path):
+    folder = str(tmp_path / "cache")
+    original = make_pdf(tmp_path, "a.pdf", b"%PDF-1.4 ta sama zawartosc")
+    pdf_text_cache.store_pages(original, "pdfplumber", "pdfplumber", 0, ["strona"], folder)
+
+    renamed = make_pdf(tmp_path, "kopia.pdf", b"%PDF-1.4 ta sama zawartosc")
+    assert pdf_text_cache.get_cached_pages(renamed, "pdfplumber", 0, 1, folder) == ["strona"]
+    make_pdf(tmp_path, "a.pdf", b"%PDF-1.4 inna zawartosc")
+    assert pdf_text_cache.get_cached_pages(original, "pdfplumber", 0, 1, folder) is None
+
+
+def set_document_age(pdf_path, folder, age_seconds):
+    document_folder = pdf_text_cache._document_folder(pdf_path, folder)
+    for dir_path, _, file_names in os.walk(document_folder):
+        for file_name in file_names:
+            timestamp = time.time() - age_seconds
+            os.utime(os.path.join(dir_path, file_name), (timestamp, timestamp))
+    return document_folder
+
+
+def test_evict_removes_whole_least_recently_used_documents(tmp_path):
+    folder = str(tmp_path / "cache")
+    documents = [make_pdf(tmp_path, f"{i}.pdf", f"%PDF-1.4 dokument {i}".encode()) for i in range(3)]
+    for age, pdf_path in zip((300, 200, 100), documents):
+        pdf_text_cache.store_page_count(pdf_path, 2, folder)
+        pdf_text_cache.store_pages(pdf_path, "auto", "pdfplumber", 0, ["x" * 2000, "y" * 2000], folder)
+        set_document_age(pdf_path, folder, age)
+    oldest_folder = pdf_text_cache._document_folder(documents[0], folder)
+    os.utime(os.path.join(oldest_folder, "pdfplumber-normalized", "000000-000002.json"))  # Odczyt zakresu stron
+
+    assert pdf_text_cache.evict_to_size(folder, max_bytes=9000) == 1
+    assert os.path.isdir(oldest_folder)  # Opis dokumentu został razem z używanym zakresem stron
+    assert not os.path.exists(pdf_text_cache._document_folder(documents[1], folder))
+    assert pdf_text_cache.get_cached_pages(documents[0], "auto", 0, 2, folder) == ["x" * 2000, "y" * 2000]
+    assert pdf_text_cache.get_cached_page_count(documents[2], folder) == 2
@@ -0,0 +1,45 @@
+import run_journal
+
+
+def test_resume_restores_files_and_chunks(tmp_path):
+    journal = run_journal.RunJournal(str(tmp_path), "run1")
+    checkpoint = journal.file_checkpoint("a.pdf")
+    checkpoint.put(0, "tekst części 0", "analiza 0", ok=True)
+    checkpoint.put(1, "tekst części 1", "błąd", ok=False)
+    journal.mark_file_done("b.pdf", {"processed": 1, "output_sha256": "abc"})
+
+    resumed = run_journal.RunJournal(str(tmp_path), "run1")
+    assert resumed.file_checkpoint("a.pdf").get(0, "tekst części 0") == "analiza 0"
+    assert resumed.file_checkpoint("a.pdf").get(1, "tekst części 1") is None  # Część z błędem - ponowna analiza
+    assert resumed.get_file_result("b.pdf") == {"processed": 1, "output_sha256": "abc"}
+    assert resumed.get_file_result("a.pdf") is None
+
+
+def test_checkpoint_key_includes_chunk_text(tmp_path):
+    journal = run_journal.RunJournal(str(tmp_path), "run1")
+    journal.mark_chunk_done("a.pdf", 0, "strony 1-5", "analiza", ok=True)
+
+    resumed = run_journal.RunJournal(str(tmp_path), "run1")
+    assert resumed.get_chunk_result("a.pdf", 0, "strony 1-5") == "analiza"
+    assert resumed.get_chunk_result("a.pdf", 0, "strony 1-6") is None  # Inny zakres stron - inny tekst części
+    assert resumed.get_chunk_result("b.pdf", 0, "strony 1-5") is None
+    assert resumed.get_chunk_result_at("a.pdf", 0) == "analiza"
+
+
+def test_later_success_replaces_failure(tmp_path):
+    journal = run_journal.RunJournal(str(tmp_path), "run1")
+    journal.mark_chunk_done("a.pdf", 0, "tekst", "przerwane", ok=False)
+    journal.mark_chunk_done("a.pdf", 0, "tekst", "pełna analiza", ok=True)
+    assert run_journal.RunJournal(str(tmp_path), "run1").get_chunk_result("a.pdf", 0, "tekst") == "pełna analiza"
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    journal = run_journal.RunJournal(str(tmp_path), "run1")
+    journal.mark_chunk_done("a.pdf", 0, "tekst", "analiza", ok=True)
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"event": "chunk_done", "file": "a.pdf", "chu')  # Zapis przerwany zanikiem zasilania
+
+    resumed = run_journal.RunJournal(str(tmp_path), "run1")
+    assert resumed.get_chunk_result("a.pdf", 0, "tekst") == "analiza"
+    resumed.mark_file_done("a.pdf", {"processed": 1})  # Nie może zostać doklejone do przerwanej linii
+    assert run_journal.RunJournal(str(tmp_path), "run1").get_file_result("a.pdf") == {"processed": 1}
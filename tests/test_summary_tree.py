@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def tree(analysis, monkeypatch, tmp_path):
+    calls = []
+    failing = set()
+
+    def summarize_part(part_label, chunk, instruction_prompt, host, port, stream_writer=None, stream_index=0):
+        calls.append(chunk)
+        if chunk in failing:
+            return f"[BŁĄD ANALIZY BIELIK DLA {chunk}]", False
+        return f"podsumowanie({chunk})", True
+
+    monkeypatch.setattr(analysis, "summarize_overall_part_with_bielik", summarize_part)
+    monkeypatch.setattr(analysis, "OLLAMA_BACKENDS", [("localhost", 11434)])
+    monkeypatch.setattr(analysis, "ollama_scheduler", None)
+    folder = tmp_path / "tree"
+    folder.mkdir()
+
+    def run_level(inputs, pass_through=None):
+        stats = {"levels": 0, "calls": 0, "reused": 0}
+        nodes = analysis.run_summary_tree_level(str(folder), 1, inputs, "Podsumuj", stats, pass_through)
+        return nodes, stats
+
+    return run_level, calls, failing, folder
+
+
+def test_resume_reuses_saved_nodes_and_recomputes_failed_ones(tree):
+    run_level, calls, failing, _ = tree
+    failing.add("b")
+    nodes, stats = run_level(["a", "b", "c"])
+    assert nodes == ["podsumowanie(a)", "[BŁĄD ANALIZY BIELIK DLA b]", "podsumowanie(c)"]
+    assert stats == {"levels": 1, "calls": 3, "reused": 0}
+
+    failing.clear()
+    calls.clear()
+    nodes, stats = run_level(["a", "b", "c"])
+    assert nodes == ["podsumowanie(a)", "podsumowanie(b)", "podsumowanie(c)"]
+    assert calls == ["b"]  # Węzeł z błędem policzony ponownie, pozostałe wczytane z dysku
+    assert stats == {"levels": 1, "calls": 1, "reused": 2}
+
+
+def test_damaged_node_file_is_recomputed(tree):
+    run_level, calls, _, folder = tree
+    run_level(["a"])
+    with open(os.path.join(folder, "level1_node0000.json"), "w", encoding="utf-8") as f:
+        f.write('{"status": "ok", "te')  # Zapis przerwany w połowie
+    calls.clear()
+    assert run_level(["a"])[0] == ["podsumowanie(a)"]
+    assert calls == ["a"]
+
+
+def test_pass_through_nodes_skip_the_model(tree):
+    run_level, calls, _, folder = tree
+    nodes, stats = run_level(["a", "b"], pass_through=[False, True])
+    assert nodes == ["podsumowanie(a)", "b"]
+    assert calls == ["a"] and stats["calls"] == 1
+    assert os.listdir(folder) == ["level1_node0000.json"]
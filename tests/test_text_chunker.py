@@ -0,0 +1,68 @@
+import pytest
+
+import text_chunker
+
+
+def legal_text(articles=40):
+    return "".join(
+        f"Art. {n}.\n1. Przepis numer {n} stanowi, że organ rozpatruje sprawę bez zbędnej zwłoki. "
+        f"Strona może wnieść odwołanie w terminie czternastu dni.\n2. Ustęp drugi artykułu {n} "
+        f"odsyła do przepisów szczególnych i nie narusza praw nabytych.\n\n"
+        for n in range(1, articles + 1))
+
+
+def split_into_parts(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("part_size", [1, 37, 500, 100_000])
+@pytest.mark.parametrize("max_tokens,overlap_tokens", [(60, 0), (120, 20), (400, 50)])
+def test_stream_chunks_match_whole_text(part_size, max_tokens, overlap_tokens):
+    text = legal_text()
+    whole = list(text_chunker.iter_chunks(text, max_tokens, overlap_tokens))
+    streamed = list(text_chunker.iter_chunks_from_parts(split_into_parts(text, part_size), max_tokens,
+                                                        overlap_tokens))
+    assert streamed == whole
+
+
+def test_chunks_fit_budget_and_cover_text():
+    text = legal_text()
+    chunks = list(text_chunker.iter_chunks(text, 120))
+    assert len(chunks) > 1
+    assert all(text_chunker.count_tokens(chunk) <= 120 for chunk in chunks)
+    assert "".join(chunks) == text  # Bez zakładki chunki składają się z powrotem w cały tekst
+
+
+def test_stream_reads_parts_lazily():
+    consumed = []
+
+    def parts():
+        for part in split_into_parts(legal_text(), 200):
+            consumed.append(part)
+            yield part
+
+    first_chunk = next(text_chunker.iter_chunks_from_parts(parts(), 60))
+    assert first_chunk
+    assert len(consumed) < len(split_into_parts(legal_text(), 200))
+
+
+def text_without_articles(paragraphs=200):
+    return "".join(f"Pismo strony numer {n} wskazuje, że termin na wniesienie odpowiedzi upłynął dnia {n} maja, "
+                   f"a pełnomocnik nie przedłożył dokumentu.\n\n" for n in range(paragraphs))
+
+
+@pytest.mark.parametrize("part_size", [1, 300, 5000])
+def test_stream_above_buffer_limit_fits_budget_and_keeps_text(part_size):
+    text = text_without_articles()
+    max_tokens = 60
+    assert len(text) > text_chunker.STREAM_BUFFER_CHUNKS * max_tokens * text_chunker.CHARS_PER_TOKEN
+    streamed = list(text_chunker.iter_chunks_from_parts(split_into_parts(text, part_size), max_tokens))
+    assert len(streamed) > text_chunker.STREAM_BUFFER_CHUNKS
+    assert all(text_chunker.count_tokens(chunk) <= max_tokens for chunk in streamed)
+    assert "".join(streamed) == text
+
+
+def test_stream_above_buffer_limit_with_overlap_fits_budget():
+    chunks = list(text_chunker.iter_chunks_from_parts(split_into_parts(text_without_articles(), 300), 60, 15))
+    assert all(text_chunker.count_tokens(chunk) <= 60 for chunk in chunks)
+    assert chunks[-1].endswith("nie przedłożył dokumentu.\n\n")
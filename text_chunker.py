@@ -0,0 +1,164 @@
+import os
+import re
+import math
+
+# --- Konfiguracja liczenia tokenów ---
+# Ścieżka do pliku tokenizer.json modelu Bielik (np. pobranego z https://huggingface.co/speakleash).
+# Jeśli plik lub pakiet "tokenizers" nie jest dostępny, używane jest szybkie przybliżenie.
+BIELIK_TOKENIZER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokenizer.json")
+CHARS_PER_TOKEN = 3.0  # Ostrożne przybliżenie dla polskiego tekstu prawniczego (zawyża liczbę tokenów)
+STREAM_BUFFER_CHUNKS = 4  # Limit bufora przy podziale strumienia tekstu bez granic artykułów (w rozmiarach chunka)
+
+# --- Granice podziału tekstu, od najgrubszej do najdrobniejszej ---
+# Każdy wzorzec wyznacza miejsce cięcia (koniec dopasowania), więc złączone fragmenty dają dokładnie tekst wejściowy
+SPLIT_LEVELS = [
+    re.compile(r"(?m)^(?=(?:Art\.\s*\d+[a-z]*\.|Rozdział\s+[IVXLC]+\b))"),  # Artykuły i rozdziały (np. konstytucja.txt)
+    re.compile(r"(?m)\n[ \t]*\n+|^(?=\d+\.\s)"),  # Akapity i ustępy ("2. ...")
+    re.compile(r"\n"),  # Linie
+    re.compile(r"[.!?;:]+[\"'”»)]*\s+"),  # Zdania
+    re.compile(r"\s+"),  # Słowa
+]
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+# --- Liczenie tokenów: tokenizer Bielika, jeśli dostępny, w przeciwnym razie przybliżenie ---
+def _load_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        if os.path.exists(BIELIK_TOKENIZER_PATH):
+            try:
+                from tokenizers import Tokenizer
+                _tokenizer = Tokenizer.from_file(BIELIK_TOKENIZER_PATH)
+            except Exception as e:  # Brak pakietu "tokenizers" lub uszkodzony plik - zostaje przybliżenie
+                print(f"INFO: Tokenizer Bielika niedostępny ({e}). Liczba tokenów będzie szacowana.")
+    return _tokenizer
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_tokens(text):
+    tokenizer = _load_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return estimate_tokens(text)
+
+
+def _split(text, pattern):
+    start = 0
+    for match in pattern.finditer(text):
+        if match.end() > start:
+            yield text[start:match.end()]
+            start = match.end()
+    if start < len(text):
+        yield text[start:]
+
+
+def _iter_fitting_pieces(text, level, max_tokens, token_counter):
+    """
+    Zwraca kolejne pary (fragment, liczba_tokenów), z których każdy mieści się w max_tokens.
+    Za duże fragmenty są dzielone na następnym, drobniejszym poziomie granic.
+    """
+    for piece in _split(text, SPLIT_LEVELS[level]):
+        piece_tokens = token_counter(piece)
+        if piece_tokens <= max_tokens:
+            yield piece, piece_tokens
+        elif level + 1 < len(SPLIT_LEVELS):
+            yield from _iter_fitting_pieces(piece, level + 1, max_tokens, token_counter)
+        else:
+            # Ostateczność: pojedyncze "słowo" dłuższe niż limit - cięcie po znakach
+            step = max(1, int(max_tokens * CHARS_PER_TOKEN))
+            for start in range(0, len(piece), step):
+                part = piece[start:start + step]
+                yield part, token_counter(part)
+
+
+# --- Składanie fragmentów w chunki z zakładką ---
+def _pack_chunks(pieces, max_tokens, overlap_tokens):
+    current = []
+    current_tokens = 0
+    has_new_text = False
+
+    for piece, piece_tokens in pieces:
+        if has_new_text and current_tokens + piece_tokens > max_tokens:
+            yield "".join(part for part, _ in current)
+
+            # Zakładka: końcowe fragmenty poprzedniego chunka, o ile zmieszczą się razem z nowym fragmentem
+            overlap = []
+            overlap_size = 0
+            for part, part_tokens in reversed(current):
+                if overlap_size + part_tokens > min(overlap_tokens, max_tokens - piece_tokens):
+                    break
+                overlap.insert(0, (part, part_tokens))
+                overlap_size += part_tokens
+            current, current_tokens = overlap, overlap_size
+
+        current.append((piece, piece_tokens))
+        current_tokens += piece_tokens
+        has_new_text = True
+
+    if has_new_text:
+        chunk = "".join(part for part, _ in current)
+        if chunk.strip():
+            yield chunk
+
+
+# --- Leniwy podział tekstu na chunki mieszczące się w limicie tokenów ---
+def iter_chunks(text, max_tokens, overlap_tokens=0, token_counter=None):
+    """
+    Generator chunków tekstu o długości najwyżej max_tokens tokenów, ciętych na granicach artykułów,
+    akapitów, zdań (w tej kolejności). Kolejny chunk zaczyna się od końcówki poprzedniego
+    o długości najwyżej overlap_tokens tokenów.
+    """
+    token_counter = token_counter or count_tokens
+    return _pack_chunks(_iter_fitting_pieces(text, 0, max_tokens, token_counter), max_tokens, overlap_tokens)
+
+
+def _last_boundary(text, level):
+    # Koniec ostatniego dopasowania granicy, po którym jest jeszcze tekst (dalszy ciąg strumienia nie zmieni granicy)
+    cut = 0
+    for match in SPLIT_LEVELS[level].finditer(text):
+        if match.end() < len(text):
+            cut = match.end()
+    return cut
+
+
+def _iter_stream_pieces(text_parts, max_tokens, token_counter):
+    """
+    Jak _iter_fitting_pieces dla tekstu podanego w częściach (np. strona po stronie): w buforze zostaje tylko
+    tekst od ostatniej granicy artykułu. Bufor bez takiej granicy dłuższy niż STREAM_BUFFER_CHUNKS chunków
+    jest cięty na najgrubszej dostępnej drobniejszej granicy.
+    """
+    buffer_limit = int(STREAM_BUFFER_CHUNKS * max_tokens * CHARS_PER_TOKEN)
+    buffer = ""
+    for part in text_parts:
+        buffer += part
+        level = 0
+        cut = _last_boundary(buffer, level)
+        while not cut and len(buffer) > buffer_limit and level + 1 < len(SPLIT_LEVELS):
+            level += 1
+            cut = _last_boundary(buffer, level)
+        if not cut and len(buffer) > buffer_limit:
+            cut = len(buffer)
+        if cut:
+            yield from _iter_fitting_pieces(buffer[:cut], level, max_tokens, token_counter)
+            buffer = buffer[cut:]
+    if buffer:
+        yield from _iter_fitting_pieces(buffer, 0, max_tokens, token_counter)
+
+
+# --- Podział strumienia tekstu (kolejnych części, np. stron PDF) bez składania całego dokumentu w pamięci ---
+def iter_chunks_from_parts(text_parts, max_tokens, overlap_tokens=0, token_counter=None):
+    """
+    Chunki jak iter_chunks("".join(text_parts)), ale części są pobierane leniwie, w miarę potrzeby.
+    Wynik jest identyczny, dopóki tekst między granicami artykułów nie przekracza STREAM_BUFFER_CHUNKS chunków;
+    dłuższy fragment jest cięty wcześniej, na drobniejszej granicy (patrz _iter_stream_pieces), więc podział na
+    chunki może się różnić - każdy chunk nadal mieści się w max_tokens, a bez zakładki chunki składają się
+    dokładnie w tekst wejściowy.
+    """
+    token_counter = token_counter or count_tokens
+    return _pack_chunks(_iter_stream_pieces(text_parts, max_tokens, token_counter), max_tokens, overlap_tokens)
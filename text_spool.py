@@ -0,0 +1,94 @@
+import os
+import mmap
+import codecs
+import hashlib
+
+# --- Teksty zapisywane na dysk zamiast trzymania w pamięci (płytki ARM 4-8 GB z modelem w RAM) ---
+# Analizy kolejnych plików są dopisywane raz do pliku roboczego przebiegu; globalne podsumowanie czyta je
+# z powrotem przez mmap blokami po TEXT_BLOCK_BYTES, więc połączony tekst wszystkich analiz nie powstaje w pamięci.
+TEXT_BLOCK_BYTES = 1024 * 1024
+
+
+def iter_text_file(path, block_bytes=TEXT_BLOCK_BYTES):
+    """
+    Tekst pliku UTF-8 w kolejnych blokach (mmap) - bez wczytywania całego pliku do pamięci.
+    Znaki wielobajtowe na granicy bloków są składane przez dekoder przyrostowy.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, len(mapped), block_bytes):
+                text = decoder.decode(mapped[start:start + block_bytes])
+                if text:
+                    yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def file_sha256(path, block_bytes=TEXT_BLOCK_BYTES):
+    """Skrót SHA-256 zawartości pliku liczony blokami (None, jeśli pliku nie ma)."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_bytes), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TextSpool:
+    """
+    Plik roboczy, do którego kolejne teksty są dopisywane raz, rozdzielone separatorem (jak separator.join(...)).
+    W pamięci zostaje tylko liczba wpisów i bajtów; całość jest czytana z powrotem strumieniowo przez iter_text().
+    """
+
+    def __init__(self, path, separator=""):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.separator = separator.encode("utf-8")
+        self.file = open(path, "wb")
+        self.entries = 0
+        self.size = 0
+        self.has_content = False  # Czy któryś wpis zawiera coś poza białymi znakami
+
+    def append(self, text_parts):
+        """
+        Dopisuje jeden wpis - tekst albo iterator jego kolejnych części (np. iter_text_file innego pliku).
+        Pusty wpis jest pomijany, tak jak filter(None, ...) przed łączeniem tekstów.
+        """
+        if isinstance(text_parts, str):
+            text_parts = [text_parts]
+        started = False
+        for part in text_parts:
+            if not part:
+                continue
+            if not started and self.entries:
+                self.file.write(self.separator)
+                self.size += len(self.separator)
+            started = True
+            data = part.encode("utf-8")
+            self.file.write(data)
+            self.size += len(data)
+            self.has_content = self.has_content or bool(part.strip())
+        if started:
+            self.entries += 1
+
+    def iter_text(self):
+        self.file.flush()
+        return iter_text_file(self.path)
+
+    def close(self):
+        """Zamyka i usuwa plik roboczy."""
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+import argparse
+import threading
+
+import text_chunker
+import ollama_client
+import model_lifecycle
+
+try:
+    import numpy as np
+except ImportError:  # Indeks wektorowy jest opcjonalny - bez numpy pozostałe skrypty działają jak dotychczas
+    np = None
+
+# --- Konfiguracja indeksu wektorowego (osadzenia fragmentów dokumentów z Ollama /api/embeddings) ---
+STORE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "VECTOR_STORE")
+EMBEDDING_MODEL = "bielik-4.5b-q4km-final"  # Można podać osobny model osadzeń załadowany w Ollama
+EMBEDDING_CHUNK_TOKENS = 512  # Rozmiar indeksowanego fragmentu dokumentu
+EMBEDDING_CHUNK_OVERLAP_TOKENS = 64
+SEARCH_BLOCK_ROWS = 8192  # Liczba wierszy macierzy porównywanych naraz (ogranicza zużycie pamięci przy wyszukiwaniu)
+HASHING_EMBEDDER_DIMENSIONS = 512  # Wymiar lokalnego zastępczego modelu osadzeń (bez serwera, do testów)
+
+VECTORS_FILE = "vectors.f32"  # Macierz float32 (wiersz = znormalizowane osadzenie), dopisywana na końcu pliku
+METADATA_FILE = "chunks.jsonl"  # Wiersz metadanych na każdy wiersz macierzy: skrót fragmentu, źródło, tekst
+HEADER_FILE = "store.json"  # Model i wymiar osadzeń - inny model oznacza nowy, pusty indeks
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# --- Funkcje osadzeń: tekst -> lista liczb ---
+def ollama_embedder(host="localhost", port=11434, model=EMBEDDING_MODEL):
+    client = ollama_client.get_client(host, port)
+
+    def embed(text):
+        # keep_alive jak w pozostałych zapytaniach - osadzenia tym samym modelem nie skracają przypięcia na czas przebiegu
+        status, data, raw = client.request_json("POST", "/api/embeddings", {
+            "model": model, "prompt": text, "keep_alive": model_lifecycle.keep_alive_for(host, port, model)})
+        if status != 200 or not data or not data.get("embedding"):
+            raise RuntimeError(f"Ollama nie zwróciła osadzenia (HTTP {status}): {raw[:200]}")
+        return data["embedding"]
+
+    return embed
+
+
+def hashing_embedder(dimensions=HASHING_EMBEDDER_DIMENSIONS):
+    """
+    Zastępczy model osadzeń bez serwera: słowa rzutowane skrótem CRC32 na stały wymiar (worek słów).
+    Pozwala zbudować i przetestować indeks lokalnie; jakość wyszukiwania zbliżona do dopasowania słów.
+    """
+
+    def embed(text):
+        vector = [0.0] * dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % dimensions] += 1.0
+        return vector
+
+    return embed
+
+
+class VectorStore:
+    """
+    Macierz osadzeń w pliku mapowanym w pamięci (np.memmap) z przyrostowym dopisywaniem wierszy.
+    Osadzenie każdego fragmentu jest liczone tylko raz - fragment o znanym skrócie SHA-256 jest pomijany.
+    """
+
+    def __init__(self, embed, model_name, folder=None):
+        if np is None:
+            raise RuntimeError("Indeks wektorowy wymaga pakietu numpy (pip install numpy).")
+        self.embed = embed
+        self.model_name = model_name
+        self.folder = folder or STORE_FOLDER
+        self.lock = threading.Lock()
+        self.dimensions = None
+        self.metadata = []
+        self.row_by_hash = {}
+        self._matrix = None
+        os.makedirs(self.folder, exist_ok=True)
+        self._load()
+
+    def _path(self, file_name):
+        return os.path.join(self.folder, file_name)
+
+    def _load(self):
+        try:
+            with open(self._path(HEADER_FILE), "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            header = None
+        if not header or header.get("model") != self.model_name:
+            if header:
+                print(f"INFO: Indeks wektorowy '{self.folder}' zbudowano modelem '{header.get('model')}' - "
+                      f"zostanie zbudowany od nowa dla '{self.model_name}'.")
+            for file_name in (VECTORS_FILE, METADATA_FILE, HEADER_FILE):
+                if os.path.exists(self._path(file_name)):
+                    os.remove(self._path(file_name))
+            return
+
+        self.dimensions = header["dimensions"]
+        if os.path.exists(self._path(METADATA_FILE)):
+            with open(self._path(METADATA_FILE), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.metadata.append(json.loads(line))
+                    except ValueError:
+                        break  # Przerwany zapis ostatniego wiersza - dalsze wiersze macierzy są pomijane
+        # Wiersze macierzy bez metadanych (przerwany zapis) są odcinane
+        row_bytes = self.dimensions * 4
+        stored_rows = os.path.getsize(self._path(VECTORS_FILE)) // row_bytes if os.path.exists(self._path(VECTORS_FILE)) else 0
+        self.metadata = self.metadata[:stored_rows]
+        with open(self._path(VECTORS_FILE), "ab") as f:
+            f.truncate(len(self.metadata) * row_bytes)
+        self.row_by_hash = {entry["hash"]: row for row, entry in enumerate(self.metadata)}
+
+    def __len__(self):
+        return len(self.metadata)
+
+    # --- Przyrostowe dodawanie fragmentów ---
+    def add_texts(self, source, texts):
+        """
+        Dodaje fragmenty (z podaniem źródła, np. nazwy pliku PDF) i zwraca liczbę nowych osadzeń.
+        """
+        added = 0
+        for text in texts:
+            if not text.strip():
+                continue
+            text_hash = chunk_hash(text)
+            if text_hash in self.row_by_hash:
+                continue
+            vector = np.asarray(self.embed(text), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm  # Wiersze znormalizowane - podobieństwo kosinusowe to iloczyn skalarny
+            with self.lock:
+                if self.dimensions is None:
+                    self.dimensions = len(vector)
+                    with open(self._path(HEADER_FILE), "w", encoding="utf-8") as f:
+                        json.dump({"model": self.model_name, "dimensions": self.dimensions}, f)
+                with open(self._path(VECTORS_FILE), "ab") as f:
+                    f.write(vector.tobytes())
+                with open(self._path(METADATA_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"hash": text_hash, "source": source, "text": text}, ensure_ascii=False) + "\n")
+                self.row_by_hash[text_hash] = len(self.metadata)
+                self.metadata.append({"hash": text_hash, "source": source, "text": text})
+                self._matrix = None
+            added += 1
+        return added
+
+    def add_document(self, source, text):
+        """
+        text - cały tekst dokumentu albo iterator kolejnych części tekstu (np. stron z potoku ekstrakcji).
+        """
+        if isinstance(text, str):
+            chunks = text_chunker.iter_chunks(text, EMBEDDING_CHUNK_TOKENS, EMBEDDING_CHUNK_OVERLAP_TOKENS)
+        else:
+            chunks = text_chunker.iter_chunks_from_parts(text, EMBEDDING_CHUNK_TOKENS, EMBEDDING_CHUNK_OVERLAP_TOKENS)
+        added = self.add_texts(source, chunks)
+        print(f"INFO: Indeks wektorowy: '{source}' - nowych fragmentów {added}, razem w indeksie {len(self)}.")
+        return added
+
+    def _rows(self):
+        if self._matrix is None and self.metadata:
+            self._matrix = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r",
+                                     shape=(len(self.metadata), self.dimensions))
+        return self._matrix
+
+    # --- Wyszukiwanie top-k wielu zapytań naraz (blokami wierszy macierzy) ---
+    def search(self, queries, top_k=5):
+        """
+        Zwraca dla każdego zapytania listę do top_k par (podobieństwo, metadane fragmentu), od najlepszej.
+        """
+        matrix = self._rows()
+        if matrix is None:
+            return [[] for _ in queries]
+        query_matrix = np.asarray([self.embed(query) for query in queries], dtype=np.float32)
+        norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+        query_matrix /= np.where(norms > 0, norms, 1.0)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS):
+            block_scores = query_matrix @ np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS]).T
+            block_rows = np.broadcast_to(np.arange(start, start + block_scores.shape[1]), block_scores.shape)
+            scores = np.concatenate([best_scores, block_scores], axis=1)
+            rows = np.concatenate([best_rows, block_rows], axis=1)
+            keep = min(top_k, scores.shape[1])
+            selected = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, selected, axis=1)
+            best_rows = np.take_along_axis(rows, selected, axis=1)
+
+        results = []
+        for query_scores, query_rows in zip(best_scores, best_rows):
+            order = np.argsort(-query_scores)
+            results.append([(float(query_scores[i]), self.metadata[int(query_rows[i])]) for i in order])
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wyszukiwanie semantyczne w indeksie wektorowym fragmentów dokumentów.")
+    parser.add_argument("question", help="Pytanie lub opis szukanych fragmentów.")
+    parser.add_argument("--folder", default=STORE_FOLDER, help="Katalog indeksu wektorowego.")
+    parser.add_argument("--add", nargs="*", default=[], metavar="PLIK_TXT", help="Pliki tekstowe do dodania do indeksu.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hashing", action="store_true", help="Lokalny zastępczy model osadzeń zamiast Ollama.")
+    args = parser.parse_args()
+
+    if args.hashing:
+        store = VectorStore(hashing_embedder(), "hashing", args.folder)
+    else:
+        store = VectorStore(ollama_embedder(), EMBEDDING_MODEL, args.folder)
+    for path in args.add:
+        with open(path, "r", encoding="utf-8") as f:
+            store.add_document(os.path.basename(path), f.read())
+
+    for score, entry in store.search([args.question], args.top_k)[0]:
+        print(f"\n--- {entry['source']} (podobieństwo {score:.3f}) ---\n{entry['text']}")